@@ -1,5 +1,8 @@
 from django.contrib import admin
+from django.forms import BaseFormSet, ModelForm
+from django.http import HttpRequest
 
+from hostel_accounting.caching import bump_group_version, bump_purchases_version, bump_user_purchases_version
 from .models import User, RoommatesGroup
 
 
@@ -11,6 +14,13 @@ class UserAdmin(admin.ModelAdmin):
     list_display = ('username', 'roommates_group', 'email', 'is_staff', 'is_active', 'last_login')
     list_editable = ('is_staff', 'is_active')
 
+    def save_model(self, request: HttpRequest, obj: User, form: ModelForm, change: bool) -> None:
+        # Смена группы меняет покупки и балансы и прежней, и новой группы
+        if change:
+            bump_user_purchases_version(User.objects.get(pk=obj.pk))
+        super().save_model(request, obj, form, change)
+        bump_user_purchases_version(obj)
+
 
 class UserInline(admin.TabularInline):
     model = User
@@ -26,3 +36,15 @@ class RoommatesGroupAdmin(admin.ModelAdmin):
     readonly_fields = ('created_at',)
     list_display = ('name', 'created_at')
     inlines = (UserInline,)
+
+    def save_related(self, request: HttpRequest, form: ModelForm, formsets: list[BaseFormSet], change: bool) -> None:
+        # Пользователи, которых перевели из группы во встроенной форме, и их прежние группы
+        moved_users = [(user_form.instance, user_form.initial.get('roommates_group'))
+                       for formset in formsets for user_form in formset.initial_forms
+                       if 'roommates_group' in user_form.changed_data]
+        super().save_related(request, form, formsets, change)
+        # Группа и ее члены входят в ответы с покупками, тратами и балансами группы
+        bump_group_version(form.instance.pk)
+        for user, group_id in moved_users:
+            bump_purchases_version(user.pk, group_id)
+            bump_user_purchases_version(user)
@@ -0,0 +1,9 @@
+from django.urls import path
+
+from .async_views import roommates_group_purchases
+
+# Стабы django-stubs не знают об асинхронных представлениях, поэтому типы аргументов path не сходятся
+urlpatterns = [
+    path('roommates-groups/purchases/', roommates_group_purchases,  # type: ignore[arg-type]
+         name='async-roommates-group-purchases'),
+]
@@ -0,0 +1,46 @@
+"""
+Асинхронные представления для чтения покупок группы. Возвращают те же данные, что и синхронные
+представления, но не занимают поток на время передачи ответа медленному клиенту при работе под ASGI
+"""
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.http.response import HttpResponseBase
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
+
+from accounts.models import RoommatesGroup
+from accounts.utils import groups_purchases_fields_params, get_groups_purchases_cache_key, \
+    get_groups_purchases_content
+from hostel_accounting.async_api import async_api_view
+from hostel_accounting.caching import get_etag, get_not_modified_response, get_purchases_cache
+from hostel_accounting.permissions import IsAuthenticatedAndWithGroup
+from hostel_accounting.utils import get_all_fields_from_request, get_authenticated_user
+
+
+@async_api_view(IsAuthenticated, IsAuthenticatedAndWithGroup)
+async def roommates_group_purchases(request: Request) -> HttpResponseBase:
+    """
+    Представление, возвращающее все покупки группы пользователя с тем же кэшем и ETag, что и синхронное.
+    Параметр stream не поддерживается: Django 4.1 передает потоковые ответы под ASGI синхронно,
+    поэтому ответ всегда собирается целиком. Сырой SQL-запрос выполняется в потоке через sync_to_async,
+    так как асинхронного API для него в Django нет
+    """
+
+    roommates_group_id = get_authenticated_user(request).roommates_group_id
+    fields_params = get_all_fields_from_request(request, groups_purchases_fields_params)
+    cache_key = await sync_to_async(get_groups_purchases_cache_key)(request, roommates_group_id, fields_params)
+    etag = get_etag(cache_key)
+    not_modified_response = get_not_modified_response(request, etag)
+    if not_modified_response is not None:
+        return not_modified_response
+
+    cache = get_purchases_cache()
+    content = await cache.aget(cache_key)  # type: ignore[attr-defined]
+    if content is None:
+        roommates_group = await RoommatesGroup.objects.aget(pk=roommates_group_id)  # type: ignore[attr-defined]
+        content = await sync_to_async(get_groups_purchases_content)(request, roommates_group, fields_params)
+        await cache.aset(cache_key, content)  # type: ignore[attr-defined]
+    response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    return response
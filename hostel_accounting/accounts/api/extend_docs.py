@@ -1,11 +1,13 @@
 from copy import deepcopy
+from typing import Any
 
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import OpenApiExample, OpenApiParameter
 
 from goods_accounting.api.extend_docs import purchase_product_fields, purchase_product_category_fields
 from hostel_accounting import extend_docs_global
-from hostel_accounting.serializers import AllGroupsPurchasesSerializer
+from hostel_accounting.serializers import AllGroupsPurchasesSerializer, GroupSpendingSerializer, \
+    GroupSettlementSerializer
 
 """UserViewSet"""
 
@@ -30,7 +32,7 @@ user_roommates_group_fields = OpenApiParameter(
     ]
 )
 
-user_retrieve = {
+user_retrieve: dict[str, Any] = {
     'summary': 'Получить пользователя',
     'description': 'Доступно для администраторов и для пользователя-владельца данных',
     'parameters': [
@@ -40,7 +42,7 @@ user_retrieve = {
     ]
 }
 
-user_update = {
+user_update: dict[str, Any] = {
     'summary': 'Обновить пользователя',
     'description': 'Доступно для администраторов и для пользователя-владельца данных',
     'parameters': [
@@ -48,7 +50,7 @@ user_update = {
     ]
 }
 
-user_partial_update = {
+user_partial_update: dict[str, Any] = {
     'summary': 'Частично обновить пользователя',
     'description': 'Доступно для администраторов и для пользователя-владельца данных',
     'parameters': [
@@ -56,7 +58,7 @@ user_partial_update = {
     ]
 }
 
-user_destroy = {
+user_destroy: dict[str, Any] = {
     'summary': 'Удалить пользователя',
     'description': 'Доступно для администраторов и для пользователя-владельца данных',
     'parameters': [
@@ -64,14 +66,16 @@ user_destroy = {
     ]
 }
 
-user_list = {
+user_list: dict[str, Any] = {
     'summary': 'Получить пользователей',
     'description': 'Доступно только для администраторов',
     'parameters': [
         user_fields,
         user_roommates_group_fields,
         extend_docs_global.page_param_ru,
-        extend_docs_global.page_size_param_ru
+        extend_docs_global.page_size_param_ru,
+        extend_docs_global.pagination_param_ru,
+        extend_docs_global.cursor_param_ru
     ]
 }
 
@@ -98,12 +102,12 @@ roommates_group_users_fields = OpenApiParameter(
     ]
 )
 
-roommates_group_create = {
+roommates_group_create: dict[str, Any] = {
     'summary': 'Cоздать группу сожителей',
     'description': 'Доступно для авторизированных пользователей без группы'
 }
 
-roommates_group_retrieve = {
+roommates_group_retrieve: dict[str, Any] = {
     'summary': 'Получить группу сожителей',
     'description': 'Доступно для авторизированных пользователей. Если запрос совершает администратор, '
                    'то ему разрешен доступ к любой группе. Если запрос совершает обычный пользователь, '
@@ -115,7 +119,7 @@ roommates_group_retrieve = {
     ]
 }
 
-roommates_group_update = {
+roommates_group_update: dict[str, Any] = {
     'summary': 'Обновить группу сожителей',
     'description': 'Доступно для авторизированных пользователей. Если запрос совершает администратор, '
                    'то ему разрешен доступ к любой группе. Если запрос совершает обычный пользователь, '
@@ -125,7 +129,7 @@ roommates_group_update = {
     ]
 }
 
-roommates_group_list = {
+roommates_group_list: dict[str, Any] = {
     'summary': 'Получить группы сожителей',
     'description': 'Доступно только для администраторов',
     'parameters': [
@@ -136,7 +140,7 @@ roommates_group_list = {
     ]
 }
 
-roommates_group_destroy = {
+roommates_group_destroy: dict[str, Any] = {
     'summary': 'Удалить группу сожителей',
     'description': 'Доступно только для администраторов',
     'parameters': [
@@ -155,7 +159,44 @@ roommates_group_fields.name = 'roommates_group_fields'
 roommates_group_fields.description = 'Позволяет указать у связанной модели \'roommates_group\' ' \
                                      'только те поля, которые следует вернуть'
 
-roommates_group_purchases = {
+roommates_group_purchases_stream = OpenApiParameter(
+    'stream',
+    type=OpenApiTypes.BOOL,
+    location=OpenApiParameter.QUERY,
+    description='Позволяет получить ответ по частям: покупки каждого пользователя отдаются сразу после того, '
+                'как они прочитаны из базы данных'
+)
+
+roommates_group_purchases_since = OpenApiParameter(
+    'since',
+    type=OpenApiTypes.DATETIME,
+    location=OpenApiParameter.QUERY,
+    description='Возвращаются только покупки, совершенные начиная с этого момента (включительно)'
+)
+
+roommates_group_purchases_until = OpenApiParameter(
+    'until',
+    type=OpenApiTypes.DATETIME,
+    location=OpenApiParameter.QUERY,
+    description='Возвращаются только покупки, совершенные до этого момента (не включительно)'
+)
+
+roommates_group_purchases_page_size = OpenApiParameter(
+    'page_size',
+    type=OpenApiTypes.INT,
+    location=OpenApiParameter.QUERY,
+    description='Количество покупок на одной странице. Покупки возвращаются от новых к старым, '
+                'в ответ добавляется поле \'next_cursor\''
+)
+
+roommates_group_purchases_cursor = OpenApiParameter(
+    'cursor',
+    type=OpenApiTypes.STR,
+    location=OpenApiParameter.QUERY,
+    description='Значение поля \'next_cursor\' из предыдущего ответа'
+)
+
+roommates_group_purchases: dict[str, Any] = {
     'summary': 'Получить все покупки комнаты пользователя',
     'description': 'Доступно для пользователей, находящихся в группе',
     'parameters': [
@@ -163,9 +204,59 @@ roommates_group_purchases = {
         roommates_group_fields,
         roommates_group_users_fields,
         purchase_product_fields,
-        purchase_product_category_fields
+        purchase_product_category_fields,
+        roommates_group_purchases_stream,
+        roommates_group_purchases_since,
+        roommates_group_purchases_until,
+        roommates_group_purchases_page_size,
+        roommates_group_purchases_cursor
     ],
     'responses': {
         200: AllGroupsPurchasesSerializer
     }
 }
+
+roommates_group_spending_fields = deepcopy(extend_docs_global.fields_query_parameter)
+roommates_group_spending_fields.examples = [
+    OpenApiExample(
+        'Возвращается поле \'users_spending\'',
+        value='users_spending'
+    )
+]
+
+roommates_group_spending: dict[str, Any] = {
+    'summary': 'Получить траты членов комнаты пользователя по категориям товаров',
+    'description': 'Доступно для пользователей, находящихся в группе',
+    'parameters': [
+        roommates_group_spending_fields,
+        roommates_group_fields,
+        roommates_group_users_fields,
+        purchase_product_category_fields,
+        roommates_group_purchases_since,
+        roommates_group_purchases_until
+    ],
+    'responses': {
+        200: GroupSpendingSerializer
+    }
+}
+
+roommates_group_settlement_fields = deepcopy(extend_docs_global.fields_query_parameter)
+roommates_group_settlement_fields.examples = [
+    OpenApiExample(
+        'Возвращается поле \'transfers\'',
+        value='transfers'
+    )
+]
+
+roommates_group_settlement: dict[str, Any] = {
+    'summary': 'Получить балансы членов комнаты пользователя и переводы для расчета между ними',
+    'description': 'Доступно для пользователей, находящихся в группе. Баланс - это разница между суммой покупок '
+                   'пользователя и его равной долей в сумме покупок всей комнаты',
+    'parameters': [
+        roommates_group_settlement_fields,
+        roommates_group_users_fields
+    ],
+    'responses': {
+        200: GroupSettlementSerializer
+    }
+}
@@ -1,5 +1,6 @@
 from typing import Any
 
+from django.http.response import HttpResponseBase
 from drf_spectacular.utils import extend_schema
 from rest_framework.decorators import action
 from rest_framework.exceptions import MethodNotAllowed
@@ -10,11 +11,14 @@ from rest_framework.viewsets import ModelViewSet
 
 from accounts.api import extend_docs
 from accounts.models import User, RoommatesGroup
-from accounts.utils import get_response_while_processing_groups_purchases
-from hostel_accounting.paginations import DefaultPagination
+from accounts.utils import get_response_while_processing_groups_purchases, \
+    get_response_while_processing_groups_spending, get_response_while_processing_groups_settlement
+from hostel_accounting.caching import bump_group_version, bump_user_purchases_version
+from hostel_accounting.paginations import DefaultPagination, KeysetPagination
 from hostel_accounting.permissions import IsThisUser, RoommatesGroupPermission, IsAuthenticatedAndWithGroup
 from hostel_accounting.serializers import UserSerializer, RoommatesGroupSerializer
-from hostel_accounting.utils import get_default_retrieve_response, get_default_list_response_with_pagination
+from hostel_accounting.utils import get_authenticated_user, get_default_retrieve_response, \
+    get_default_list_response_with_pagination
 
 
 class UserViewSet(ModelViewSet):
@@ -22,6 +26,17 @@ class UserViewSet(ModelViewSet):
     serializer_class = UserSerializer
     permission_classes = (IsAdminUser | IsThisUser,)
     pagination_class = DefaultPagination
+    cursor_pagination_class = KeysetPagination
+    render_from_values = True
+
+    def perform_update(self, serializer: UserSerializer) -> None:
+        bump_user_purchases_version(serializer.instance)
+        super().perform_update(serializer)
+        bump_user_purchases_version(serializer.instance)
+
+    def perform_destroy(self, instance: User) -> None:
+        bump_user_purchases_version(instance)
+        super().perform_destroy(instance)
 
     @extend_schema(exclude=True)
     def create(self, request: Request, *args: Any, **kwargs: Any) -> Response:
@@ -59,6 +74,10 @@ class RoommatesGroupViewSet(ModelViewSet):
         self.request.user.roommates_group = serializer.instance
         self.request.user.save()
 
+    def perform_update(self, serializer: RoommatesGroupSerializer) -> None:
+        super().perform_update(serializer)
+        bump_group_version(serializer.instance.pk)
+
     @extend_schema(**extend_docs.roommates_group_create)
     def create(self, request: Request, *args: Any, **kwargs: Any) -> Response:
         return super().create(request, *args, **kwargs)
@@ -85,9 +104,25 @@ class RoommatesGroupViewSet(ModelViewSet):
 
     @extend_schema(**extend_docs.roommates_group_purchases)
     @action(detail=False, methods=['GET'], permission_classes=(IsAuthenticatedAndWithGroup,), url_path='purchases')
-    def get_purchases_from_users_group(self, request: Request) -> Response:
+    def get_purchases_from_users_group(self, request: Request) -> HttpResponseBase:
         """Возвращает все покупки группы, если таковая имеется, в которой состоит пользователь, выполнивший запрос"""
 
-        self.kwargs['pk'] = request.user.roommates_group.pk
+        return get_response_while_processing_groups_purchases(request, self)
+
+    @extend_schema(**extend_docs.roommates_group_spending)
+    @action(detail=False, methods=['GET'], permission_classes=(IsAuthenticatedAndWithGroup,), url_path='spending')
+    def get_spending_from_users_group(self, request: Request) -> Response:
+        """Возвращает траты членов группы пользователя, выполнившего запрос, по категориям товаров"""
+
+        self.kwargs['pk'] = get_authenticated_user(request).roommates_group_id
+        roommates_group = self.get_object()
+        return get_response_while_processing_groups_spending(request, roommates_group)
+
+    @extend_schema(**extend_docs.roommates_group_settlement)
+    @action(detail=False, methods=['GET'], permission_classes=(IsAuthenticatedAndWithGroup,), url_path='settlement')
+    def get_settlement_from_users_group(self, request: Request) -> Response:
+        """Возвращает балансы членов группы пользователя, выполнившего запрос, и переводы для расчета между ними"""
+
+        self.kwargs['pk'] = get_authenticated_user(request).roommates_group_id
         roommates_group = self.get_object()
-        return get_response_while_processing_groups_purchases(request, roommates_group)
+        return get_response_while_processing_groups_settlement(request, roommates_group)
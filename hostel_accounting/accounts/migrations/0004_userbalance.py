@@ -0,0 +1,36 @@
+# Generated by Django 4.1.2 on 2026-10-18 10:15
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_balances(apps, schema_editor):
+    ProductPurchase = apps.get_model('goods_accounting', 'ProductPurchase')
+    UserBalance = apps.get_model('accounts', 'UserBalance')
+    spent = ProductPurchase.objects.filter(purchase__user__isnull=False) \
+        .values('purchase__user').annotate(spent=models.Sum('price')).order_by()
+    UserBalance.objects.bulk_create(UserBalance(user_id=row['purchase__user'], spent=row['spent']) for row in spent)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_alter_user_roommates_group'),
+        ('goods_accounting', '0002_alter_productpurchase_options_alter_purchase_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserBalance',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='balance', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='пользователь')),
+                ('spent', models.BigIntegerField(default=0, verbose_name='сумма покупок')),
+            ],
+            options={
+                'verbose_name': 'баланс пользователя',
+                'verbose_name_plural': 'балансы пользователей',
+            },
+        ),
+        migrations.RunPython(fill_balances, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.1.2 on 2026-10-18 11:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_userbalance'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='roommates_group',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='users', to='accounts.roommatesgroup', verbose_name='группа человек'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['roommates_group', 'id'], name='user_roommates_group_idx'),
+        ),
+    ]
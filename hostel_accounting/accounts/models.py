@@ -1,22 +1,118 @@
-from typing import Any, Union
+from datetime import datetime
+from typing import Any, Iterator, NamedTuple, Optional
 
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.db import connection, models
+from django.db.models import F
 from django.db.models.query import RawQuerySet
 
-from accounts.raw_sql_queries import all_group_purchases_query
+from accounts.raw_sql_queries import all_group_purchases_query, group_purchases_query_template, \
+    group_purchases_keys_query_template, group_purchases_keys_lateral_query_template, purchase_since_condition, \
+    purchase_until_condition, purchase_before_key_condition, purchase_from_key_condition, \
+    group_purchases_json_query_template, group_purchases_json_columns, get_json_object_sql
 from hostel_accounting.utils import StrMethodMixin
 
 
+class PurchasesFilter(NamedTuple):
+    """Условия отбора покупок группы по дате покупки и по ключу (datetime, id) покупки"""
+
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+    before_key: Optional[tuple[datetime, int]] = None
+    from_key: Optional[tuple[datetime, int]] = None
+
+    def get_conditions(self) -> tuple[str, list[Any]]:
+        """Метод возвращает SQL-условия отбора покупок и их параметры"""
+
+        adapt = connection.ops.adapt_datetimefield_value
+        conditions: list[str] = []
+        params: list[Any] = []
+        if self.since is not None:
+            conditions.append(purchase_since_condition)
+            params.append(adapt(self.since))
+        if self.until is not None:
+            conditions.append(purchase_until_condition)
+            params.append(adapt(self.until))
+        if self.before_key is not None:
+            conditions.append(purchase_before_key_condition)
+            params.extend((adapt(self.before_key[0]), self.before_key[1]))
+        if self.from_key is not None:
+            conditions.append(purchase_from_key_condition)
+            params.extend((adapt(self.from_key[0]), self.from_key[1]))
+        return ''.join(conditions), params
+
+
 class RoommatesGroupManager(models.Manager):
+    # Типы в аннотациях методов записаны через |: плагин django-stubs не переносит Union и Optional
+    # в методы менеджера модели и заменяет их на _SpecialForm
 
-    def get_all_purchases(self, group: Union[int, 'RoommatesGroup']) -> RawQuerySet:
+    def get_all_purchases(self, group: 'int | RoommatesGroup') -> RawQuerySet:
         """Метод возвращает покупки всех членов комнаты"""
 
         if isinstance(group, RoommatesGroup):
             group = group.pk
         return self.raw(all_group_purchases_query, (group,))
 
+    def iterate_all_purchases(self, group: 'int | RoommatesGroup',
+                              purchases_filter: PurchasesFilter = PurchasesFilter(),
+                              chunk_size: int = settings.GROUP_PURCHASES_CHUNK_SIZE) -> Iterator[tuple]:
+        """
+        Метод построчно возвращает покупки всех членов комнаты, читая их через серверный курсор
+        порциями по chunk_size строк
+        """
+
+        if isinstance(group, RoommatesGroup):
+            group = group.pk
+        conditions, params = purchases_filter.get_conditions()
+        with connection.chunked_cursor() as cursor:
+            cursor.execute(group_purchases_query_template.format(conditions=conditions), (group, *params))
+            while rows := cursor.fetchmany(chunk_size):
+                yield from rows
+
+    def get_purchases_keys(self, group: 'int | RoommatesGroup', purchases_filter: PurchasesFilter,
+                           limit: int) -> list[tuple[datetime, int]]:
+        """Метод возвращает ключи (datetime, id) не более чем limit последних покупок членов комнаты"""
+
+        if isinstance(group, RoommatesGroup):
+            group = group.pk
+        conditions, params = purchases_filter.get_conditions()
+        if connection.vendor == 'postgresql':
+            query = group_purchases_keys_lateral_query_template.format(conditions=conditions)
+            params = [*params, limit, group, limit]
+        else:
+            query = group_purchases_keys_query_template.format(conditions=conditions)
+            params = [group, *params, limit]
+        with connection.cursor() as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+
+    def get_purchases_json(self, group: 'int | RoommatesGroup', fields: dict[str, Any],
+                           purchases_filter: PurchasesFilter = PurchasesFilter(),
+                           extra: 'dict[str, str] | None' = None) -> 'bytes | None':
+        """
+        Метод возвращает готовый JSON со всеми покупками членов комнаты, собранный в PostgreSQL через
+        json_build_object и json_agg. fields - дерево требуемых полей ответа, extra - дополнительные поля
+        верхнего уровня с уже закодированными в JSON значениями. Если для какого-то поля нет SQL-выражения,
+        возвращается None
+        """
+
+        if isinstance(group, RoommatesGroup):
+            group = group.pk
+        extra = extra or {}
+        conditions, params = purchases_filter.get_conditions()
+        try:
+            json_object = get_json_object_sql(fields, group_purchases_json_columns, conditions, extra)
+        except KeyError:
+            return None
+        if 'users_purchases' not in fields:
+            params = []
+        with connection.cursor() as cursor:
+            cursor.execute(group_purchases_json_query_template.format(json_object=json_object),
+                           (*params, *extra.values(), group))
+            row = cursor.fetchone()
+        return None if row is None else row[0].encode()
+
 
 class RoommatesGroup(StrMethodMixin, models.Model):
     """Модель группы человек, живущих вместе"""
@@ -33,16 +129,53 @@ class RoommatesGroup(StrMethodMixin, models.Model):
 
 class User(AbstractUser):
     email = models.EmailField('электронная почта', unique=True)
-    roommates_group = models.ForeignKey(RoommatesGroup, on_delete=models.SET_NULL, null=True,
+    # Отдельный индекс внешнего ключа не нужен: группа - первый столбец индекса user_roommates_group_idx
+    roommates_group = models.ForeignKey(RoommatesGroup, on_delete=models.SET_NULL, null=True, db_index=False,
                                         verbose_name='группа человек', related_name='users')
 
     class Meta:
         ordering = ('id',)
+        indexes = (
+            # Запросы покупок группы соединяются с покупками через id пользователей группы
+            models.Index(fields=('roommates_group', 'id'), name='user_roommates_group_idx'),
+        )
         verbose_name = 'пользователь'
         verbose_name_plural = 'пользователи'
 
-    def __init__(self, *args: Any, **kwargs: Any) -> None:
-        super().__init__(*args, **kwargs)
-        self._meta.get_field('username').help_text = ''
-        self._meta.get_field('is_superuser').help_text = 'Супер пользователь имеет все права без их явного назначения'
-        self._meta.get_field('is_staff').help_text = 'Сотрудник может иметь права на изменение определенных ресурсов'
+
+class UserBalanceManager(models.Manager):
+
+    def change_spent(self, user: 'int | User | None', amount: int) -> None:
+        """Метод изменяет сумму всех покупок пользователя на amount"""
+
+        if isinstance(user, User):
+            user = user.pk
+        if user is None or not amount:
+            return
+        if self.filter(user_id=user).update(spent=F('spent') + amount):
+            return
+        _, created = self.get_or_create(user_id=user, defaults={'spent': amount})
+        if not created:
+            self.filter(user_id=user).update(spent=F('spent') + amount)
+
+
+class UserBalance(models.Model):
+    """
+    Модель суммы всех покупок пользователя. Сумма обновляется при каждом изменении покупок,
+    поэтому для расчета долгов в группе не нужно просматривать всю историю покупок
+    """
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='balance',
+                                verbose_name='пользователь')
+    spent = models.BigIntegerField('сумма покупок', default=0)
+    objects = UserBalanceManager()
+
+    class Meta:
+        verbose_name = 'баланс пользователя'
+        verbose_name_plural = 'балансы пользователей'
+
+
+# Подсказки полей меняются один раз при импорте модели, а не при создании каждого её экземпляра
+User._meta.get_field('username').help_text = ''
+User._meta.get_field('is_superuser').help_text = 'Супер пользователь имеет все права без их явного назначения'
+User._meta.get_field('is_staff').help_text = 'Сотрудник может иметь права на изменение определенных ресурсов'
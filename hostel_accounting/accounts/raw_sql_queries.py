@@ -1,4 +1,6 @@
-all_group_purchases_query = '''
+from typing import Any, Iterable
+
+group_purchases_query_template = '''
             SELECT 0 AS id, u.id AS user_id, u.username, u.email, u.first_name, u.last_name, u.is_superuser, u.is_staff, 
             u.date_joined, u.last_login, product.id AS product_id, product.name AS product_name, category.id AS category_id, 
             category.name AS category_name, product_purchase.price
@@ -13,4 +15,129 @@ all_group_purchases_query = '''
                     ON product.category_id = category.id
                 JOIN accounts_roommatesgroup AS roommates_group
                     ON roommates_group.id = u.roommates_group_id
+            WHERE roommates_group.id = %s{conditions}
+            ORDER BY u.id, product_purchase.id;'''
+
+all_group_purchases_query = group_purchases_query_template.format(conditions='')
+
+group_purchases_keys_query_template = '''
+            SELECT purchase.datetime, purchase.id
+            FROM goods_accounting_purchase AS purchase
+                JOIN accounts_user AS u
+                    ON u.id = purchase.user_id
+            WHERE u.roommates_group_id = %s{conditions}
+            ORDER BY purchase.datetime DESC, purchase.id DESC
+            LIMIT %s;'''
+
+# Запрос ключей для PostgreSQL: без LATERAL база сортирует всю историю покупок группы ради LIMIT. Здесь для каждого
+# члена комнаты по индексу purchase_user_datetime_idx читается не более LIMIT покупок, начиная с ключа курсора,
+# и сортируются только они
+group_purchases_keys_lateral_query_template = '''
+            SELECT purchase.datetime, purchase.id
+            FROM accounts_user AS u
+                CROSS JOIN LATERAL (
+                    SELECT purchase.datetime, purchase.id
+                    FROM goods_accounting_purchase AS purchase
+                    WHERE purchase.user_id = u.id{conditions}
+                    ORDER BY purchase.datetime DESC, purchase.id DESC
+                    LIMIT %s
+                ) AS purchase
+            WHERE u.roommates_group_id = %s
+            ORDER BY purchase.datetime DESC, purchase.id DESC
+            LIMIT %s;'''
+
+purchase_since_condition = ' AND purchase.datetime >= %s'
+purchase_until_condition = ' AND purchase.datetime < %s'
+purchase_before_key_condition = ' AND (purchase.datetime, purchase.id) < (%s, %s)'
+purchase_from_key_condition = ' AND (purchase.datetime, purchase.id) >= (%s, %s)'
+
+# Даты и время в JSON в том же формате, что и у DateTimeField DRF при TIME_ZONE = 'UTC':
+# микросекунды выводятся, только если они не нулевые, а смещение +00:00 заменяется на Z
+json_datetime_template = (
+    "to_char({column} AT TIME ZONE 'UTC', 'YYYY-MM-DD\"T\"HH24:MI:SS')"
+    " || CASE WHEN mod(date_part('microseconds', {column})::bigint, 1000000) = 0 THEN ''"
+    " ELSE to_char({column} AT TIME ZONE 'UTC', '.US') END || 'Z'"
+)
+
+group_purchases_json_query_template = '''
+            SELECT {json_object}::text
+            FROM accounts_roommatesgroup AS roommates_group
             WHERE roommates_group.id = %s;'''
+
+users_purchases_json_subquery_template = '''COALESCE((
+                SELECT json_agg(user_purchases.data ORDER BY user_purchases.user_id)
+                FROM (
+                    SELECT u.id AS user_id, {json_object} AS data
+                    FROM accounts_user AS u
+                        JOIN goods_accounting_purchase AS purchase
+                            ON u.id = purchase.user_id
+                        JOIN goods_accounting_productpurchase AS product_purchase
+                            ON purchase.id = product_purchase.purchase_id
+                        JOIN goods_accounting_product AS product
+                            ON product_purchase.product_id = product.id
+                        JOIN goods_accounting_productcategory AS category
+                            ON product.category_id = category.id
+                    WHERE u.roommates_group_id = roommates_group.id{conditions}
+                    GROUP BY u.id
+                ) AS user_purchases
+            ), '[]'::json)'''
+
+products_json_aggregate_template = 'json_agg({json_object} ORDER BY product_purchase.id)'
+
+# Выражения полей покупок группы: строка - значение поля, словарь - вложенный объект,
+# пара (шаблон, словарь) - список объектов, собираемый шаблоном
+group_purchases_json_columns = {
+    'roommates_group': {
+        'id': 'roommates_group.id',
+        'name': 'roommates_group.name',
+        'created_at': 'roommates_group.created_at',
+    },
+    'users_purchases': (users_purchases_json_subquery_template, {
+        'user': {
+            'id': 'u.id',
+            'username': 'u.username',
+            'email': 'u.email',
+            'first_name': 'u.first_name',
+            'last_name': 'u.last_name',
+            'is_superuser': 'u.is_superuser',
+            'is_staff': 'u.is_staff',
+            'date_joined': json_datetime_template.format(column='u.date_joined'),
+            'last_login': json_datetime_template.format(column='u.last_login'),
+        },
+        'products': (products_json_aggregate_template, {
+            'id': 'product.id',
+            'name': 'product.name',
+            'price': 'product_purchase.price',
+            'category': {
+                'id': 'category.id',
+                'name': 'category.name',
+            },
+        }),
+    }),
+}
+
+
+def get_json_object_sql(fields: dict[str, Any], columns: dict[str, Any], conditions: str = '',
+                        extra_keys: Iterable[str] = ()) -> str:
+    """
+    Функция, возвращающая выражение json_build_object с полями fields в их порядке. fields - дерево полей:
+    None для значения, словарь для вложенного объекта или списка объектов. Значения extra_keys передаются
+    параметрами запроса в виде JSON. Если для поля нет выражения в columns, возбуждается KeyError
+    """
+
+    pairs = []
+    for name, subfields in fields.items():
+        column = columns[name]
+        if isinstance(column, str) and subfields is None:
+            expression = column
+        elif isinstance(column, dict) and subfields is not None:
+            expression = get_json_object_sql(subfields, column, conditions)
+        elif isinstance(column, tuple) and subfields is not None:
+            template, item_columns = column
+            expression = template.format(json_object=get_json_object_sql(subfields, item_columns, conditions),
+                                         conditions=conditions)
+        else:
+            raise KeyError(name)
+        pairs.append(f"'{name}', {expression}")
+    pairs.extend(f"'{key}', %s::json" for key in extra_keys)
+    return f"json_build_object({', '.join(pairs)})"
@@ -1,44 +1,368 @@
-from typing import Union
+from datetime import datetime
+from itertools import groupby
+from operator import itemgetter
+from typing import Any, Iterable, Iterator, Mapping, NamedTuple, Optional
 
+from django.conf import settings
+from django.db import connection
+from django.db.models import BigIntegerField, Count, Q, Sum
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse, StreamingHttpResponse
+from django.http.response import HttpResponseBase
+from rest_framework.renderers import JSONRenderer
 from rest_framework.request import Request
 from rest_framework.response import Response
+from rest_framework.serializers import ListSerializer, Serializer
+from rest_framework.viewsets import GenericViewSet
 
-from accounts.models import RoommatesGroup, User
-from goods_accounting.models import ProductCategory, Product, ProductPurchase, Purchase
-from hostel_accounting.serializers import AllGroupsPurchasesSerializer
-from hostel_accounting.utils import get_all_fields_from_request
+from accounts.models import RoommatesGroup, PurchasesFilter, User
+from hostel_accounting.caching import CATALOG_SCOPE, get_cache_key, get_group_scope, get_purchases_cache, \
+    get_versions, get_etag, get_not_modified_response
+from hostel_accounting.paginations import DefaultPagination, encode_cursor, decode_datetime_cursor
+from goods_accounting.models import ProductPurchase
+from hostel_accounting.serializers import AllGroupsPurchasesSerializer, GroupsPurchasesQuerySerializer, \
+    GroupSpendingSerializer, PurchasesPeriodQuerySerializer, UserWithoutRoommatesGroupSerializer, \
+    GroupSettlementSerializer
+from hostel_accounting.utils import get_all_fields_from_request, get_authenticated_user, get_bool_from_request, \
+    get_field_plan, normalize_fields_params, render_with_field_plan
 
+groups_purchases_fields_params = ('fields', 'roommates_group_fields', 'user_fields',
+                                  'product_fields', 'product_category_fields')
+groups_spending_fields_params = ('fields', 'roommates_group_fields', 'user_fields', 'product_category_fields')
 
-def process_raw_groups_purchases(pk: int) -> list[dict[str, Union[User, list[ProductPurchase]]]]:
+
+class CategoryRecord(NamedTuple):
+    """Компактная запись категории товара из сырых данных покупок группы"""
+
+    id: int
+    name: str
+
+
+class ProductRecord(NamedTuple):
+    """Компактная запись товара из сырых данных покупок группы"""
+
+    id: int
+    name: str
+    category: CategoryRecord
+
+
+class ProductPurchaseRecord(NamedTuple):
+    """Компактная запись покупки товара из сырых данных покупок группы"""
+
+    product: ProductRecord
+    price: int
+
+
+class UserRecord(NamedTuple):
+    """Компактная запись пользователя из сырых данных покупок группы"""
+
+    id: int
+    username: str
+    email: str
+    first_name: str
+    last_name: str
+    is_superuser: bool
+    is_staff: bool
+    date_joined: datetime
+    last_login: Optional[datetime]
+
+
+class UserPurchasesRecord(NamedTuple):
+    """Запись со всеми покупками товаров одного пользователя"""
+
+    user: UserRecord
+    products: list[ProductPurchaseRecord]
+
+
+def aggregate_raw_groups_purchases(rows: Iterable[tuple]) -> list[UserPurchasesRecord]:
+    """
+    Функция, за один проход группирующая сырые строки покупок по пользователям. Одинаковые
+    товары и категории представляются одной и той же записью
+    """
+
+    users_purchases: dict[int, UserPurchasesRecord] = {}
+    products: dict[int, ProductRecord] = {}
+    categories: dict[int, CategoryRecord] = {}
+    for (_, user_id, username, email, first_name, last_name, is_superuser, is_staff, date_joined, last_login,
+         product_id, product_name, category_id, category_name, price) in rows:
+        user_purchases = users_purchases.get(user_id)
+        if user_purchases is None:
+            user = UserRecord(user_id, username, email, first_name, last_name,
+                              is_superuser, is_staff, date_joined, last_login)
+            user_purchases = users_purchases[user_id] = UserPurchasesRecord(user, [])
+
+        product = products.get(product_id)
+        if product is None:
+            category = categories.get(category_id)
+            if category is None:
+                category = categories[category_id] = CategoryRecord(category_id, category_name)
+            product = products[product_id] = ProductRecord(product_id, product_name, category)
+
+        user_purchases.products.append(ProductPurchaseRecord(product, price))
+    return list(users_purchases.values())
+
+
+def process_raw_groups_purchases(pk: int,
+                                 purchases_filter: PurchasesFilter = PurchasesFilter()) -> list[UserPurchasesRecord]:
     """Функция, обрабатывающая сырые данные всех покупок группы для дальнейшей сериализации"""
 
-    users_id = []
-    users_purchases = []
-    for obj in RoommatesGroup.objects.get_all_purchases(pk):
-        if obj.user_id not in users_id:
-            users_purchases.append(
-                {'user': User(pk=obj.user_id, username=obj.username, email=obj.email, first_name=obj.first_name,
-                              last_name=obj.last_name, is_superuser=obj.is_superuser, is_staff=obj.is_staff,
-                              date_joined=obj.date_joined, last_login=obj.last_login), 'products': []}
-            )
-            users_id.append(obj.user_id)
-        index = users_id.index(obj.user_id)
+    return aggregate_raw_groups_purchases(RoommatesGroup.objects.iterate_all_purchases(pk, purchases_filter))
+
+
+def get_groups_purchases_filter(request: Request,
+                                roommates_group: RoommatesGroup) -> tuple[PurchasesFilter, Optional[dict[str, Any]]]:
+    """
+    Функция, возвращающая условия отбора покупок группы из параметров запроса. Если запрошена
+    постраничная выдача, то условия ограничивают покупки одной страницей, а вторым значением
+    возвращаются данные о следующей странице
+    """
+
+    query = GroupsPurchasesQuerySerializer(data=request.query_params)
+    query.is_valid(raise_exception=True)
+    params = query.validated_data
+    purchases_filter = PurchasesFilter(since=params.get('since'), until=params.get('until'))
+    if 'cursor' not in params and 'page_size' not in params:
+        return purchases_filter, None
+
+    if 'cursor' in params:
+        purchases_filter = purchases_filter._replace(before_key=decode_datetime_cursor(params['cursor']))
+    page_size = params.get('page_size', DefaultPagination.page_size)
+    keys = RoommatesGroup.objects.get_purchases_keys(roommates_group, purchases_filter, page_size + 1)
+    if len(keys) <= page_size:
+        return purchases_filter, {'next_cursor': None}
+    last_key = keys[page_size - 1]
+    return purchases_filter._replace(from_key=last_key), {'next_cursor': encode_cursor(last_key)}
+
+
+def stream_groups_purchases(roommates_group: RoommatesGroup, fields_params: dict[str, Any],
+                            purchases_filter: PurchasesFilter = PurchasesFilter(),
+                            page_data: Optional[dict[str, Any]] = None) -> Iterator[bytes]:
+    """
+    Функция, по частям отдающая JSON со всеми покупками группы. Покупки каждого пользователя
+    сериализуются и отдаются сразу после того, как из курсора прочитаны все его строки
+    """
+
+    fields = get_field_plan(AllGroupsPurchasesSerializer, fields_params).fields
+    renderer = JSONRenderer()
+    separator = b''
+
+    yield b'{'
+    if 'roommates_group' in fields:
+        yield b'"roommates_group":' + renderer.render(fields['roommates_group'].to_representation(roommates_group))
+        separator = b','
+    # Сериализатор покупок одного пользователя - child списка users_purchases
+    user_purchases_serializer = getattr(fields.get('users_purchases'), 'child', None)
+    if user_purchases_serializer is not None:
+        yield separator + b'"users_purchases":['
+        rows = RoommatesGroup.objects.iterate_all_purchases(roommates_group, purchases_filter)
+        for index, (_, user_rows) in enumerate(groupby(rows, key=itemgetter(1))):
+            user_purchases = aggregate_raw_groups_purchases(user_rows)[0]
+            representation = user_purchases_serializer.to_representation(user_purchases)
+            yield (b',' if index else b'') + renderer.render(representation)
+        yield b']'
+        separator = b','
+    for key, value in (page_data or {}).items():
+        yield separator + renderer.render(key) + b':' + renderer.render(value)
+        separator = b','
+    yield b'}'
+
+
+def get_groups_purchases_cache_key(request: Request, roommates_group_id: Optional[int],
+                                   fields_params: Mapping[str, Optional[list[str]]]) -> str:
+    """
+    Функция, возвращающая ключ кэша ответа с покупками группы. Ключ зависит от запрошенных полей,
+    остальных параметров запроса и от версий данных покупок группы и каталога товаров
+    """
 
-        category = ProductCategory(pk=obj.category_id, name=obj.category_name)
-        product = Product(pk=obj.product_id, name=obj.product_name, category=category)
-        product_purchase = ProductPurchase(purchase=Purchase(), product=product, price=obj.price)
+    fields = normalize_fields_params(fields_params)
+    params = tuple(sorted((param, tuple(values)) for param, values in request.query_params.lists()
+                          if param not in fields_params))
+    versions = get_versions(get_group_scope(roommates_group_id), CATALOG_SCOPE)
+    return get_cache_key(f'group_purchases:{roommates_group_id}', fields, params, versions)
 
-        users_purchases[index]['products'].append(product_purchase)
-    return users_purchases
 
+def is_json_agg_engine_available() -> bool:
+    """
+    Функция, проверяющая, можно ли собирать JSON покупок группы в базе данных: нужен PostgreSQL,
+    а даты должны выводиться в UTC, как их выводит DRF при TIME_ZONE = 'UTC'
+    """
 
-def get_response_while_processing_groups_purchases(request: Request, roommates_group: RoommatesGroup) -> Response:
-    """Функция, возращающая ответ на запрос получения всех покупок комнаты"""
+    return settings.GROUP_PURCHASES_JSON_AGG and connection.vendor == 'postgresql' and settings.TIME_ZONE == 'UTC'
+
+
+def get_fields_tree(serializer: Serializer) -> dict[str, Any]:
+    """
+    Функция, возвращающая дерево читаемых полей сериализатора (например, плана полей): вложенные
+    сериализаторы и списки сериализаторов представляются словарями, остальные поля - None
+    """
+
+    tree: dict[str, Any] = {}
+    for field_name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        child = field.child if isinstance(field, ListSerializer) else field
+        tree[field_name] = get_fields_tree(child) if isinstance(child, Serializer) else None
+    return tree
+
+
+def get_groups_purchases_content(request: Request, roommates_group: RoommatesGroup,
+                                 fields_params: Mapping[str, Optional[list[str]]]) -> bytes:
+    """
+    Функция, возвращающая JSON со всеми покупками комнаты. В PostgreSQL JSON собирается запросом
+    с json_agg и возвращается без создания объектов в Python, на других СУБД и для полей,
+    которых нет в SQL-запросе, покупки группируются и сериализуются в Python
+    """
+
+    purchases_filter, page_data = get_groups_purchases_filter(request, roommates_group)
+    if is_json_agg_engine_available():
+        extra = {key: JSONRenderer().render(value).decode() for key, value in (page_data or {}).items()}
+        fields = get_fields_tree(get_field_plan(AllGroupsPurchasesSerializer, fields_params))
+        content = RoommatesGroup.objects.get_purchases_json(roommates_group, fields, purchases_filter, extra)
+        if content is not None:
+            return content
 
     raw_data = {'roommates_group': roommates_group,
-                'users_purchases': process_raw_groups_purchases(int(roommates_group.pk))}
+                'users_purchases': process_raw_groups_purchases(int(roommates_group.pk), purchases_filter)}
+    data = render_with_field_plan(AllGroupsPurchasesSerializer, raw_data, fields_params)
+    return JSONRenderer().render({**data, **(page_data or {})})
+
+
+def get_response_while_processing_groups_purchases(request: Request, view: GenericViewSet) -> HttpResponseBase:
+    """
+    Функция, возращающая ответ на запрос получения всех покупок комнаты пользователя. Готовый JSON
+    сохраняется в кэше до изменения покупок группы или каталога товаров, а ключ кэша служит ETag ответа.
+    Группа загружается из базы данных, только если ответа нет в кэше
+    """
+
+    view.kwargs['pk'] = roommates_group_id = get_authenticated_user(request).roommates_group_id
+    fields_params = get_all_fields_from_request(request, groups_purchases_fields_params)
+    if get_bool_from_request(request, 'stream'):
+        roommates_group = view.get_object()
+        purchases_filter, page_data = get_groups_purchases_filter(request, roommates_group)
+        return StreamingHttpResponse(stream_groups_purchases(roommates_group, fields_params,
+                                                             purchases_filter, page_data),
+                                     content_type='application/json')
+
+    cache_key = get_groups_purchases_cache_key(request, roommates_group_id, fields_params)
+    etag = get_etag(cache_key)
+    not_modified_response = get_not_modified_response(request, etag)
+    if not_modified_response is not None:
+        return not_modified_response
+
+    cache = get_purchases_cache()
+    content = cache.get(cache_key)
+    if content is None:
+        content = get_groups_purchases_content(request, view.get_object(), fields_params)
+        cache.set(cache_key, content)
+    response = HttpResponse(content, content_type='application/json')
+    response['ETag'] = etag
+    return response
+
+
+def get_groups_spending(roommates_group: RoommatesGroup, user_fields: Optional[list[str]],
+                        period: dict[str, Any]) -> list[dict[str, Any]]:
+    """
+    Функция, возвращающая суммы и количество покупок товаров каждого члена комнаты
+    по категориям товаров. Суммы считаются в базе данных одним запросом с GROUP BY, покупки присоединяются
+    к пользователям через LEFT JOIN, поэтому члены комнаты без покупок за период получают нулевые суммы
+    """
+
+    user_fields = [field for field in UserWithoutRoommatesGroupSerializer.Meta.fields
+                   if user_fields is None or field in user_fields or field == 'id']
+    period_filter = Q()
+    if 'since' in period:
+        period_filter &= Q(purchase__datetime__gte=period['since'])
+    if 'until' in period:
+        period_filter &= Q(purchase__datetime__lt=period['until'])
+
+    rows = User.objects \
+        .filter(roommates_group=roommates_group) \
+        .values(*user_fields, 'purchase__productpurchase__product__category__id',
+                'purchase__productpurchase__product__category__name') \
+        .annotate(total=Coalesce(Sum('purchase__productpurchase__price', filter=period_filter), 0),
+                  count=Count('purchase__productpurchase__id', filter=period_filter)) \
+        .order_by('id', 'purchase__productpurchase__product__category__id')
+
+    users_spending: list[dict[str, Any]] = []
+    for row in rows:
+        if not users_spending or users_spending[-1]['user']['id'] != row['id']:
+            user = {field: row[field] for field in user_fields}
+            users_spending.append({'user': user, 'total': 0, 'count': 0, 'categories': []})
+        # Строка без покупок за период: пользователь без покупок или категория, купленная вне периода
+        if not row['count']:
+            continue
+        user_spending = users_spending[-1]
+        user_spending['total'] += row['total']
+        user_spending['count'] += row['count']
+
+        category = None
+        if row['purchase__productpurchase__product__category__id'] is not None:
+            category = {'id': row['purchase__productpurchase__product__category__id'],
+                        'name': row['purchase__productpurchase__product__category__name']}
+        user_spending['categories'].append({'category': category, 'total': row['total'], 'count': row['count']})
+    return users_spending
+
+
+def get_response_while_processing_groups_spending(request: Request, roommates_group: RoommatesGroup) -> Response:
+    """Функция, возращающая ответ на запрос получения трат членов комнаты по категориям товаров"""
+
+    fields_params = get_all_fields_from_request(request, groups_spending_fields_params)
+    period = PurchasesPeriodQuerySerializer(data=request.query_params)
+    period.is_valid(raise_exception=True)
+
+    raw_data = {'roommates_group': roommates_group,
+                'users_spending': get_groups_spending(roommates_group, fields_params['user_fields'],
+                                                      period.validated_data)}
+    return Response(render_with_field_plan(GroupSpendingSerializer, raw_data, fields_params))
+
+
+def get_groups_balances(roommates_group: RoommatesGroup) -> list[dict[str, Any]]:
+    """
+    Функция, возвращающая балансы членов комнаты: разницу между суммой покупок пользователя
+    и его долей в сумме покупок всей комнаты. Остаток от деления суммы на доли распределяется
+    по одной единице между первыми пользователями. Суммы покупок берутся из UserBalance
+    """
+
+    users = list(User.objects.filter(roommates_group=roommates_group)
+                 .annotate(spent=Coalesce('balance__spent', 0, output_field=BigIntegerField())))
+    if not users:
+        return []
+
+    share, remainder = divmod(sum(user.spent for user in users), len(users))
+    return [{'user': user, 'spent': user.spent, 'balance': user.spent - share - (index < remainder)}
+            for index, user in enumerate(users)]
+
+
+def get_settlement_transfers(balances: Iterable[tuple[int, int]]) -> list[dict[str, int]]:
+    """
+    Функция, возвращающая переводы между пользователями, после которых балансы всех пользователей
+    станут нулевыми. Самые крупные должники рассчитываются с самыми крупными кредиторами, поэтому
+    переводов не больше, чем пользователей без одного. Сложность O(n log n)
+    """
+
+    balances = list(balances)
+    debtors = sorted(([-balance, user_id] for user_id, balance in balances if balance < 0), reverse=True)
+    creditors = sorted(([balance, user_id] for user_id, balance in balances if balance > 0), reverse=True)
+    transfers = []
+    debtor_index = creditor_index = 0
+    while debtor_index < len(debtors) and creditor_index < len(creditors):
+        debtor, creditor = debtors[debtor_index], creditors[creditor_index]
+        amount = min(debtor[0], creditor[0])
+        transfers.append({'from_user': debtor[1], 'to_user': creditor[1], 'amount': amount})
+        debtor[0] -= amount
+        creditor[0] -= amount
+        if not debtor[0]:
+            debtor_index += 1
+        if not creditor[0]:
+            creditor_index += 1
+    return transfers
+
+
+def get_response_while_processing_groups_settlement(request: Request, roommates_group: RoommatesGroup) -> Response:
+    """Функция, возращающая ответ на запрос получения балансов членов комнаты и переводов между ними"""
 
-    fields_params = get_all_fields_from_request(request, ('fields', 'roommates_group_fields', 'user_fields',
-                                                          'product_fields', 'product_category_fields'))
-    serializer = AllGroupsPurchasesSerializer(raw_data, **fields_params)
-    return Response(serializer.data)
+    fields_params = get_all_fields_from_request(request, ('fields', 'user_fields'))
+    balances = get_groups_balances(roommates_group)
+    transfers = get_settlement_transfers((balance['user'].pk, balance['balance']) for balance in balances)
+    return Response(render_with_field_plan(GroupSettlementSerializer, {'balances': balances, 'transfers': transfers},
+                                           fields_params))
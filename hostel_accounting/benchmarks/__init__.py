@@ -0,0 +1,10 @@
+import os
+
+import django
+
+
+def setup_django() -> None:
+    """Функция, настраивающая Django для запуска бенчмарков как отдельных скриптов"""
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hostel_accounting.settings')
+    django.setup()
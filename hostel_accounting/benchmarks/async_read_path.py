@@ -0,0 +1,118 @@
+"""
+Бенчмарк пропускной способности эндпоинтов чтения под WSGI и ASGI при множестве одновременных
+соединений медленных клиентов. WSGI-сервер моделируется пулом из WSGI_THREADS потоков, каждый из которых
+занят запросом, пока клиент не прочитает ответ. ASGI-сервер моделируется одним циклом событий,
+в котором отправка ответа медленному клиенту не занимает поток.
+
+Бенчмарк создает тестовую базу данных и удаляет ее после завершения.
+Запуск из каталога с manage.py (с теми же переменными окружения, что и для manage.py):
+    python -m benchmarks.async_read_path
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Mapping
+
+from benchmarks import setup_django
+
+setup_django()
+
+from django.conf import settings  # noqa: E402
+from django.core.handlers.asgi import ASGIHandler  # noqa: E402
+from django.core.handlers.wsgi import WSGIHandler  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+from rest_framework_simplejwt.tokens import AccessToken  # noqa: E402
+
+from accounts.models import User, RoommatesGroup  # noqa: E402
+from goods_accounting.models import ProductCategory, Product, Purchase, ProductPurchase  # noqa: E402
+
+CONNECTIONS = 100
+WSGI_THREADS = 4
+CLIENT_DELAYS = (0, 0.05)
+ENDPOINTS = (
+    ('products', 'goods-accounting/products/'),
+    ('purchases', 'goods-accounting/purchases/'),
+    ('group purchases', 'accounts/roommates-groups/purchases/'),
+)
+
+
+def fill_database() -> str:
+    """Функция, заполняющая тестовую базу данных и возвращающая JWT пользователя"""
+
+    group = RoommatesGroup.objects.create(name='group')
+    users = User.objects.bulk_create(User(username=f'user{i}', email=f'user{i}@mail.com', roommates_group=group,
+                                          is_staff=i == 0) for i in range(6))
+    categories = ProductCategory.objects.bulk_create(ProductCategory(name=f'category{i}') for i in range(20))
+    products = Product.objects.bulk_create(Product(name=f'product{i}', category=categories[i % 20])
+                                           for i in range(200))
+    purchases = Purchase.objects.bulk_create(Purchase(user=users[i % 6]) for i in range(100))
+    ProductPurchase.objects.bulk_create(ProductPurchase(purchase=purchase, product=products[(i + j) % 200], price=j)
+                                        for i, purchase in enumerate(purchases) for j in range(5))
+    return str(AccessToken.for_user(users[0]))
+
+
+def run_wsgi(handler: WSGIHandler, path: str, token: str, client_delay: float) -> float:
+    """Функция, выполняющая CONNECTIONS запросов через пул потоков WSGI и возвращающая запросы в секунду"""
+
+    environ = RequestFactory().get(path, HTTP_AUTHORIZATION=f'Bearer {token}').environ
+
+    def request(_: Any) -> None:
+        body = handler(dict(environ), lambda status, headers: None)
+        for _chunk in body:
+            time.sleep(client_delay)
+        body.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(WSGI_THREADS) as executor:
+        list(executor.map(request, range(CONNECTIONS)))
+    return CONNECTIONS / (time.perf_counter() - started)
+
+
+async def run_asgi(handler: ASGIHandler, path: str, token: str, client_delay: float) -> float:
+    """Функция, выполняющая CONNECTIONS одновременных запросов через ASGI и возвращающая запросы в секунду"""
+
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'query_string': b'', 'server': ('testserver', 80), 'client': ('127.0.0.1', 0),
+        'headers': [(b'host', b'testserver'), (b'authorization', f'Bearer {token}'.encode())],
+    }
+
+    async def receive() -> dict[str, Any]:
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message: Mapping[str, Any]) -> None:
+        if message['type'] == 'http.response.body':
+            await asyncio.sleep(client_delay)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(handler(dict(scope), receive, send) for _ in range(CONNECTIONS)))
+    return CONNECTIONS / (time.perf_counter() - started)
+
+
+def main() -> None:
+    settings.DEBUG = False
+    settings.ALLOWED_HOSTS = ['testserver']
+    settings.MIDDLEWARE = [middleware for middleware in settings.MIDDLEWARE if 'debug_toolbar' not in middleware]
+
+    old_database_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        token = fill_database()
+        wsgi_handler, asgi_handler = WSGIHandler(), ASGIHandler()
+        print(f'{CONNECTIONS} connections, {WSGI_THREADS} WSGI threads, requests/s')
+        print(f'{"endpoint":<16} {"client delay":>12} {"WSGI sync":>10} {"ASGI sync":>10} {"ASGI async":>10}')
+        for name, path in ENDPOINTS:
+            for client_delay in CLIENT_DELAYS:
+                results = (
+                    run_wsgi(wsgi_handler, f'/api/{path}', token, client_delay),
+                    asyncio.run(run_asgi(asgi_handler, f'/api/{path}', token, client_delay)),
+                    asyncio.run(run_asgi(asgi_handler, f'/api/async/{path}', token, client_delay)),
+                )
+                print(f'{name:<16} {client_delay:>11}s' + ''.join(f'{result:>11,.0f}' for result in results))
+    finally:
+        connection.creation.destroy_test_db(old_database_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Бенчмарк агрегации сырых строк покупок группы.
+
+Запуск из каталога с manage.py (с теми же переменными окружения, что и для manage.py):
+    python -m benchmarks.group_purchases_aggregation
+"""
+
+import random
+import time
+from datetime import datetime, timezone
+
+from benchmarks import setup_django
+
+setup_django()
+
+from accounts.utils import aggregate_raw_groups_purchases  # noqa: E402
+
+ROWS_COUNTS = (10_000, 100_000, 1_000_000)
+USERS_COUNT = 6
+PRODUCTS_COUNT = 500
+CATEGORIES_COUNT = 20
+
+
+def generate_rows(count: int) -> list[tuple]:
+    """Функция, генерирующая строки в формате запроса all_group_purchases_query"""
+
+    now = datetime.now(timezone.utc)
+    users = [(0, user_id, f'user{user_id}', f'user{user_id}@mail.com', 'first', 'last', False, False, now, now)
+             for user_id in range(1, USERS_COUNT + 1)]
+    products = [(product_id, f'product{product_id}', product_id % CATEGORIES_COUNT + 1,
+                 f'category{product_id % CATEGORIES_COUNT + 1}') for product_id in range(1, PRODUCTS_COUNT + 1)]
+    rows = [users[i * USERS_COUNT // count] + random.choice(products) + (random.randint(1, 1000),)
+            for i in range(count)]
+    return rows
+
+
+def main() -> None:
+    for count in ROWS_COUNTS:
+        rows = generate_rows(count)
+        started = time.perf_counter()
+        aggregate_raw_groups_purchases(rows)
+        elapsed = time.perf_counter() - started
+        print(f'{count:>9} rows: {elapsed:.3f} s, {count / elapsed:,.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
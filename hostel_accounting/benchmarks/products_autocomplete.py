@@ -0,0 +1,79 @@
+"""
+Бенчмарк задержки поиска товаров по началу названия в индексе названий: p50, p99 и максимум
+для каталогов разного размера, поиска по всему каталогу и по категории, а также задержка
+применения изменения товара к индексу. Индекс строится из сгенерированных строк без базы данных,
+версия каталога тоже задается в памяти процесса.
+
+Запуск из каталога с manage.py (с теми же переменными окружения, что и для manage.py):
+    python -m benchmarks.products_autocomplete
+"""
+
+import math
+import random
+import time
+from typing import Callable, Optional
+
+from benchmarks import setup_django
+
+setup_django()
+
+from django.conf import settings  # noqa: E402
+
+from hostel_accounting.caching import CATALOG_SCOPE, checked_versions  # noqa: E402
+from hostel_accounting.prefix_index import IndexRow, PrefixIndex  # noqa: E402
+
+CATALOG_SIZES = (10_000, 100_000)
+CATEGORIES = 50
+SEARCHES = 20_000
+WORDS = ('молоко', 'молочный', 'мёд', 'хлеб', 'батон', 'сыр', 'масло', 'чай', 'кофе', 'сахар', 'соль', 'перец',
+         'мыло', 'шампунь', 'губка', 'изолента', 'лампочка', 'пакет', 'салфетки', 'вода')
+
+
+def get_rows(size: int) -> list[IndexRow]:
+    """Функция, возвращающая строки каталога из size товаров со случайными названиями из 1-3 слов"""
+
+    rng = random.Random(size)
+    return [(pk, ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 3))) + f' {pk}', pk % CATEGORIES)
+            for pk in range(1, size + 1)]
+
+
+def get_percentiles(timings: list[int]) -> tuple[float, float, float]:
+    """Функция, возвращающая p50, p99 и максимум задержек в микросекундах"""
+
+    timings = sorted(timings)
+    return (timings[len(timings) // 2] / 1000, timings[len(timings) * 99 // 100] / 1000, timings[-1] / 1000)
+
+
+def measure(call: Callable[[int], object], count: int) -> tuple[float, float, float]:
+    timings = []
+    for i in range(count):
+        started = time.perf_counter_ns()
+        call(i)
+        timings.append(time.perf_counter_ns() - started)
+    return get_percentiles(timings)
+
+
+def main() -> None:
+    settings.DATA_VERSION_CHECK_INTERVAL = math.inf
+    print(f'{"products":>9} {"search":<10} {"p50, us":>9} {"p99, us":>9} {"max, us":>9}')
+    for size in CATALOG_SIZES:
+        rows = get_rows(size)
+        index = PrefixIndex(lambda: rows)
+        checked_versions[CATALOG_SCOPE] = (time.monotonic(), size)
+        index.refresh()
+        rng = random.Random(0)
+        prefixes = [rows[rng.randrange(size)][1][:rng.randint(1, 8)] for _ in range(SEARCHES)]
+        categories: list[Optional[int]] = [rng.randrange(CATEGORIES) for _ in range(SEARCHES)]
+
+        cases = (
+            ('all', lambda i: index.search(prefixes[i])),
+            ('category', lambda i: index.search(prefixes[i], categories[i])),
+            ('update', lambda i: index.update((i % size + 1, f'{prefixes[i]} {i}', categories[i]))),
+        )
+        for name, call in cases:
+            p50, p99, maximum = measure(call, SEARCHES)
+            print(f'{size:>9,} {name:<10} {p50:>9.1f} {p99:>9.1f} {maximum:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+Бенчмарк индексов для запросов покупок: планы EXPLAIN (ANALYZE, BUFFERS) и время выполнения
+запросов до миграций с индексами (только индексы внешних ключей) и после них на одной и той же
+заполненной базе данных. Работает только с PostgreSQL.
+
+Бенчмарк создает тестовую базу данных и удаляет ее после завершения.
+Запуск из каталога с manage.py (с теми же переменными окружения, что и для manage.py):
+    python -m benchmarks.purchase_indexes
+"""
+
+import re
+from typing import Any, Callable, Sequence
+
+from benchmarks import setup_django
+
+setup_django()
+
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.models import QuerySet  # noqa: E402
+
+from accounts.raw_sql_queries import (  # noqa: E402
+    all_group_purchases_query, group_purchases_keys_query_template, group_purchases_keys_lateral_query_template)
+from goods_accounting.models import Purchase, ProductPurchase  # noqa: E402
+
+GROUPS = 2_000
+USERS_PER_GROUP = 5
+USERS_WITHOUT_GROUP = 1_000
+CATEGORIES = 50
+PRODUCTS = 5_000
+PURCHASES = 500_000
+PRODUCTS_PER_PURCHASE = 3
+PAGE_SIZE = 50
+REPEATS = 5
+BEFORE_MIGRATIONS = (('accounts', '0004_userbalance'),
+                     ('goods_accounting', '0002_alter_productpurchase_options_alter_purchase_options'))
+
+Query = tuple[str, Sequence[Any]]
+
+
+def fill_database() -> None:
+    """Функция, заполняющая тестовую базу данных: id объектов каждой таблицы идут подряд с 1"""
+
+    users = GROUPS * USERS_PER_GROUP + USERS_WITHOUT_GROUP
+    with connection.cursor() as cursor:
+        cursor.execute('''
+            INSERT INTO accounts_roommatesgroup (name, created_at)
+            SELECT 'group' || i, now() FROM generate_series(1, %s) AS i''', [GROUPS])
+        # Первые GROUPS * USERS_PER_GROUP пользователей распределены по группам, остальные - без группы
+        cursor.execute('''
+            INSERT INTO accounts_user (password, is_superuser, username, first_name, last_name, email, is_staff,
+                                       is_active, date_joined, roommates_group_id)
+            SELECT '', false, 'user' || i, '', '', 'user' || i || '@mail.com', false, true, now(),
+                   CASE WHEN i <= %s THEN (i - 1) %% %s + 1 END
+            FROM generate_series(1, %s) AS i''', [GROUPS * USERS_PER_GROUP, GROUPS, users])
+        cursor.execute('''
+            INSERT INTO goods_accounting_productcategory (name)
+            SELECT 'category' || i FROM generate_series(1, %s) AS i''', [CATEGORIES])
+        cursor.execute('''
+            INSERT INTO goods_accounting_product (name, category_id)
+            SELECT 'product' || i, (i - 1) %% %s + 1 FROM generate_series(1, %s) AS i''', [CATEGORIES, PRODUCTS])
+        cursor.execute('''
+            INSERT INTO goods_accounting_purchase (user_id, datetime)
+            SELECT (random() * (%s - 1))::int + 1, now() - random() * interval '365 days'
+            FROM generate_series(1, %s) AS i''', [users, PURCHASES])
+        cursor.execute('''
+            INSERT INTO goods_accounting_productpurchase (purchase_id, product_id, price)
+            SELECT (i - 1) / %s + 1, (random() * (%s - 1))::int + 1, (random() * 1000)::int
+            FROM generate_series(1, %s) AS i''', [PRODUCTS_PER_PURCHASE, PRODUCTS, PURCHASES * PRODUCTS_PER_PURCHASE])
+        cursor.execute('VACUUM ANALYZE')
+
+
+def get_sql(queryset: QuerySet) -> Query:
+    return queryset.query.sql_with_params()
+
+
+def get_queries() -> list[tuple[str, Callable[[], Query]]]:
+    """Функция, возвращающая запросы покупок, для которых сравниваются планы"""
+
+    group_id = GROUPS // 2
+    user_without_group_id = GROUPS * USERS_PER_GROUP + 1
+    purchase = Purchase.objects.filter(user_id__isnull=False).order_by('-id').first()
+    product_purchases = list(ProductPurchase.objects.filter(purchase=purchase))
+    page = list(Purchase.objects.filter(user__roommates_group_id=group_id)
+                .order_by('-datetime', '-id').values_list('id', flat=True)[:PAGE_SIZE])
+    return [
+        ('user purchases', lambda: get_sql(
+            Purchase.objects.filter(user_id=user_without_group_id).order_by('-datetime', '-id')[:PAGE_SIZE])),
+        ('group purchases', lambda: get_sql(
+            Purchase.objects.filter(user__roommates_group_id=group_id).order_by('-datetime', '-id')[:PAGE_SIZE])),
+        ('all purchases', lambda: get_sql(Purchase.objects.order_by('-datetime', '-id')[:PAGE_SIZE])),
+        ('page products', lambda: get_sql(ProductPurchase.objects.filter(purchase_id__in=page))),
+        ('delete products', lambda: get_sql(
+            ProductPurchase.objects.filter(purchase=purchase,
+                                           product__in={obj.product_id for obj in product_purchases},
+                                           price__in={obj.price for obj in product_purchases})
+            .values_list('id', 'product_id', 'price'))),
+        ('group keys', lambda: (group_purchases_keys_query_template.format(conditions=''), (group_id, PAGE_SIZE))),
+        ('group keys lateral', lambda: (group_purchases_keys_lateral_query_template.format(conditions=''),
+                                        (PAGE_SIZE, group_id, PAGE_SIZE))),
+        ('group rows', lambda: (all_group_purchases_query, (group_id,))),
+    ]
+
+
+def explain(query: Query) -> tuple[float, str]:
+    """Функция, возвращающая наименьшее время выполнения запроса в мс за REPEATS запусков и план последнего"""
+
+    sql, params = query
+    timings, plan = [], ''
+    with connection.cursor() as cursor:
+        for _ in range(REPEATS):
+            cursor.execute(f'EXPLAIN (ANALYZE, BUFFERS) {sql}', params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+            timings.append(float(re.search(r'Execution Time: ([\d.]+) ms', plan).group(1)))
+    return min(timings), plan
+
+
+def explain_all(title: str, queries: list[tuple[str, Callable[[], Query]]]) -> list[float]:
+    timings = []
+    for name, get_query in queries:
+        timing, plan = explain(get_query())
+        print(f'=== {title}: {name} ===\n{plan}\n')
+        timings.append(timing)
+    return timings
+
+
+def main() -> None:
+    if connection.vendor != 'postgresql':
+        raise SystemExit('Бенчмарк работает только с PostgreSQL')
+
+    old_database_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        for app_label, migration_name in BEFORE_MIGRATIONS:
+            call_command('migrate', app_label, migration_name, verbosity=0)
+        fill_database()
+        queries = get_queries()
+        before = explain_all('before', queries)
+
+        call_command('migrate', verbosity=0)
+        with connection.cursor() as cursor:
+            cursor.execute('VACUUM ANALYZE')
+        after = explain_all('after', queries)
+
+        print(f'{"query":<16} {"before, ms":>11} {"after, ms":>10}')
+        for (name, _), before_timing, after_timing in zip(queries, before, after):
+            print(f'{name:<16} {before_timing:>11.3f} {after_timing:>10.3f}')
+    finally:
+        connection.creation.destroy_test_db(old_database_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Микробенчмарк сериализации небольших ответов с динамическими полями: создание сериализатора
+и удаление ненужных полей на каждый запрос против готового плана полей.
+
+Запуск из каталога с manage.py (с теми же переменными окружения, что и для manage.py):
+    python -m benchmarks.serializer_field_plans
+"""
+
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable
+
+from benchmarks import setup_django
+
+setup_django()
+
+from accounts.models import User, RoommatesGroup  # noqa: E402
+from accounts.utils import CategoryRecord, ProductRecord, ProductPurchaseRecord, UserRecord, \
+    UserPurchasesRecord  # noqa: E402
+from goods_accounting.models import ProductCategory, Product, Purchase, ProductPurchase  # noqa: E402
+from hostel_accounting.serializers import AllGroupsPurchasesSerializer, PurchaseSerializer  # noqa: E402
+from hostel_accounting.utils import render_with_field_plan  # noqa: E402
+
+ITERATIONS = 2000
+FIELDS_PARAMS = (
+    {},
+    {'fields': ['id', 'products'], 'product_fields': ['name', 'price'], 'user_fields': None,
+     'product_category_fields': None},
+)
+
+
+def get_purchase() -> Purchase:
+    """Функция, возвращающая покупку с тремя товарами без обращения к базе данных"""
+
+    now = datetime.now(timezone.utc)
+    user = User(id=1, username='user', email='user@mail.com', date_joined=now,
+                roommates_group=RoommatesGroup(id=1, name='group', created_at=now.date()))
+    purchase = Purchase(id=1, user=user, datetime=now)
+    category = ProductCategory(id=1, name='category')
+    purchase._prefetched_objects_cache = {'productpurchase_set': [
+        ProductPurchase(id=i, product=Product(id=i, name=f'product{i}', category=category), price=i * 10)
+        for i in range(1, 4)
+    ]}
+    return purchase
+
+
+def get_groups_purchases() -> dict[str, Any]:
+    """Функция, возвращающая покупки группы из двух пользователей в виде записей агрегации"""
+
+    now = datetime.now(timezone.utc)
+    category = CategoryRecord(1, 'category')
+    products = [ProductPurchaseRecord(ProductRecord(i, f'product{i}', category), i * 10) for i in range(1, 4)]
+    users_purchases = [UserPurchasesRecord(UserRecord(i, f'user{i}', '', '', '', False, False, now, now), products)
+                       for i in range(1, 3)]
+    roommates_group = RoommatesGroup(id=1, name='group', created_at=now.date())
+    return {'roommates_group': roommates_group, 'users_purchases': users_purchases}
+
+
+def measure(render: Callable[[], Any]) -> float:
+    """Функция, возвращающая среднее время одного вызова в микросекундах"""
+
+    started = time.perf_counter()
+    for _ in range(ITERATIONS):
+        render()
+    return (time.perf_counter() - started) / ITERATIONS * 1_000_000
+
+
+def main() -> None:
+    cases = (('PurchaseSerializer', PurchaseSerializer, get_purchase()),
+             ('AllGroupsPurchasesSerializer', AllGroupsPurchasesSerializer, get_groups_purchases()))
+    print(f'{"serializer":<30} {"fields":>8} {"per request, us":>16} {"field plan, us":>15}')
+    for name, serializer_class, instance in cases:
+        for fields_params in FIELDS_PARAMS:
+            per_request = measure(lambda: serializer_class(instance, **fields_params).data)
+            field_plan = measure(lambda: render_with_field_plan(serializer_class, instance, fields_params))
+            fields = 'pruned' if fields_params else 'all'
+            print(f'{name:<30} {fields:>8} {per_request:>16,.1f} {field_plan:>15,.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Бенчмарк пропускной способности списков товаров, категорий и пользователей: модели и сериализатор
+по плану полей против строк values() и рендерера без сериализатора. Время включает запрос к базе данных.
+
+Бенчмарк создает тестовую базу данных и удаляет ее после завершения.
+Запуск из каталога с manage.py (с теми же переменными окружения, что и для manage.py):
+    python -m benchmarks.values_renderer
+"""
+
+import time
+from typing import Any, Callable
+
+from benchmarks import setup_django
+
+setup_django()
+
+from django.db import connection  # noqa: E402
+
+from accounts.models import User, RoommatesGroup  # noqa: E402
+from goods_accounting.models import ProductCategory, Product  # noqa: E402
+from hostel_accounting.querysets import get_values_renderer, optimize_queryset  # noqa: E402
+from hostel_accounting.serializers import ProductCategorySerializer, ProductSerializer, UserSerializer  # noqa: E402
+from hostel_accounting.utils import get_field_plan  # noqa: E402
+
+ROWS = (50, 1000)
+ITERATIONS = 50
+CASES = (
+    ('products', ProductSerializer, Product),
+    ('categories', ProductCategorySerializer, ProductCategory),
+    ('users', UserSerializer, User),
+)
+
+
+def fill_database(rows: int) -> None:
+    """Функция, заполняющая тестовую базу данных rows объектами каждого вида"""
+
+    group = RoommatesGroup.objects.create(name='group')
+    User.objects.bulk_create(User(username=f'user{i}', email=f'user{i}@mail.com',
+                                  roommates_group=group if i % 2 else None) for i in range(rows))
+    categories = ProductCategory.objects.bulk_create(ProductCategory(name=f'category{i}') for i in range(rows))
+    Product.objects.bulk_create(Product(name=f'product{i}', category=categories[i]) for i in range(rows))
+
+
+def measure(render: Callable[[], Any]) -> float:
+    """Функция, возвращающая количество вызовов в секунду"""
+
+    started = time.perf_counter()
+    for _ in range(ITERATIONS):
+        render()
+    return ITERATIONS / (time.perf_counter() - started)
+
+
+def main() -> None:
+    old_database_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        print(f'{"endpoint":<12} {"rows":>6} {"serializer, rps":>16} {"values, rps":>12} {"speedup":>8}')
+        for rows in ROWS:
+            for model in (Product, ProductCategory, User, RoommatesGroup):
+                model.objects.all().delete()
+            fill_database(rows)
+            for name, serializer_class, model in CASES:
+                field_plan = get_field_plan(serializer_class, many=True)
+                values_renderer = get_values_renderer(field_plan.child)
+                queryset = model.objects.order_by('pk')
+                serializer = measure(lambda: field_plan.to_representation(optimize_queryset(queryset, field_plan)))
+                values = measure(lambda: values_renderer.render(values_renderer.get_values(queryset)))
+                print(f'{name:<12} {rows:>6} {serializer:>16,.0f} {values:>12,.0f} {values / serializer:>7.1f}x')
+    finally:
+        connection.creation.destroy_test_db(old_database_name, verbosity=0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,14 @@
+from typing import Any
+
 from django.contrib import admin
+from django.db.models import QuerySet, Sum
+from django.forms import ModelForm
+from django.http import HttpRequest
 
+from accounts.models import UserBalance
+from hostel_accounting.caching import bump_user_purchases_version
 from .models import *
+from .utils import delete_purchase
 
 
 @admin.register(ProductCategory)
@@ -27,3 +35,29 @@ class PurchaseAdmin(admin.ModelAdmin):
     readonly_fields = ('datetime',)
     list_display = ('user', 'datetime')
     inlines = (ProductInline,)
+
+    @staticmethod
+    def change_spent(purchase: Purchase, sign: int) -> None:
+        """Метод, добавляющий (sign=1) или вычитающий (sign=-1) сумму покупки из баланса ее пользователя"""
+
+        spent = purchase.productpurchase_set.aggregate(spent=Sum('price'))['spent'] or 0
+        UserBalance.objects.change_spent(purchase.user_id, sign * spent)
+        bump_user_purchases_version(purchase.user)
+
+    def save_model(self, request: HttpRequest, obj: Purchase, form: ModelForm, change: bool) -> None:
+        # Сумма покупки до изменения вычитается из баланса прежнего пользователя, а после сохранения
+        # покупки и ее товаров в save_related добавляется к балансу нового
+        if change:
+            self.change_spent(Purchase.objects.select_related('user').get(pk=obj.pk), -1)
+        super().save_model(request, obj, form, change)
+
+    def save_related(self, request: HttpRequest, form: ModelForm, formsets: Any, change: bool) -> None:
+        super().save_related(request, form, formsets, change)
+        self.change_spent(form.instance, 1)
+
+    def delete_model(self, request: HttpRequest, obj: Purchase) -> None:
+        delete_purchase(obj)
+
+    def delete_queryset(self, request: HttpRequest, queryset: QuerySet[Purchase]) -> None:
+        for purchase in queryset.select_related('user'):
+            delete_purchase(purchase)
@@ -0,0 +1,10 @@
+from django.urls import path
+
+from .async_views import product_list, purchase_list, purchase_retrieve
+
+# Стабы django-stubs не знают об асинхронных представлениях, поэтому типы аргументов path не сходятся
+urlpatterns = [
+    path('products/', product_list, name='async-product-list'),  # type: ignore[arg-type]
+    path('purchases/', purchase_list, name='async-purchase-list'),  # type: ignore[arg-type]
+    path('purchases/<int:pk>/', purchase_retrieve, name='async-purchase-detail'),  # type: ignore[arg-type]
+]
@@ -0,0 +1,56 @@
+"""
+Асинхронные представления для чтения товаров и покупок. Возвращают те же данные, что и синхронные
+представления, но не занимают поток на время передачи ответа медленному клиенту при работе под ASGI
+"""
+
+from asgiref.sync import sync_to_async
+from django.http.response import HttpResponseBase
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
+
+from goods_accounting.api.views import ProductViewSet, PurchaseViewSet
+from hostel_accounting.async_api import aget_default_list_response_with_pagination, async_api_view, \
+    render_json
+from hostel_accounting.caching import CATALOG_SCOPE, get_etag, get_not_modified_response, get_user_purchases_scope, \
+    get_versions
+from hostel_accounting.querysets import optimize_queryset
+from hostel_accounting.serializers import PurchaseSerializer
+from hostel_accounting.utils import get_all_fields_from_request, get_authenticated_user, get_field_plan
+
+purchase_fields_params = ('fields', 'user_fields', 'product_fields', 'product_category_fields')
+
+
+@async_api_view(IsAuthenticated)
+async def product_list(request: Request) -> HttpResponseBase:
+    view = ProductViewSet(request=request, action='list', format_kwarg=None)
+    return await aget_default_list_response_with_pagination(request, view, ('fields', 'category_fields'))
+
+
+@async_api_view(IsAuthenticated)
+async def purchase_list(request: Request) -> HttpResponseBase:
+    scope = get_user_purchases_scope(get_authenticated_user(request))
+    versions = await sync_to_async(get_versions)(scope, CATALOG_SCOPE)
+    etag = get_etag(request.get_full_path(), scope, versions)
+    not_modified_response = get_not_modified_response(request, etag)
+    if not_modified_response is not None:
+        return not_modified_response
+
+    view = PurchaseViewSet(request=request, action='list', format_kwarg=None)
+    response = await aget_default_list_response_with_pagination(request, view, purchase_fields_params)
+    response['ETag'] = etag
+    return response
+
+
+@async_api_view(IsAuthenticated)
+async def purchase_retrieve(request: Request, pk: int) -> HttpResponseBase:
+    field_plan = get_field_plan(PurchaseSerializer, get_all_fields_from_request(request, purchase_fields_params))
+    view = PurchaseViewSet(request=request, action='retrieve', format_kwarg=None, kwargs={'pk': pk})
+    queryset = optimize_queryset(view.get_queryset(), field_plan).filter(pk=pk)
+    purchase = await queryset.afirst()  # type: ignore[attr-defined]
+    if purchase is None:
+        raise NotFound()
+    # Разрешения на объект те же, что и у синхронного представления. Они могут загружать связи покупки,
+    # которых нет среди требуемых полей, поэтому проверяются в потоке
+    await sync_to_async(view.check_object_permissions)(request, purchase)
+    return render_json(field_plan.to_representation(purchase))
@@ -1,4 +1,5 @@
 from copy import copy, deepcopy
+from typing import Any
 
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import OpenApiParameter, OpenApiExample, inline_serializer
@@ -16,12 +17,12 @@ product_category_fields.examples = [
     )
 ]
 
-product_category_create = {
+product_category_create: dict[str, Any] = {
     'summary': 'Создать категорию',
     'description': 'Доступно только для администраторов'
 }
 
-product_category_retrieve = {
+product_category_retrieve: dict[str, Any] = {
     'summary': 'Получить категорию',
     'description': 'Доступно для всех',
     'parameters': [
@@ -30,7 +31,7 @@ product_category_retrieve = {
     ]
 }
 
-product_category_update = {
+product_category_update: dict[str, Any] = {
     'summary': 'Обновить категорию',
     'description': 'Доступно только для администраторов',
     'parameters': [
@@ -38,7 +39,7 @@ product_category_update = {
     ]
 }
 
-product_category_destroy = {
+product_category_destroy: dict[str, Any] = {
     'summary': 'Удалить категорию',
     'description': 'Доступно только для администраторов',
     'parameters': [
@@ -46,7 +47,7 @@ product_category_destroy = {
     ]
 }
 
-product_category_list = {
+product_category_list: dict[str, Any] = {
     'summary': 'Получить категории',
     'description': 'Доступно для всех',
     'parameters': [
@@ -105,7 +106,7 @@ product_get_response = OpenApiExample(
     response_only=True
 )
 
-product_create = {
+product_create: dict[str, Any] = {
     'summary': 'Создать продукт',
     'description': 'Доступно для всех',
     'responses': {
@@ -113,7 +114,7 @@ product_create = {
     }
 }
 
-product_retrieve = {
+product_retrieve: dict[str, Any] = {
     'summary': 'Получить продукт',
     'description': 'Доступно для всех',
     'parameters': [
@@ -127,7 +128,7 @@ product_retrieve = {
     'examples': [product_get_response]
 }
 
-product_update = {
+product_update: dict[str, Any] = {
     'summary': 'Обновить продукт',
     'description': 'Доступно для всех',
     'parameters': [
@@ -139,7 +140,7 @@ product_update = {
     'examples': [product_get_response]
 }
 
-product_partial_update = {
+product_partial_update: dict[str, Any] = {
     'summary': 'Частично обновить продукт',
     'description': 'Доступно для всех',
     'parameters': [
@@ -153,7 +154,7 @@ product_partial_update = {
     ]
 }
 
-product_destroy = {
+product_destroy: dict[str, Any] = {
     'summary': 'Удалить продукт',
     'description': 'Доступно для всех',
     'parameters': [
@@ -161,14 +162,16 @@ product_destroy = {
     ]
 }
 
-product_list = {
+product_list: dict[str, Any] = {
     'summary': 'Получить продукты',
     'description': 'Доступно для всех',
     'parameters': [
         product_fields,
         product_category_fields,
         extend_docs_global.page_param_ru,
-        extend_docs_global.page_size_param_ru
+        extend_docs_global.page_size_param_ru,
+        extend_docs_global.pagination_param_ru,
+        extend_docs_global.cursor_param_ru
     ],
     'responses': {
         200: product_response_schema
@@ -178,6 +181,44 @@ product_list = {
     ]
 }
 
+product_autocomplete: dict[str, Any] = {
+    'summary': 'Найти продукты по началу названия',
+    'description': 'Доступно для авторизированных пользователей. Поиск не учитывает регистр, лишние пробелы '
+                   'и различие букв «е» и «ё». Продукты упорядочены по названию',
+    'parameters': [
+        OpenApiParameter(
+            name='q',
+            type=OpenApiTypes.STR,
+            required=True,
+            description='Начало названия продукта',
+        ),
+        OpenApiParameter(
+            name='category',
+            type=OpenApiTypes.INT,
+            description='id категории, в которой нужно искать продукты',
+        ),
+        OpenApiParameter(
+            name='limit',
+            type=OpenApiTypes.INT,
+            description='Максимальное количество продуктов в ответе, по умолчанию 10, не больше 50',
+        )
+    ],
+    'responses': {
+        200: inline_serializer('ProductAutocompleteResponse', {
+            'id': serializers.IntegerField(),
+            'name': serializers.CharField(),
+            'category': serializers.IntegerField(),
+        }, many=True)
+    },
+    'examples': [
+        OpenApiExample(
+            'Продукты, названия которых начинаются с «мол»',
+            value=[{'id': 1, 'name': 'Молоко', 'category': 1}, {'id': 4, 'name': 'Молочный коктейль', 'category': 1}],
+            response_only=True
+        )
+    ]
+}
+
 """PurchaseViewSet"""
 
 purchase_fields = deepcopy(extend_docs_global.fields_query_parameter)
@@ -249,13 +290,16 @@ add_or_delete_product_purchase_schema = serializers.ListSerializer(child=inline_
     }
 ))
 
-purchase_create = {
+purchase_create: dict[str, Any] = {
     'summary': 'Создать покупку',
     'description': 'Доступно для авторизированных пользователей',
-    'request': create_purchase_request_schema
+    'request': create_purchase_request_schema,
+    'parameters': [
+        extend_docs_global.idempotency_key_header
+    ]
 }
 
-purchase_retrieve = {
+purchase_retrieve: dict[str, Any] = {
     'summary': 'Получить покупку',
     'description': 'Доступно для группы пользователя, совершившего покупку, или для администратора',
     'parameters': [
@@ -267,7 +311,7 @@ purchase_retrieve = {
     ]
 }
 
-purchase_destroy = {
+purchase_destroy: dict[str, Any] = {
     'summary': 'Удалить покупку',
     'description': 'Доступно для пользователя, совершившего эту покупку, или для администратора',
     'parameters': [
@@ -275,7 +319,7 @@ purchase_destroy = {
     ]
 }
 
-purchase_list = {
+purchase_list: dict[str, Any] = {
     'summary': 'Получить покупки',
     'description': 'Доступно для авторизированных пользователй. Если запрос делает администратор,'
                    'то возвращаются все покупки, если нет, то только покупки пользователя, '
@@ -286,20 +330,23 @@ purchase_list = {
         purchase_product_fields,
         purchase_product_category_fields,
         extend_docs_global.page_param_ru,
-        extend_docs_global.page_size_param_ru
+        extend_docs_global.page_size_param_ru,
+        extend_docs_global.pagination_param_ru,
+        extend_docs_global.cursor_param_ru
     ]
 }
 
-purchase_add_products = {
+purchase_add_products: dict[str, Any] = {
     'summary': 'Добавить продукты в покупку',
     'description': 'Доступно для пользователя, совершившего эту покупку, или для администратора',
     'request': add_or_delete_product_purchase_schema,
     'parameters': [
-        extend_docs_global.id_path_parameter
+        extend_docs_global.id_path_parameter,
+        extend_docs_global.idempotency_key_header
     ]
 }
 
-purchase_delete_products = {
+purchase_delete_products: dict[str, Any] = {
     'summary': 'Удалить продукты из покупки',
     'description': 'Доступно для пользователя, совершившего эту покупку, или для администратора',
     'request': add_or_delete_product_purchase_schema,
@@ -310,3 +357,73 @@ purchase_delete_products = {
         extend_docs_global.id_path_parameter
     ]
 }
+
+purchase_import_request_schema = inline_serializer(
+    name='purchases_import',
+    fields={
+        'file': serializers.FileField(help_text='Файл в кодировке UTF-8 в формате CSV с заголовком '
+                                                'user,datetime,product,category,price или NDJSON с такими же полями'),
+        'format': serializers.ChoiceField(choices=('csv', 'ndjson'), required=False,
+                                          help_text='По умолчанию определяется по расширению файла'),
+        'chunk_size': serializers.IntegerField(required=False, help_text='Количество строк в одной транзакции')
+    }
+)
+
+purchase_import_response_schema = inline_serializer(
+    name='purchases_import_report',
+    fields={
+        'rows': serializers.IntegerField(),
+        'imported_rows': serializers.IntegerField(),
+        'purchases': serializers.IntegerField(),
+        'errors': serializers.ListField(child=inline_serializer(
+            name='purchases_import_error',
+            fields={
+                'row': serializers.IntegerField(),
+                'errors': serializers.ListField(child=serializers.CharField())
+            }
+        ))
+    }
+)
+
+purchase_import: dict[str, Any] = {
+    'summary': 'Импортировать покупки из файла',
+    'description': 'Доступно для администратора. Пользователь указывается по username, товар - по названию '
+                   'и названию категории, отсутствующие товары и категории создаются. Идущие подряд строки '
+                   'одного пользователя с одинаковыми датой и временем образуют одну покупку. Неверные строки '
+                   'пропускаются и перечисляются в ответе',
+    'request': {'multipart/form-data': purchase_import_request_schema},
+    'responses': {
+        200: purchase_import_response_schema,
+        400: purchase_import_response_schema
+    }
+}
+
+purchase_export: dict[str, Any] = {
+    'summary': 'Экспортировать покупки',
+    'description': 'Доступно для авторизированных пользователей. Администратор получает все покупки или покупки '
+                   'указанной группы, остальные пользователи - покупки своей группы или свои покупки (при отсутствии '
+                   'группы). Покупки передаются потоком в формате импорта покупок',
+    'parameters': [
+        OpenApiParameter(
+            name='file_format',
+            type=OpenApiTypes.STR,
+            enum=['csv', 'ndjson'],
+            description='Формат файла, по умолчанию csv',
+        ),
+        OpenApiParameter(
+            name='roommates_group',
+            type=OpenApiTypes.INT,
+            description='id группы, покупки которой нужно экспортировать',
+        ),
+        OpenApiParameter(
+            name='gzip',
+            type=OpenApiTypes.BOOL,
+            description='Сжать файл в формат gzip',
+        )
+    ],
+    'responses': {
+        (200, 'text/csv'): OpenApiTypes.BINARY,
+        (200, 'application/x-ndjson'): OpenApiTypes.BINARY,
+        (200, 'application/gzip'): OpenApiTypes.BINARY
+    }
+}
@@ -1,30 +1,40 @@
 from typing import Any
 
-from django.db.models import QuerySet
+from django.db.models import Prefetch, QuerySet
+from django.http import StreamingHttpResponse
+from django.http.response import HttpResponseBase
 from drf_spectacular.utils import extend_schema
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.exceptions import MethodNotAllowed
+from rest_framework.parsers import MultiPartParser
 from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
 from goods_accounting.api import extend_docs
-from goods_accounting.models import ProductCategory, Product, Purchase
+from goods_accounting.models import ProductCategory, Product, Purchase, ProductPurchase
 from goods_accounting.utils import process_deletion_or_addition_product_purchase_request, \
-    delete_product_from_purchase, add_product_to_purchase
-from hostel_accounting.paginations import DefaultPagination
+    delete_products_from_purchase, add_products_to_purchase, delete_purchase, process_purchases_import_request, \
+    get_purchases_export_response, get_user_purchases, get_products_autocomplete_response
+from hostel_accounting.caching import CATALOG_SCOPE, get_etag, get_not_modified_response, get_user_purchases_scope, \
+    get_versions, idempotent
+from hostel_accounting.paginations import DefaultPagination, EstimatedCountPagination, KeysetPagination, \
+    PurchaseKeysetPagination
 from hostel_accounting.permissions import ReadOnly, PurchasePermission, IsOwner
 from hostel_accounting.serializers import ProductCategorySerializer, ProductSerializer, PurchaseSerializer
-from hostel_accounting.utils import get_default_retrieve_response, get_all_fields_from_request, \
-    get_default_list_response_with_pagination
+from hostel_accounting.utils import get_authenticated_user, get_default_retrieve_response, \
+    get_all_fields_from_request, get_default_list_response_with_pagination, get_field_plan, \
+    get_list_queryset_and_renderer, get_view_reference_cache, normalize_fields_params
 
 
 class ProductCategoryViewSet(ModelViewSet):
     queryset = ProductCategory.objects.all()
     serializer_class = ProductCategorySerializer
     permission_classes = (IsAdminUser | ReadOnly,)
+    render_from_values = True
+    use_reference_cache = True
 
     @extend_schema(**extend_docs.product_category_create)
     def create(self, request: Request, *args: Any, **kwargs: Any) -> Response:
@@ -32,7 +42,7 @@ class ProductCategoryViewSet(ModelViewSet):
 
     @extend_schema(**extend_docs.product_category_retrieve)
     def retrieve(self, request: Request, *args: Any, **kwargs: Any) -> Response:
-        return get_default_retrieve_response(request, self, ('fields', 'category_fields'))
+        return get_default_retrieve_response(request, self, ('fields',))
 
     @extend_schema(**extend_docs.product_category_update)
     def update(self, request: Request, *args: Any, **kwargs: Any) -> Response:
@@ -49,8 +59,12 @@ class ProductCategoryViewSet(ModelViewSet):
     @extend_schema(**extend_docs.product_category_list)
     def list(self, request: Request, *args: Any, **kwargs: Any) -> Response:
         fields_params = get_all_fields_from_request(request)
-        serializer = self.serializer_class(self.queryset, many=True, **fields_params)
-        return Response(serializer.data)
+        field_plan = get_field_plan(self.serializer_class, fields_params, many=True)
+        reference_cache = get_view_reference_cache(self)
+        if reference_cache is not None:
+            return Response(reference_cache.render(normalize_fields_params(fields_params), field_plan))
+        queryset, render = get_list_queryset_and_renderer(self, self.queryset, field_plan)
+        return Response(render(queryset))
 
 
 class ProductViewSet(ModelViewSet):
@@ -58,6 +72,9 @@ class ProductViewSet(ModelViewSet):
     serializer_class = ProductSerializer
     permission_classes = (IsAuthenticated,)
     pagination_class = DefaultPagination
+    cursor_pagination_class = KeysetPagination
+    render_from_values = True
+    use_reference_cache = True
 
     @extend_schema(**extend_docs.product_create)
     def create(self, request: Request, *args: Any, **kwargs: Any) -> Response:
@@ -83,21 +100,34 @@ class ProductViewSet(ModelViewSet):
     def list(self, request: Request, *args: Any, **kwargs: Any) -> Response:
         return get_default_list_response_with_pagination(request, self, ('fields', 'category_fields'))
 
+    @extend_schema(**extend_docs.product_autocomplete)
+    @action(detail=False, methods=['get'], url_path='autocomplete')
+    def autocomplete(self, request: Request) -> Response:
+        return get_products_autocomplete_response(request)
+
 
 class PurchaseViewSet(ModelViewSet):
     serializer_class = PurchaseSerializer
     permission_classes = (PurchasePermission,)
-    pagination_class = DefaultPagination
+    pagination_class = EstimatedCountPagination
+    cursor_pagination_class = PurchaseKeysetPagination
 
     def perform_create(self, serializer: PurchaseSerializer) -> None:
         serializer.save(user=self.request.user)
 
+    def perform_destroy(self, instance: Purchase) -> None:
+        delete_purchase(instance)
+
     def get_queryset(self) -> QuerySet[Purchase]:
-        if self.request.user.is_staff:
-            return Purchase.objects.all().prefetch_related()
-        return Purchase.objects.filter(user__rommates_group=self.request.user.roommates_group).prefetch_related()
+        purchases = get_user_purchases(get_authenticated_user(self.request)).select_related('user__roommates_group')
+        if self.action in ('list', 'retrieve'):
+            # Покупки товаров загружаются только для чтения: действия с товарами покупки загружают их сами
+            purchases = purchases.prefetch_related(
+                Prefetch('productpurchase_set', queryset=ProductPurchase.objects.select_related('product__category')))
+        return purchases
 
     @extend_schema(**extend_docs.purchase_create)
+    @idempotent
     def create(self, request: Request, *args: Any, **kwargs: Any) -> Response:
         return super().create(request, *args, **kwargs)
 
@@ -119,21 +149,41 @@ class PurchaseViewSet(ModelViewSet):
         return super().destroy(request, *args, **kwargs)
 
     @extend_schema(**extend_docs.purchase_list)
-    def list(self, request: Request, *args: Any, **kwargs: Any) -> Response:
+    def list(self, request: Request, *args: Any, **kwargs: Any) -> HttpResponseBase:
+        scope = get_user_purchases_scope(get_authenticated_user(request))
+        etag = get_etag(request.get_full_path(), scope, get_versions(scope, CATALOG_SCOPE))
+        not_modified_response = get_not_modified_response(request, etag)
+        if not_modified_response is not None:
+            return not_modified_response
+
         self.queryset = self.get_queryset()
-        return get_default_list_response_with_pagination(request, self, (
+        response = get_default_list_response_with_pagination(request, self, (
             'fields', 'user_fields', 'product_fields', 'product_category_fields'))
+        response['ETag'] = etag
+        return response
 
     @extend_schema(**extend_docs.purchase_add_products)
     @action(detail=True, methods=['post'], permission_classes=(IsOwner | IsAdminUser,), url_path='add-products')
+    @idempotent
     def add_products(self, request: Request, pk: str) -> Response:
         purchase = self.get_object()
-        return process_deletion_or_addition_product_purchase_request(request, purchase, add_product_to_purchase,
+        return process_deletion_or_addition_product_purchase_request(request, purchase, add_products_to_purchase,
                                                                      status.HTTP_200_OK)
 
     @extend_schema(**extend_docs.purchase_delete_products)
     @action(detail=True, methods=['post'], permission_classes=(IsOwner | IsAdminUser,), url_path='delete-products')
     def delete_products(self, request: Request, pk: str) -> Response:
         purchase = self.get_object()
-        return process_deletion_or_addition_product_purchase_request(request, purchase, delete_product_from_purchase,
+        return process_deletion_or_addition_product_purchase_request(request, purchase, delete_products_from_purchase,
                                                                      status.HTTP_204_NO_CONTENT)
+
+    @extend_schema(**extend_docs.purchase_import)
+    @action(detail=False, methods=['post'], permission_classes=(IsAdminUser,), parser_classes=(MultiPartParser,),
+            url_path='import')
+    def import_purchases(self, request: Request) -> Response:
+        return process_purchases_import_request(request)
+
+    @extend_schema(**extend_docs.purchase_export)
+    @action(detail=False, methods=['get'], permission_classes=(IsAuthenticated,), url_path='export')
+    def export_purchases(self, request: Request) -> StreamingHttpResponse:
+        return get_purchases_export_response(request)
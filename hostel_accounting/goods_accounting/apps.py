@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class GoodsAccountingConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'goods_accounting'
+
+    def ready(self) -> None:
+        from goods_accounting import signals  # noqa: F401
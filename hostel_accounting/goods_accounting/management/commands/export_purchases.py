@@ -0,0 +1,28 @@
+import sys
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+
+from goods_accounting.purchases_io import PURCHASES_FILE_FORMATS, get_purchases_export_rows, export_purchases
+
+
+class Command(BaseCommand):
+    help = 'Экспортирует покупки всех пользователей или группы в формате CSV или NDJSON'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('-o', '--output', help='Путь к файлу, по умолчанию покупки выводятся в stdout')
+        parser.add_argument('--format', choices=PURCHASES_FILE_FORMATS, default='csv', help='Формат файла')
+        parser.add_argument('--roommates-group', type=int, help='id группы, покупки которой нужно экспортировать')
+        parser.add_argument('--gzip', action='store_true', help='Сжать файл в формат gzip')
+        parser.add_argument('--chunk-size', type=int, default=settings.PURCHASES_EXPORT_CHUNK_SIZE,
+                            help='Количество строк, загружаемых из базы данных за один запрос')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        rows = get_purchases_export_rows(options['roommates_group'], chunk_size=options['chunk_size'])
+        chunks = export_purchases(rows, options['format'], options['gzip'], options['chunk_size'])
+        if options['output'] is None:
+            sys.stdout.buffer.writelines(chunks)
+            return
+        with open(options['output'], 'wb') as file:
+            file.writelines(chunks)
@@ -0,0 +1,28 @@
+from typing import Any
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+
+from goods_accounting.purchases_io import PURCHASES_FILE_FORMATS, PurchasesImporter, read_purchases_rows
+from goods_accounting.utils import get_purchases_file_format
+
+
+class Command(BaseCommand):
+    help = 'Импортирует покупки из файла в формате CSV или NDJSON'
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('path', help='Путь к файлу покупок')
+        parser.add_argument('--format', choices=PURCHASES_FILE_FORMATS,
+                            help='Формат файла, по умолчанию определяется по расширению')
+        parser.add_argument('--chunk-size', type=int, default=settings.PURCHASES_IMPORT_CHUNK_SIZE,
+                            help='Количество строк в одной транзакции')
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        def on_error(row_number: int, errors: list[str]) -> None:
+            self.stderr.write(f'Строка {row_number}: {"; ".join(errors)}')
+
+        importer = PurchasesImporter(options['chunk_size'], on_error)
+        with open(options['path'], 'rb') as file:
+            importer.import_rows(read_purchases_rows(file, options['format'] or get_purchases_file_format(file.name)))
+        self.stdout.write(f'Обработано строк: {importer.rows_count}, импортировано строк: '
+                          f'{importer.imported_rows_count}, создано покупок: {importer.purchases_count}')
@@ -0,0 +1,12 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from hostel_accounting.caching import purge_idempotency_keys
+
+
+class Command(BaseCommand):
+    help = 'Удаляет просроченные ключи Idempotency-Key и самые старые ключи сверх IDEMPOTENCY_KEYS_MAX_COUNT'
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        self.stdout.write(f'Удалено ключей: {purge_idempotency_keys()}')
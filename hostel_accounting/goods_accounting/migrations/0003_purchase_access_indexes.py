@@ -0,0 +1,38 @@
+# Generated by Django 4.1.2 on 2026-10-18 11:01
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('goods_accounting', '0002_alter_productpurchase_options_alter_purchase_options'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productpurchase',
+            name='purchase',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='goods_accounting.purchase', verbose_name='покупка'),
+        ),
+        migrations.AlterField(
+            model_name='purchase',
+            name='user',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='пользователь'),
+        ),
+        migrations.AddIndex(
+            model_name='productpurchase',
+            index=models.Index(fields=['purchase', 'product', 'price'], include=('id',), name='productpurchase_purchase_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['user', 'datetime', 'id'], name='purchase_user_datetime_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='purchase',
+            index=models.Index(fields=['datetime', 'id'], name='purchase_datetime_idx'),
+        ),
+    ]
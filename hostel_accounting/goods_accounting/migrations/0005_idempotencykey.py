@@ -0,0 +1,29 @@
+# Generated by Django 4.1.2 on 2026-10-18 11:24
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods_accounting', '0004_dataversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=63, unique=True, verbose_name='ключ')),
+                ('fingerprint', models.CharField(max_length=34, verbose_name='отпечаток тела запроса')),
+                ('status_code', models.PositiveSmallIntegerField(null=True, verbose_name='код ответа')),
+                ('data', models.JSONField(encoder=django.core.serializers.json.DjangoJSONEncoder, null=True, verbose_name='тело ответа')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='дата создания')),
+            ],
+            options={
+                'verbose_name': 'ключ идемпотентности',
+                'verbose_name_plural': 'ключи идемпотентности',
+            },
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db import models
 
 from hostel_accounting.utils import StrMethodMixin
@@ -29,13 +30,21 @@ class Product(StrMethodMixin, models.Model):
 class Purchase(models.Model):
     """Модель покупки товаров"""
 
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True,
+    # Отдельный индекс внешнего ключа не нужен: пользователь - первый столбец индекса purchase_user_datetime_idx
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, db_index=False,
                              verbose_name='пользователь')
     datetime = models.DateTimeField('дата и время покупки', auto_now_add=True)
     products = models.ManyToManyField(Product, through='ProductPurchase', verbose_name='продукты')
 
     class Meta:
         ordering = ('id',)
+        indexes = (
+            # Покупки пользователя или группы по убыванию (datetime, id): список покупок, курсорная пагинация,
+            # покупки группы за период. Индекс содержит все столбцы покупки, поэтому чтение идет только по индексу
+            models.Index(fields=('user', 'datetime', 'id'), name='purchase_user_datetime_idx'),
+            # Все покупки по убыванию (datetime, id) для администратора
+            models.Index(fields=('datetime', 'id'), name='purchase_datetime_idx'),
+        )
         verbose_name = 'покупка'
         verbose_name_plural = 'покупки'
 
@@ -46,14 +55,57 @@ class Purchase(models.Model):
 class ProductPurchase(models.Model):
     """Промежуточная таблица между моделью покпки и моделью товара"""
 
-    purchase = models.ForeignKey(Purchase, on_delete=models.CASCADE, verbose_name='покупка')
+    # Отдельный индекс внешнего ключа не нужен: покупка - первый столбец индекса productpurchase_purchase_idx
+    purchase = models.ForeignKey(Purchase, on_delete=models.CASCADE, db_index=False, verbose_name='покупка')
     product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, verbose_name='товар')
     price = models.IntegerField('цена')
 
     class Meta:
         ordering = ('-id',)
+        indexes = (
+            # Удаление товаров из покупки ищет по (покупка, товар, цена), а соединения с покупками читают
+            # товар, цену и id покупки товара. В PostgreSQL id включен в индекс, поэтому чтение идет только по индексу
+            models.Index(fields=('purchase', 'product', 'price'), include=('id',), name='productpurchase_purchase_idx'),
+        )
         verbose_name = 'покупка товара'
         verbose_name_plural = 'покупки товаров'
 
     def __str__(self) -> str:
         return f'{self.purchase.user}: {self.product} ({self.price})'
+
+
+class DataVersion(models.Model):
+    """
+    Модель версии данных области (например, покупок группы или каталога товаров). Версии хранятся
+    в базе данных, поэтому ключи кэшей и ETag, вычисленные по ним, совпадают во всех процессах
+    """
+
+    scope = models.CharField('область', max_length=63, primary_key=True)
+    version = models.BigIntegerField('версия')
+
+    class Meta:
+        verbose_name = 'версия данных'
+        verbose_name_plural = 'версии данных'
+
+    def __str__(self) -> str:
+        return f'{self.scope}: {self.version}'
+
+
+class IdempotencyKey(models.Model):
+    """
+    Модель ответа на запрос с заголовком Idempotency-Key. Ответы хранятся в базе данных, поэтому повтор
+    запроса узнается в любом процессе. Пока первый запрос выполняется, код и тело ответа не заполнены
+    """
+
+    key = models.CharField('ключ', max_length=63, unique=True)
+    fingerprint = models.CharField('отпечаток тела запроса', max_length=34)
+    status_code = models.PositiveSmallIntegerField('код ответа', null=True)
+    data = models.JSONField('тело ответа', null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField('дата создания', auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'ключ идемпотентности'
+        verbose_name_plural = 'ключи идемпотентности'
+
+    def __str__(self) -> str:
+        return self.key
@@ -0,0 +1,242 @@
+import codecs
+import csv
+import json
+import zlib
+from collections import defaultdict
+from datetime import datetime
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, NamedTuple, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from accounts.models import User, UserBalance
+from goods_accounting.models import ProductCategory, Product, Purchase, ProductPurchase
+from hostel_accounting.caching import CATALOG_SCOPE, bump_version, bump_purchases_version
+
+PURCHASE_ROW_FIELDS = ('user', 'datetime', 'product', 'category', 'price')
+PURCHASES_FILE_FORMATS = ('csv', 'ndjson')
+
+
+def read_ndjson_rows(lines: Iterable[str]) -> Iterator[Any]:
+    """Функция, построчно читающая NDJSON. Строка, которая не является JSON, возвращается как есть"""
+
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield line
+
+
+def read_purchases_rows(file: Iterable[bytes], file_format: str) -> Iterator[Any]:
+    """Функция, построчно читающая покупки товаров из файла в кодировке UTF-8 в формате CSV с заголовком или NDJSON"""
+
+    lines = codecs.iterdecode(file, 'utf-8-sig')
+    if file_format == 'csv':
+        return csv.DictReader(lines)
+    return read_ndjson_rows(lines)
+
+
+class ImportedRow(NamedTuple):
+    """Проверенная строка импорта: покупка товара пользователем"""
+
+    user_id: int
+    roommates_group_id: Optional[int]
+    datetime: datetime
+    product: str
+    category: str
+    price: int
+
+
+class PurchasesImporter:
+    """
+    Класс, импортирующий покупки товаров из потока строк. Идущие подряд строки одного пользователя
+    с одинаковыми датой и временем образуют одну покупку. Строки сохраняются порциями не меньше
+    chunk_size строк, каждая порция - в своей транзакции. Пользователи ищутся по username,
+    категории - по названию, товары - по названию и категории. Отсутствующие категории и товары создаются
+    """
+
+    def __init__(self, chunk_size: int = settings.PURCHASES_IMPORT_CHUNK_SIZE,
+                 on_error: Optional[Callable[[int, list[str]], None]] = None) -> None:
+        self.chunk_size = chunk_size
+        self.on_error = on_error or self.add_error
+        self.errors: list[dict[str, Any]] = []
+        self.rows_count = self.imported_rows_count = self.purchases_count = 0
+
+        self.users = {username: (pk, roommates_group_id) for username, pk, roommates_group_id
+                      in User.objects.values_list('username', 'id', 'roommates_group_id')}
+        self.categories = dict(ProductCategory.objects.values_list('name', 'id'))
+        self.products = {(name, category_id): pk for pk, name, category_id
+                         in Product.objects.values_list('id', 'name', 'category_id')}
+
+    def add_error(self, row_number: int, errors: list[str]) -> None:
+        self.errors.append({'row': row_number, 'errors': errors})
+
+    def validate_row(self, row: Any) -> tuple[Optional[ImportedRow], list[str]]:
+        """Метод проверяет строку импорта и возвращает ее в проверенном виде или список ошибок"""
+
+        if not isinstance(row, dict):
+            return None, [f'Строка должна содержать поля {", ".join(PURCHASE_ROW_FIELDS)}']
+        errors = [f'Поле \'{field}\' обязательно' for field in PURCHASE_ROW_FIELDS if row.get(field) in (None, '')]
+        if errors:
+            return None, errors
+
+        user = self.users.get(str(row['user']))
+        if user is None:
+            errors.append(f'Пользователь \'{row["user"]}\' не существует')
+        purchase_datetime = parse_datetime(str(row['datetime']))
+        if purchase_datetime is None:
+            errors.append(f'Неверный формат даты и времени \'{row["datetime"]}\'')
+        elif timezone.is_naive(purchase_datetime):
+            purchase_datetime = timezone.make_aware(purchase_datetime)
+        price = row['price']
+        if type(price) is str and price.isdigit():
+            price = int(price)
+        if type(price) is not int or price < 0:
+            errors.append(f'Цена должна быть неотрицательным целым числом ({row["price"]})')
+        if errors or user is None or purchase_datetime is None:
+            return None, errors
+        return ImportedRow(user[0], user[1], purchase_datetime, str(row['product']), str(row['category']), price), []
+
+    def import_rows(self, rows: Iterable[Any]) -> None:
+        """Метод импортирует строки, сообщая об ошибках в каждой неверной строке"""
+
+        purchases: list[list[ImportedRow]] = []
+        chunk_rows_count = 0
+        for self.rows_count, row in enumerate(rows, 1):
+            imported_row, errors = self.validate_row(row)
+            if imported_row is None:
+                self.on_error(self.rows_count, errors)
+                continue
+
+            last_row = purchases[-1][-1] if purchases else None
+            if last_row is not None and (last_row.user_id, last_row.datetime) == (imported_row.user_id,
+                                                                                  imported_row.datetime):
+                purchases[-1].append(imported_row)
+            else:
+                if chunk_rows_count >= self.chunk_size:
+                    self.save_purchases(purchases)
+                    purchases, chunk_rows_count = [], 0
+                purchases.append([imported_row])
+            chunk_rows_count += 1
+        if purchases:
+            self.save_purchases(purchases)
+
+    def save_catalog(self, purchases: list[list[ImportedRow]]) -> None:
+        """Метод создает отсутствующие категории и товары"""
+
+        new_categories = {row.category for rows in purchases for row in rows} - self.categories.keys()
+        for category in ProductCategory.objects.bulk_create(ProductCategory(name=name) for name in new_categories):
+            self.categories[category.name] = category.pk
+
+        new_products = {(row.product, self.categories[row.category]) for rows in purchases for row in rows}
+        new_products -= self.products.keys()
+        for product in Product.objects.bulk_create(Product(name=name, category_id=category_id)
+                                                   for name, category_id in new_products):
+            self.products[product.name, product.category_id] = product.pk
+
+        if new_categories or new_products:
+            bump_version(CATALOG_SCOPE)
+
+    def save_purchases(self, purchases: list[list[ImportedRow]]) -> None:
+        """Метод сохраняет порцию покупок одной транзакцией"""
+
+        with transaction.atomic():
+            self.save_catalog(purchases)
+
+            purchases_objs = Purchase.objects.bulk_create(Purchase(user_id=rows[0].user_id) for rows in purchases)
+            # Дата покупки заполняется автоматически при создании, поэтому она задается отдельным запросом
+            for purchase, rows in zip(purchases_objs, purchases):
+                purchase.datetime = rows[0].datetime
+            Purchase.objects.bulk_update(purchases_objs, ('datetime',))
+
+            ProductPurchase.objects.bulk_create(
+                ProductPurchase(purchase=purchase, price=row.price,
+                                product_id=self.products[row.product, self.categories[row.category]])
+                for purchase, rows in zip(purchases_objs, purchases) for row in rows
+            )
+
+            users_spent: dict[tuple[int, Optional[int]], int] = defaultdict(int)
+            for rows in purchases:
+                for row in rows:
+                    users_spent[row.user_id, row.roommates_group_id] += row.price
+            for (user_id, roommates_group_id), spent in users_spent.items():
+                UserBalance.objects.change_spent(user_id, spent)
+                bump_purchases_version(user_id, roommates_group_id)
+
+        self.purchases_count += len(purchases)
+        self.imported_rows_count += sum(len(rows) for rows in purchases)
+
+    def get_report(self) -> dict[str, Any]:
+        return {'rows': self.rows_count, 'imported_rows': self.imported_rows_count,
+                'purchases': self.purchases_count, 'errors': self.errors}
+
+
+class EchoBuffer:
+    """Буфер для csv.writer, который не хранит строки, а сразу возвращает их"""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def get_purchases_export_rows(roommates_group_id: Optional[int] = None, user_id: Optional[int] = None,
+                              chunk_size: int = settings.PURCHASES_EXPORT_CHUNK_SIZE) -> Iterator[tuple]:
+    """
+    Функция, построчно возвращающая покупки товаров группы, пользователя или все покупки в формате импорта.
+    Строки загружаются из базы данных порциями по chunk_size, строки одной покупки идут подряд.
+    Покупки удалённых товаров и удалённых пользователей пропускаются: импорт такие строки не принимает
+    """
+
+    product_purchases = ProductPurchase.objects.filter(product__isnull=False, purchase__user__isnull=False) \
+        .order_by('purchase_id', 'id')
+    if roommates_group_id is not None:
+        product_purchases = product_purchases.filter(purchase__user__roommates_group_id=roommates_group_id)
+    elif user_id is not None:
+        product_purchases = product_purchases.filter(purchase__user_id=user_id)
+    rows = product_purchases.values_list('purchase__user__username', 'purchase__datetime', 'product__name',
+                                         'product__category__name', 'price')
+    for username, purchase_datetime, product, category, price in rows.iterator(chunk_size=chunk_size):
+        yield username, purchase_datetime.isoformat(), product, category, price
+
+
+def render_csv_rows(rows: Iterable[tuple]) -> Iterator[str]:
+    """Функция, построчно преобразующая покупки товаров в CSV с заголовком"""
+
+    writer = csv.writer(EchoBuffer())
+    yield writer.writerow(PURCHASE_ROW_FIELDS)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def render_ndjson_rows(rows: Iterable[tuple]) -> Iterator[str]:
+    """Функция, построчно преобразующая покупки товаров в NDJSON"""
+
+    for row in rows:
+        yield json.dumps(dict(zip(PURCHASE_ROW_FIELDS, row)), ensure_ascii=False) + '\n'
+
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Функция, сжимающая поток байтов в формат gzip по мере его поступления"""
+
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed_chunk = compressor.compress(chunk)
+        if compressed_chunk:
+            yield compressed_chunk
+    yield compressor.flush()
+
+
+def export_purchases(rows: Iterable[tuple], file_format: str, compress: bool = False,
+                     chunk_size: int = settings.PURCHASES_EXPORT_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Функция, возвращающая покупки товаров в формате CSV или NDJSON порциями байтов
+    по chunk_size строк. Одновременно в памяти находится не больше одной порции
+    """
+
+    lines = render_csv_rows(rows) if file_format == 'csv' else render_ndjson_rows(rows)
+    chunks = (''.join(chunk).encode() for chunk in iter(lambda: list(islice(lines, chunk_size)), []))
+    return gzip_chunks(chunks) if compress else chunks
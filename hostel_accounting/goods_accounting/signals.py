@@ -0,0 +1,32 @@
+from typing import Any
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from goods_accounting.models import ProductCategory, Product
+from goods_accounting.utils import product_names_index
+from hostel_accounting.caching import CATALOG_SCOPE, bump_version
+from hostel_accounting.reference_cache import invalidate_reference_caches, register_reference_cache
+
+register_reference_cache(ProductCategory, ProductCategory.objects.all)
+register_reference_cache(Product, lambda: Product.objects.select_related('category'))
+
+
+@receiver([post_save, post_delete], sender=ProductCategory)
+@receiver([post_save, post_delete], sender=Product)
+def change_catalog_version(sender: type, instance: Any, signal: Any, **kwargs: Any) -> None:
+    """
+    Обработчик, увеличивающий версию каталога товаров при изменении товара или категории и сбрасывающий
+    кэши справочных данных этого процесса. Остальные процессы сбросят свои кэши по новой версии каталога.
+    Индекс названий товаров этого процесса обновляется после увеличения версии без перестроения
+    """
+
+    bump_version(CATALOG_SCOPE)
+    invalidate_reference_caches()
+    row, pk = None, None
+    if sender is Product and signal is post_delete:
+        pk = instance.pk
+    elif sender is Product:
+        row = (instance.pk, instance.name, instance.category_id)
+    transaction.on_commit(lambda: product_names_index.update(row, pk))
@@ -1,29 +1,90 @@
+import csv
+from collections import defaultdict, deque
 from typing import Callable, Union, Literal
 
+from django.conf import settings
+
 from django.db import transaction
+from django.db.models import Prefetch, QuerySet, Sum, prefetch_related_objects
+from django.http import StreamingHttpResponse
 from rest_framework import status
-from rest_framework.exceptions import ErrorDetail
+from rest_framework.exceptions import ErrorDetail, PermissionDenied
 from rest_framework.request import Request
 from rest_framework.response import Response
 
+from accounts.models import User, UserBalance
 from goods_accounting.models import ProductPurchase, Purchase, Product
-from hostel_accounting.serializers import ProductPurchaseSerializer, PurchaseSerializer
+from goods_accounting.purchases_io import PurchasesImporter, read_purchases_rows, get_purchases_export_rows, \
+    export_purchases
+from hostel_accounting.caching import bump_user_purchases_version
+from hostel_accounting.prefix_index import PrefixIndex
+from hostel_accounting.serializers import ProductPurchaseSerializer, PurchaseSerializer, PurchasesImportSerializer, \
+    PurchasesExportQuerySerializer, ProductsAutocompleteQuerySerializer
+from hostel_accounting.utils import get_authenticated_user, get_bool_from_request
+
+product_names_index = PrefixIndex(lambda: Product.objects.values_list('id', 'name', 'category_id').iterator())
+
+
+def get_user_purchases(user: User) -> QuerySet[Purchase]:
+    """
+    Функция, возвращающая покупки, которые видит пользователь: все покупки для администратора,
+    покупки группы для члена группы и собственные покупки для пользователя без группы
+    """
+
+    purchases = Purchase.objects.all()
+    if user.is_staff:
+        return purchases
+    if user.roommates_group_id is not None:
+        return purchases.filter(user__roommates_group_id=user.roommates_group_id)
+    return purchases.filter(user=user)
+
 
+def add_products_to_purchase(purchase: Purchase, validated_data: list[tuple[Product, int]], errors: list) -> None:
+    """Функция, добавляющая продукты в покупку одним запросом"""
 
-def add_product_to_purchase(purchase: Purchase, product: Product, price: int, errors: list) -> None:
-    """Функция, добавляющая продукт в покупку"""
+    ProductPurchase.objects.bulk_create(ProductPurchase(purchase=purchase, product=product, price=price)
+                                        for product, price in validated_data)
+    UserBalance.objects.change_spent(purchase.user_id, sum(price for _, price in validated_data))
+    bump_user_purchases_version(purchase.user)
 
-    ProductPurchase.objects.create(purchase=purchase, product=product, price=price)
 
+def delete_products_from_purchase(purchase: Purchase, validated_data: list[tuple[Product, int]],
+                                  errors: list) -> None:
+    """
+    Функция, удаляющая продукты из покупки. Все подходящие покупки товаров загружаются одним запросом,
+    для каждой пары (продукт, цена) удаляется столько покупок товара, сколько раз она указана в запросе
+    """
+
+    products_purchase_id: defaultdict[tuple[int, int], deque[int]] = defaultdict(deque)
+    products_purchase = ProductPurchase.objects \
+        .filter(purchase=purchase, product__in={product.pk for product, _ in validated_data},
+                price__in={price for _, price in validated_data}) \
+        .values_list('id', 'product_id', 'price')
+    for pk, product_id, price in products_purchase:
+        products_purchase_id[product_id, price].append(pk)
+
+    deleted_products_purchase_id, spent = [], 0
+    for product, price in validated_data:
+        if not products_purchase_id[product.pk, price]:
+            errors.append(f'Покупки товара c такими данными {purchase.pk, product.id, price} не существует')
+            continue
+        deleted_products_purchase_id.append(products_purchase_id[product.pk, price].popleft())
+        spent += price
 
-def delete_product_from_purchase(purchase: Purchase, product: Product, price: int, errors: list) -> None:
-    """Функция, удаляющая продукт из покупки"""
+    if deleted_products_purchase_id:
+        ProductPurchase.objects.filter(pk__in=deleted_products_purchase_id).delete()
+        UserBalance.objects.change_spent(purchase.user_id, -spent)
+        bump_user_purchases_version(purchase.user)
 
-    products_purchase = ProductPurchase.objects.filter(purchase=purchase, product=product, price=price)
-    if len(products_purchase) == 0:
-        errors.append(f'Покупки товара c такими данными {purchase.pk, product.id, price} не существует')
-    else:
-        products_purchase[0].delete()
+
+def delete_purchase(purchase: Purchase) -> None:
+    """Функция, удаляющая покупку вместе с покупками ее товаров"""
+
+    with transaction.atomic():
+        spent = purchase.productpurchase_set.aggregate(spent=Sum('price'))['spent'] or 0
+        purchase.delete()
+        UserBalance.objects.change_spent(purchase.user_id, -spent)
+        bump_user_purchases_version(purchase.user)
 
 
 def process_deletion_or_addition_product_purchase(purchase: Purchase, validated_data: list[tuple[Product, int]],
@@ -31,8 +92,7 @@ def process_deletion_or_addition_product_purchase(purchase: Purchase, validated_
     """Функция, обрабатывающая удаление или добавление продуктов в/из покупки"""
 
     with transaction.atomic():
-        for product, price in validated_data:
-            func(purchase, product, price, errors)
+        func(purchase, validated_data, errors)
 
 
 def process_errors(errors: Union[dict[str, ErrorDetail], list[ErrorDetail]]) -> list[str]:
@@ -63,6 +123,75 @@ def process_deletion_or_addition_product_purchase_request(request: Request, purc
     if response_code == 204:
         return Response(status=status.HTTP_204_NO_CONTENT)
 
-    purchase.refresh_from_db()
+    prefetch_related_objects([purchase], Prefetch('productpurchase_set',
+                                                  queryset=ProductPurchase.objects.select_related('product__category')))
     serializer = PurchaseSerializer(purchase)
     return Response(serializer.data)
+
+
+def get_purchases_file_format(file_name: str) -> str:
+    """Функция, определяющая формат файла покупок по его расширению"""
+
+    return 'ndjson' if file_name.lower().endswith(('.ndjson', '.jsonl')) else 'csv'
+
+
+def process_purchases_import_request(request: Request) -> Response:
+    """
+    Функция, обрабатывающая запрос импорта покупок из файла. Файл читается построчно, поэтому
+    в памяти одновременно находится не больше одной порции строк
+    """
+
+    serializer = PurchasesImportSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+    file = serializer.validated_data['file']
+    file_format = serializer.validated_data.get('format') or get_purchases_file_format(file.name)
+
+    importer = PurchasesImporter(serializer.validated_data.get('chunk_size', settings.PURCHASES_IMPORT_CHUNK_SIZE))
+    try:
+        importer.import_rows(read_purchases_rows(file, file_format))
+    except (UnicodeDecodeError, csv.Error) as error:
+        importer.add_error(importer.rows_count + 1, [f'Невозможно прочитать файл: {error}'])
+        return Response(importer.get_report(), status=status.HTTP_400_BAD_REQUEST)
+    return Response(importer.get_report())
+
+
+def get_purchases_export_response(request: Request) -> StreamingHttpResponse:
+    """
+    Функция, возвращающая потоковый ответ с экспортом покупок. Администратор получает все покупки
+    или покупки указанной группы, остальные пользователи - покупки своей группы или свои покупки
+    """
+
+    serializer = PurchasesExportQuerySerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    file_format = serializer.validated_data['file_format']
+    roommates_group_id = serializer.validated_data.get('roommates_group')
+
+    user = get_authenticated_user(request)
+    if not user.is_staff:
+        if roommates_group_id is not None and roommates_group_id != user.roommates_group_id:
+            raise PermissionDenied('Можно экспортировать только покупки своей группы')
+        roommates_group_id = user.roommates_group_id
+    user_id = None if user.is_staff or roommates_group_id is not None else user.pk
+
+    compress = get_bool_from_request(request, 'gzip')
+    file_name = f'purchases.{file_format}' + ('.gz' if compress else '')
+    content_type = 'text/csv; charset=utf-8' if file_format == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(
+        export_purchases(get_purchases_export_rows(roommates_group_id, user_id), file_format, compress),
+        content_type='application/gzip' if compress else content_type
+    )
+    response['Content-Disposition'] = f'attachment; filename="{file_name}"'
+    return response
+
+
+def get_products_autocomplete_response(request: Request) -> Response:
+    """
+    Функция, возвращающая товары, названия которых начинаются с введенной строки, из индекса названий
+    в памяти процесса без обращения к базе данных
+    """
+
+    serializer = ProductsAutocompleteQuerySerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    query = serializer.validated_data
+    rows = product_names_index.search(query['q'], query.get('category'), query['limit'])
+    return Response([{'id': pk, 'name': name, 'category': category_id} for pk, name, category_id in rows])
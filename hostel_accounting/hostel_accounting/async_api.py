@@ -0,0 +1,163 @@
+from functools import wraps
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.paginator import InvalidPage
+from django.db.models import QuerySet
+from django.http import HttpRequest, HttpResponse
+from django.http.response import HttpResponseBase
+from rest_framework import status
+from rest_framework.exceptions import APIException, AuthenticationFailed, MethodNotAllowed, NotAuthenticated, \
+    NotFound, PermissionDenied
+from rest_framework.generics import GenericAPIView
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.permissions import BasePermission
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.views import exception_handler
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from accounts.models import User
+from hostel_accounting.paginations import DefaultPagination, EstimatedCountPaginator, KeysetPagination, \
+    get_list_pagination
+from hostel_accounting.utils import get_all_fields_from_request, get_field_plan, get_list_queryset_and_renderer
+
+AsyncView = Callable[..., Awaitable[HttpResponseBase]]
+
+# В стабах django-stubs 1.12 нет асинхронного API запросов и кэшей Django 4.1 (aget, acount, async for и т.д.),
+# поэтому его вызовы отмечены type: ignore
+
+
+async def aauthenticate(request: HttpRequest) -> Optional[User]:
+    """Функция, асинхронно аутентифицирующая пользователя по JWT так же, как JWTAuthentication"""
+
+    authentication = JWTAuthentication()
+    header = authentication.get_header(request)
+    if header is None:
+        return None
+    raw_token = authentication.get_raw_token(header)
+    if raw_token is None:
+        return None
+
+    validated_token = authentication.get_validated_token(raw_token)
+    try:
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken('Token contained no recognizable user identification')
+    try:
+        user = await User.objects.aget(**{api_settings.USER_ID_FIELD: user_id})  # type: ignore[attr-defined]
+    except User.DoesNotExist:
+        raise AuthenticationFailed('User not found', code='user_not_found')
+    if not user.is_active:
+        raise AuthenticationFailed('User is inactive', code='user_inactive')
+    return user
+
+
+def render_json(data: Any, status_code: int = status.HTTP_200_OK) -> HttpResponse:
+    """Функция, возвращающая ответ с данными в том же JSON, что и у представлений DRF"""
+
+    return HttpResponse(JSONRenderer().render(data), status=status_code, content_type='application/json')
+
+
+def get_exception_response(request: HttpRequest, exc: APIException) -> HttpResponse:
+    """Функция, возвращающая ответ на исключение DRF так же, как APIView.handle_exception"""
+
+    if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+        setattr(exc, 'auth_header', JWTAuthentication().authenticate_header(request))
+    exc_response = exception_handler(exc, {})
+    if exc_response is None:
+        raise exc
+    response = render_json(exc_response.data, exc_response.status_code)
+    for header, value in exc_response.items():
+        response[header] = value
+    return response
+
+
+def async_api_view(*permission_classes: type[BasePermission]) -> Callable[[AsyncView], AsyncView]:
+    """
+    Декоратор асинхронного представления только для чтения. Аутентифицирует пользователя по JWT,
+    проверяет разрешения DRF и передает представлению запрос DRF, исключения DRF превращаются
+    в такие же ответы, как у синхронных представлений
+    """
+
+    def decorator(view: AsyncView) -> AsyncView:
+
+        @wraps(view)
+        async def wrapper(http_request: HttpRequest, *args: Any, **kwargs: Any) -> HttpResponseBase:
+            request = Request(http_request, authenticators=())
+            try:
+                if http_request.method not in ('GET', 'HEAD'):
+                    raise MethodNotAllowed(str(http_request.method))
+                request.user = await aauthenticate(http_request) or AnonymousUser()
+                for permission_class in permission_classes:
+                    permission = permission_class()
+                    if not permission.has_permission(request, None):  # type: ignore[arg-type]
+                        if not request.user.is_authenticated:
+                            raise NotAuthenticated()
+                        raise PermissionDenied(getattr(permission, 'message', None))
+                return await view(request, *args, **kwargs)
+            except APIException as exc:
+                return get_exception_response(http_request, exc)
+
+        return wrapper
+
+    return decorator
+
+
+async def apaginate_queryset(request: Request, queryset: QuerySet,
+                             pagination: Optional[BasePagination] = None) -> tuple[list, BasePagination]:
+    """
+    Функция, асинхронно возвращающая страницу объектов и пагинацию с теми же параметрами и ошибками,
+    что и у синхронной пагинации DRF: по номеру страницы или по ключу (KeysetPagination)
+    """
+
+    pagination = pagination or DefaultPagination()
+    if isinstance(pagination, KeysetPagination):
+        queryset = pagination.get_page_queryset(queryset, request)
+        return pagination.get_page([row async for row in queryset]), pagination  # type: ignore[attr-defined]
+    if not isinstance(pagination, PageNumberPagination):
+        raise TypeError(f'Пагинация {type(pagination).__name__} не поддерживается')
+    page_size = pagination.get_page_size(request)
+    if page_size is None:
+        raise TypeError('Пагинация без размера страницы не поддерживается')
+
+    paginator = pagination.django_paginator_class(queryset, page_size)
+    if isinstance(paginator, EstimatedCountPaginator):
+        await paginator.acount()
+    else:
+        paginator.count = await queryset.acount()  # type: ignore[attr-defined, misc]
+    page_number = pagination.get_page_number(request, paginator)  # type: ignore[attr-defined]
+    try:
+        if isinstance(paginator, EstimatedCountPaginator):
+            page = await paginator.apage(page_number)
+        else:
+            page = paginator.page(page_number)
+            page.object_list = [obj async for obj in page.object_list]  # type: ignore[attr-defined]
+    except InvalidPage as exc:
+        raise NotFound(pagination.invalid_page_message.format(page_number=page_number, message=str(exc)))
+    pagination.page, pagination.request = page, request
+    return list(page.object_list), pagination
+
+
+def get_paginated_json_response(pagination: BasePagination, data: list) -> HttpResponse:
+    """Функция, возвращающая ответ со страницей данных в формате пагинации DRF"""
+
+    return render_json(pagination.get_paginated_response(data).data)
+
+
+async def aget_default_list_response_with_pagination(request: Request, view: GenericAPIView,
+                                                     fields_params: Iterable = ('fields',)) -> HttpResponse:
+    """
+    Функция, асинхронно возвращающая такой же ответ, как get_default_list_response_with_pagination:
+    с теми же требуемыми полями, представлением из values() и пагинацией, включая pagination=cursor
+    """
+
+    field_plan = get_field_plan(view.get_serializer_class(), get_all_fields_from_request(request, fields_params),
+                                many=True)
+    queryset, render = get_list_queryset_and_renderer(view, view.get_queryset(), field_plan)
+    page, pagination = await apaginate_queryset(request, queryset, get_list_pagination(request, view))
+    if not page:
+        return HttpResponse(status=status.HTTP_404_NOT_FOUND)
+    return get_paginated_json_response(pagination, render(page))
@@ -0,0 +1,258 @@
+import hashlib
+import json
+import time
+from datetime import timedelta
+from functools import wraps
+from typing import Any, Callable, Optional, TYPE_CHECKING
+
+from django.conf import settings
+from django.core.cache import BaseCache, caches
+from django.db import transaction
+from django.db.models import F
+from django.http import HttpRequest, HttpResponseNotModified
+from django.utils import timezone
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+if TYPE_CHECKING:
+    from accounts.models import User
+
+CATALOG_SCOPE = 'catalog'
+ALL_PURCHASES_SCOPE = 'all'
+
+# Время последней проверки по time.monotonic() и версия областей данных, которые проверял этот процесс
+checked_versions: dict[str, tuple[float, int]] = {}
+
+
+def get_purchases_cache() -> BaseCache:
+    """
+    Функция возвращает кэш, в котором хранятся ответы с покупками. Версии данных входят в ключи кэша,
+    поэтому кэш может быть локальным для процесса: устаревшие ответы просто перестают запрашиваться
+    """
+
+    return caches[settings.PURCHASES_CACHE_ALIAS]
+
+
+def get_group_scope(group_id: Any) -> str:
+    """Функция возвращает область версий данных для покупок группы"""
+
+    return f'group:{group_id}'
+
+
+def get_user_scope(user_id: Any) -> str:
+    """Функция возвращает область версий данных для покупок пользователя без группы"""
+
+    return f'user:{user_id}'
+
+
+def get_user_purchases_scope(user: 'User') -> str:
+    """Функция возвращает область версий данных для покупок, которые видит пользователь"""
+
+    if user.is_staff:
+        return ALL_PURCHASES_SCOPE
+    if user.roommates_group_id is not None:
+        return get_group_scope(user.roommates_group_id)
+    return get_user_scope(user.pk)
+
+
+def get_versions(*scopes: str) -> tuple[int, ...]:
+    """
+    Функция возвращает текущие версии данных в областях scopes из базы данных, поэтому версии
+    одинаковы во всех процессах. Версия отсутствующей области создается, начиная со времени
+    в наносекундах, поэтому она не совпадает с версиями, под которыми ответы могли быть сохранены ранее
+    """
+
+    # Модели импортируются при вызове: модули моделей через hostel_accounting.utils импортируют этот модуль
+    from goods_accounting.models import DataVersion
+
+    versions = dict(DataVersion.objects.filter(scope__in=scopes).values_list('scope', 'version'))
+    missing = [scope for scope in scopes if scope not in versions]
+    if missing:
+        initial_version = time.time_ns()
+        DataVersion.objects.bulk_create([DataVersion(scope=scope, version=initial_version) for scope in missing],
+                                        ignore_conflicts=True)
+        versions.update(DataVersion.objects.filter(scope__in=missing).values_list('scope', 'version'))
+    return tuple(versions[scope] for scope in scopes)
+
+
+def get_checked_version(scope: str) -> int:
+    """
+    Функция возвращает версию данных в области scope для кэшей в памяти процесса. Версия читается
+    из базы данных не чаще, чем раз в DATA_VERSION_CHECK_INTERVAL секунд, и после каждого изменения
+    данных области этим процессом, поэтому изменения других процессов видны не позже этого интервала
+    """
+
+    now = time.monotonic()
+    checked = checked_versions.get(scope)
+    if checked is None or now - checked[0] >= settings.DATA_VERSION_CHECK_INTERVAL:
+        checked = checked_versions[scope] = (now, get_versions(scope)[0])
+    return checked[1]
+
+
+def bump_version(scope: str) -> None:
+    """
+    Функция увеличивает версию данных в области scope на единицу после фиксации текущей транзакции.
+    Увеличение выполняется одним атомарным UPDATE, поэтому одновременные изменения не теряются
+    """
+
+    from goods_accounting.models import DataVersion
+
+    def bump() -> None:
+        versions = DataVersion.objects.filter(scope=scope)
+        if not versions.update(version=F('version') + 1):
+            DataVersion.objects.bulk_create([DataVersion(scope=scope, version=time.time_ns())], ignore_conflicts=True)
+            versions.update(version=F('version') + 1)
+        checked_versions.pop(scope, None)
+
+    checked_versions.pop(scope, None)
+    transaction.on_commit(bump)
+
+
+def bump_group_version(group_id: Optional[int]) -> None:
+    """Функция увеличивает версию данных покупок группы и всех покупок"""
+
+    if group_id is not None:
+        bump_version(get_group_scope(group_id))
+        bump_version(ALL_PURCHASES_SCOPE)
+
+
+def bump_purchases_version(user_id: int, group_id: Optional[int]) -> None:
+    """Функция увеличивает версию данных покупок пользователя, его группы и всех покупок"""
+
+    if group_id is not None:
+        bump_group_version(group_id)
+    else:
+        bump_version(get_user_scope(user_id))
+        bump_version(ALL_PURCHASES_SCOPE)
+
+
+def bump_user_purchases_version(user: Optional['User']) -> None:
+    """Функция увеличивает версию данных покупок пользователя, его группы и всех покупок"""
+
+    if user is not None:
+        bump_purchases_version(user.pk, user.roommates_group_id)
+
+
+def get_cache_key(prefix: str, *parts: Any) -> str:
+    """Функция возвращает ключ кэша из префикса и хэша остальных частей ключа"""
+
+    return f'{prefix}:{hashlib.md5(repr(parts).encode()).hexdigest()}'
+
+
+def get_etag(*parts: Any) -> str:
+    """
+    Функция возвращает сильный ETag, вычисленный по частям ключа. Части ключа не должны зависеть от процесса
+    (версии данных берутся из get_versions), чтобы все процессы выдавали один и тот же ETag
+    """
+
+    return f'"{hashlib.md5(repr(parts).encode()).hexdigest()}"'
+
+
+def get_not_modified_response(request: HttpRequest, etag: str) -> Optional[HttpResponseNotModified]:
+    """Функция возвращает ответ 304, если ETag совпадает с одним из значений заголовка If-None-Match"""
+
+    if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+    if etag not in if_none_match and '*' not in if_none_match:
+        return None
+    response = HttpResponseNotModified()
+    response['ETag'] = etag
+    return response
+
+
+# Время последнего удаления устаревших ключей Idempotency-Key этим процессом по time.monotonic()
+idempotency_keys_purged_at: Optional[float] = None
+
+
+def purge_idempotency_keys() -> int:
+    """
+    Функция, удаляющая ключи Idempotency-Key старше IDEMPOTENCY_KEY_TIMEOUT секунд и самые старые ключи
+    сверх IDEMPOTENCY_KEYS_MAX_COUNT. Возвращает количество удаленных ключей
+    """
+
+    from goods_accounting.models import IdempotencyKey
+
+    keys = IdempotencyKey.objects.all()
+    deleted, _ = keys.filter(created_at__lt=timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TIMEOUT)) \
+        .delete()
+    oldest_kept = keys.order_by('-created_at').values_list('created_at', flat=True)[
+        settings.IDEMPOTENCY_KEYS_MAX_COUNT - 1:settings.IDEMPOTENCY_KEYS_MAX_COUNT]
+    if oldest_kept:
+        deleted += keys.filter(created_at__lt=oldest_kept[0]).delete()[0]
+    return deleted
+
+
+def purge_idempotency_keys_if_due() -> None:
+    """
+    Функция, удаляющая устаревшие ключи Idempotency-Key не чаще, чем раз в IDEMPOTENCY_KEYS_PURGE_INTERVAL
+    секунд в каждом процессе, чтобы удаление не выполнялось при каждом запросе. Если ключи удаляются
+    периодически командой purge_idempotency_keys, интервал можно сделать больше
+    """
+
+    global idempotency_keys_purged_at
+
+    now = time.monotonic()
+    if idempotency_keys_purged_at is None or now - idempotency_keys_purged_at >= \
+            settings.IDEMPOTENCY_KEYS_PURGE_INTERVAL:
+        idempotency_keys_purged_at = now
+        purge_idempotency_keys()
+
+
+def idempotent(view_method: Callable[..., Response]) -> Callable[..., Response]:
+    """
+    Декоратор метода представления, поддерживающий заголовок Idempotency-Key. Ответ на первый запрос
+    с ключом сохраняется, повторный запрос с тем же ключом и телом получает сохраненный ответ без
+    повторного выполнения. Ключи хранятся в базе данных IDEMPOTENCY_KEY_TIMEOUT секунд, поэтому повтор
+    узнается, даже если его обработает другой процесс. Незавершенный запрос держит ключ
+    IDEMPOTENCY_KEY_LEASE секунд: если процесс упал, не сохранив ответ, после этого ключ можно занять снова
+    """
+
+    @wraps(view_method)
+    def wrapper(view: Any, request: Request, *args: Any, **kwargs: Any) -> Response:
+        from goods_accounting.models import IdempotencyKey
+
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if not idempotency_key:
+            return view_method(view, request, *args, **kwargs)
+
+        key = get_cache_key('idempotency', request.user.pk, request.method, request.path, idempotency_key)
+        fingerprint = get_etag(json.dumps(request.data, sort_keys=True, default=str))
+        now = timezone.now()
+        stored, created = IdempotencyKey.objects.get_or_create(key=key, defaults={'fingerprint': fingerprint})
+
+        if not created:
+            lease = settings.IDEMPOTENCY_KEY_TIMEOUT if stored.status_code is not None else \
+                settings.IDEMPOTENCY_KEY_LEASE
+            if stored.created_at < now - timedelta(seconds=lease):
+                # Просроченный ключ или ключ упавшего запроса занимается заново, если его не занял другой процесс
+                created = bool(IdempotencyKey.objects.filter(pk=stored.pk, created_at=stored.created_at)
+                               .update(fingerprint=fingerprint, status_code=None, data=None, created_at=now))
+                stored.fingerprint, stored.status_code, stored.created_at = fingerprint, None, now
+
+        if not created:
+            if stored.fingerprint != fingerprint:
+                return Response({'detail': 'Ключ Idempotency-Key уже использован в другом запросе'},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if stored.status_code is None:
+                return Response({'detail': 'Запрос с таким ключом Idempotency-Key еще выполняется'},
+                                status=status.HTTP_409_CONFLICT)
+            response = Response(stored.data, status=stored.status_code)
+            response['Idempotent-Replayed'] = 'true'
+            return response
+
+        # Ключ изменяется, только пока его не занял заново другой процесс после окончания аренды
+        owned_key = IdempotencyKey.objects.filter(pk=stored.pk, created_at=stored.created_at)
+        try:
+            response = view_method(view, request, *args, **kwargs)
+        except Exception:
+            owned_key.delete()
+            raise
+        if status.is_server_error(response.status_code):
+            owned_key.delete()
+        else:
+            owned_key.update(status_code=response.status_code, data=response.data)
+        purge_idempotency_keys_if_due()
+        return response
+
+    return wrapper
@@ -21,9 +21,33 @@ page_size_param_ru = OpenApiParameter(
     description='Количество записей на одной странице'
 )
 
+pagination_param_ru = OpenApiParameter(
+    'pagination',
+    type=OpenApiTypes.STR,
+    location=OpenApiParameter.QUERY,
+    enum=['page', 'cursor'],
+    description='Способ пагинации: по номеру страницы (по умолчанию) или по курсору. При пагинации по курсору '
+                'количество записей не считается, а ответ содержит только ссылку next на следующую страницу'
+)
+
+cursor_param_ru = OpenApiParameter(
+    'cursor',
+    type=OpenApiTypes.STR,
+    location=OpenApiParameter.QUERY,
+    description='Курсор следующей страницы из ссылки next при pagination=cursor'
+)
+
 fields_query_parameter = OpenApiParameter(
     'fields',
     type=OpenApiTypes.STR,
     location=OpenApiParameter.QUERY,
     description='Позволяет указать только те поля, которые следует вернуть'
 )
+
+idempotency_key_header = OpenApiParameter(
+    'Idempotency-Key',
+    type=OpenApiTypes.STR,
+    location=OpenApiParameter.HEADER,
+    description='Уникальный ключ запроса. Повторный запрос с тем же ключом не выполняется заново, '
+                'а получает сохраненный ответ с заголовком Idempotent-Replayed'
+)
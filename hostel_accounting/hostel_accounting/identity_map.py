@@ -0,0 +1,123 @@
+import asyncio
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Any, Callable, Iterable, Optional, Union
+
+from django.db.models import Model, QuerySet
+from django.http import HttpRequest
+from django.http.response import HttpResponseBase
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework.fields import Field
+from rest_framework.serializers import ListSerializer
+
+from hostel_accounting.reference_cache import ReferenceCache
+
+_request_identity_map: ContextVar[Optional['IdentityMap']] = ContextVar('request_identity_map', default=None)
+
+
+class IdentityMap:
+    """
+    Карта объектов, загруженных по id за время одного запроса. Первое обращение к id модели загружает
+    одним запросом все id этой модели, упомянутые в данных запроса, последующие обращения берут объект из памяти.
+    Отсутствующие объекты тоже запоминаются, чтобы повторные обращения к ним не выполняли запросов
+    """
+
+    def __init__(self) -> None:
+        self.objects: defaultdict[type[Model], dict[Any, Optional[Model]]] = defaultdict(dict)
+        self.pending: defaultdict[type[Model], set[Any]] = defaultdict(set)
+        self.registered_fields: set[Field] = set()
+
+    def register(self, model: type[Model], ids: Iterable[Any]) -> None:
+        objects = self.objects[model]
+        self.pending[model].update(pk for pk in ids if pk not in objects)
+
+    def get(self, source: Union[QuerySet, ReferenceCache], pk: Any) -> Optional[Model]:
+        """Метод, возвращающий объект по id. Объекты загружаются из source: запроса или кэша справочной модели"""
+
+        objects = self.objects[source.model]
+        if pk not in objects:
+            ids = self.pending.pop(source.model, set()) | {pk}
+            loaded = source.in_bulk(ids)
+            for object_id in ids:
+                objects[object_id] = loaded.get(object_id)
+        return objects[pk]
+
+
+def get_identity_map(serializer: Optional[Field] = None) -> IdentityMap:
+    """
+    Функция, возвращающая карту объектов текущего запроса. Вне запроса карта живет, пока жив корневой
+    сериализатор, а без сериализатора создается новая карта
+    """
+
+    identity_map = _request_identity_map.get()
+    if identity_map is not None:
+        return identity_map
+    if serializer is None:
+        return IdentityMap()
+    root = getattr(serializer, 'root', serializer)
+    identity_map = getattr(root, '_identity_map', None)
+    if identity_map is None:
+        identity_map = IdentityMap()
+        setattr(root, '_identity_map', identity_map)
+    return identity_map
+
+
+def get_referenced_values(field: Field, key: Optional[str] = None) -> list[Any]:
+    """
+    Функция, возвращающая все значения поля field в данных корневого сериализатора: для элементов
+    списочных сериализаторов значения собираются из каждого элемента, key - ключ внутри значения поля
+    """
+
+    path: list[Optional[str]] = [] if key is None else [key]
+    node = field
+    while getattr(node, 'parent', None) is not None:
+        path.append(None if isinstance(node.parent, ListSerializer) else node.field_name)
+        node = node.parent
+
+    values = [getattr(node, 'initial_data', None)]
+    for name in reversed(path):
+        if name is None:
+            values = [item for value in values if isinstance(value, list) for item in value]
+        else:
+            values = [value[name] for value in values if isinstance(value, dict) and name in value]
+    return values
+
+
+def register_referenced_ids(field: Field, model: type[Model], key: Optional[str] = None) -> IdentityMap:
+    """
+    Функция, один раз для поля регистрирующая в карте объектов все id модели, на которые ссылается поле
+    в данных запроса, и возвращающая карту
+    """
+
+    identity_map = get_identity_map(field)
+    if field not in identity_map.registered_fields:
+        identity_map.registered_fields.add(field)
+        identity_map.register(model, (pk for pk in get_referenced_values(field, key) if type(pk) is int))
+    return identity_map
+
+
+@sync_and_async_middleware
+def identity_map_middleware(get_response: Callable[[HttpRequest], Any]) -> Callable[[HttpRequest], Any]:
+    """
+    Промежуточный слой, создающий карту объектов на время каждого запроса. Под ASGI цепочка обработчиков
+    асинхронная, и карта устанавливается вокруг await get_response(request) без перехода в поток
+    """
+
+    if asyncio.iscoroutinefunction(get_response):
+        async def async_middleware(request: HttpRequest) -> HttpResponseBase:
+            token = _request_identity_map.set(IdentityMap())
+            try:
+                return await get_response(request)
+            finally:
+                _request_identity_map.reset(token)
+
+        return async_middleware
+
+    def middleware(request: HttpRequest) -> HttpResponseBase:
+        token = _request_identity_map.set(IdentityMap())
+        try:
+            return get_response(request)
+        finally:
+            _request_identity_map.reset(token)
+
+    return middleware
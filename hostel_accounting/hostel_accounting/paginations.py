@@ -1,7 +1,322 @@
-from rest_framework.pagination import PageNumberPagination
+import json
+import time
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Optional, Sequence
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db import connections
+from django.db.models import F, Q, QuerySet
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.generics import GenericAPIView
+from rest_framework.pagination import BasePagination, PageNumberPagination, _positive_int
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework.utils.urls import replace_query_param
 
 
 class DefaultPagination(PageNumberPagination):
     page_size = 50
     page_size_query_param = 'page_size'
     max_page_size = 10000
+
+
+# Количество строк таблиц по статистике PostgreSQL: (база данных, таблица) -> (время проверки, количество)
+table_sizes: dict[tuple[str, str], tuple[float, float]] = {}
+
+
+def get_table_size(queryset: QuerySet) -> float:
+    """
+    Функция, возвращающая количество строк таблицы запроса по статистике PostgreSQL (pg_class.reltuples).
+    Статистика читается не чаще, чем раз в DATA_VERSION_CHECK_INTERVAL секунд. Если таблицу еще
+    не анализировали, возвращается число не больше 0
+    """
+
+    key = (queryset.db, queryset.model._meta.db_table)
+    now = time.monotonic()
+    checked = table_sizes.get(key)
+    if checked is None or now - checked[0] >= settings.DATA_VERSION_CHECK_INTERVAL:
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [key[1]])
+            row = cursor.fetchone()
+        checked = table_sizes[key] = (now, -1 if row is None else row[0])
+    return checked[1]
+
+
+def estimate_count(queryset: QuerySet, minimum: int = 0) -> Optional[int]:
+    """
+    Функция, возвращающая оценку количества записей запроса по статистике планировщика PostgreSQL
+    (EXPLAIN без выполнения запроса). Оценки нет (возвращается None), если СУБД не PostgreSQL, у таблицы
+    запроса нет статистики (тогда планировщик подставляет значения по умолчанию) или в таблице меньше
+    minimum строк: тогда EXPLAIN не выполняется, ведь оценка все равно не будет использована
+    """
+
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    table_size = get_table_size(queryset)
+    if table_size <= 0 or table_size < minimum:
+        return None
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedCountPage(Page):
+    """
+    Страница пагинатора с оценкой количества записей. Число страниц по оценке неточно, поэтому
+    загружается на одну запись больше, и по ней определяется, есть ли следующая страница
+    """
+
+    def __init__(self, object_list: Any, number: int, paginator: Paginator) -> None:
+        object_list = list(object_list)
+        self.has_more = len(object_list) > paginator.per_page
+        super().__init__(object_list[:paginator.per_page], number, paginator)
+
+    def has_next(self) -> bool:
+        return self.has_more
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор, который для больших запросов берет количество записей из оценки планировщика, а не из COUNT(*).
+    Оценка планировщика для запросов с фильтрами может быть завышена во много раз, поэтому она используется,
+    только если не меньше PAGINATION_ESTIMATED_COUNT_THRESHOLD * PAGINATION_ESTIMATED_COUNT_SAFETY_FACTOR.
+    Иначе или если оценки нет (не PostgreSQL или у таблицы нет статистики), записи считаются точно
+    """
+
+    count_estimated = False
+    known_count: Optional[int] = None
+
+    def __init__(self, queryset: QuerySet, per_page: int, **kwargs: Any) -> None:
+        super().__init__(queryset, per_page, **kwargs)
+        self.queryset = queryset
+
+    @staticmethod
+    def get_minimum_estimate() -> int:
+        return settings.PAGINATION_ESTIMATED_COUNT_THRESHOLD * settings.PAGINATION_ESTIMATED_COUNT_SAFETY_FACTOR
+
+    def get_count(self, estimate: Optional[int]) -> Optional[int]:
+        """Метод возвращает оценку количества, если ее следует использовать, иначе None"""
+
+        self.count_estimated = estimate is not None and estimate >= self.get_minimum_estimate()
+        return estimate if self.count_estimated else None
+
+    @property
+    def count(self) -> int:
+        if self.known_count is None:
+            count = self.get_count(estimate_count(self.queryset, self.get_minimum_estimate()))
+            self.known_count = self.queryset.count() if count is None else count
+        return self.known_count
+
+    async def acount(self) -> int:
+        """Асинхронный count: оценка читается сырым SQL в потоке, точное количество - через acount() запроса"""
+
+        if self.known_count is None:
+            count = self.get_count(await sync_to_async(estimate_count)(self.queryset, self.get_minimum_estimate()))
+            self.known_count = await self.queryset.acount() if count is None else count  # type: ignore[attr-defined]
+        return self.known_count
+
+    def validate_number(self, number: Any) -> int:
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # Страницы за пределами оценки не отсекаются: пустая страница означает, что записей больше нет
+            if not self.count_estimated or int(number) < 1:
+                raise
+            return int(number)
+
+    def page(self, number: Any) -> Page:
+        # Оценка количества становится известна после подсчета count
+        if not self.count or not self.count_estimated:
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return EstimatedCountPage(self.queryset[bottom:bottom + self.per_page + 1], number, self)
+
+    async def apage(self, number: Any) -> Page:
+        """Асинхронный page: записи страницы загружаются асинхронным итератором запроса"""
+
+        if not await self.acount() or not self.count_estimated:
+            page = super().page(number)
+            page.object_list = [obj async for obj in page.object_list]  # type: ignore[attr-defined]
+            return page
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = [obj async for obj in self.queryset[bottom:bottom + self.per_page + 1]]  # type: ignore[attr-defined]
+        return EstimatedCountPage(rows, number, self)
+
+
+class EstimatedCountPagination(DefaultPagination):
+    """Пагинация по номеру страницы, в ответе которой отмечено, является ли количество записей оценкой"""
+
+    django_paginator_class = EstimatedCountPaginator
+
+    def get_paginated_response(self, data: list[Any]) -> Response:
+        paginator = getattr(self.page, 'paginator')
+        return Response(OrderedDict([
+            ('count', paginator.count),
+            ('count_estimated', paginator.count_estimated),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema: dict[str, Any]) -> dict[str, Any]:
+        response_schema = super().get_paginated_response_schema(schema)
+        properties = response_schema['properties']
+        response_schema['properties'] = {'count': properties.pop('count'),
+                                         'count_estimated': {'type': 'boolean', 'example': False}, **properties}
+        return response_schema
+
+
+def encode_cursor(key: Sequence[Any]) -> str:
+    """Функция, кодирующая ключ последней записи страницы в курсор"""
+
+    key = [value.isoformat() if isinstance(value, datetime) else value for value in key]
+    return urlsafe_b64encode(json.dumps(key).encode()).decode()
+
+
+def decode_datetime_cursor(cursor: str) -> tuple[datetime, int]:
+    """Функция, декодирующая курсор с ключом (datetime, id)"""
+
+    try:
+        value, pk = json.loads(urlsafe_b64decode(cursor.encode()))
+        value = parse_datetime(value)
+        if value is None or type(pk) is not int:
+            raise ValueError
+    except (TypeError, ValueError):
+        raise NotFound('Неверный курсор')
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, timezone.utc)
+    return value, pk
+
+
+def decode_cursor(cursor: str) -> list[Any]:
+    """Функция, декодирующая курсор в список значений ключа"""
+
+    try:
+        key = json.loads(urlsafe_b64decode(cursor.encode()))
+    except (TypeError, ValueError):
+        raise NotFound('Неверный курсор')
+    if not isinstance(key, list):
+        raise NotFound('Неверный курсор')
+    return key
+
+
+class KeysetPagination(BasePagination):
+    """
+    Пагинация по ключу: страница - это page_size записей, следующих в порядке ordering за ключом последней
+    записи предыдущей страницы. Количество записей не считается, а записи предыдущих страниц не просматриваются,
+    поэтому глубокие страницы загружаются так же быстро, как первая. Последнее поле ordering должно быть
+    уникальным. Ключ загружается аннотациями, поэтому запрос может быть ограничен only() или values()
+    """
+
+    page_size = DefaultPagination.page_size
+    page_size_query_param = DefaultPagination.page_size_query_param
+    max_page_size = DefaultPagination.max_page_size
+    cursor_query_param = 'cursor'
+    ordering: tuple[str, ...] = ('id',)
+
+    def get_page_size(self, request: Request) -> int:
+        """Метод возвращает размер страницы из параметра запроса так же, как PageNumberPagination"""
+
+        try:
+            return _positive_int(str(request.query_params[self.page_size_query_param]), strict=True,
+                                 cutoff=self.max_page_size)
+        except (KeyError, ValueError):
+            return self.page_size
+
+    def get_key_fields(self) -> list[tuple[str, str, bool]]:
+        """Метод возвращает поля ключа: (поле, имя аннотации, порядок по убыванию)"""
+
+        return [(field.lstrip('-'), f'keyset_{field.lstrip("-")}', field.startswith('-')) for field in self.ordering]
+
+    def get_after_key_filter(self, queryset: QuerySet, key: list[Any]) -> Q:
+        """Метод возвращает условие отбора записей, следующих за ключом key"""
+
+        key_fields = self.get_key_fields()
+        if len(key) != len(key_fields):
+            raise NotFound('Неверный курсор')
+        condition, equal = Q(), Q()
+        for (field, _, descending), value in zip(key_fields, key):
+            try:
+                value = queryset.model._meta.get_field(field).to_python(value)
+            except ValidationError:
+                raise NotFound('Неверный курсор')
+            condition |= equal & Q(**{f'{field}__{"lt" if descending else "gt"}': value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def get_page_queryset(self, queryset: QuerySet, request: Request) -> QuerySet:
+        """Метод возвращает запрос записей страницы и одной записи после нее, по которой видно, есть ли еще записи"""
+
+        self.request = request
+        key_fields = self.get_key_fields()
+        queryset = queryset.annotate(**{name: F(field) for field, name, _ in key_fields}).order_by(*self.ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            queryset = queryset.filter(self.get_after_key_filter(queryset, decode_cursor(cursor)))
+        return queryset[:self.get_page_size(request) + 1]
+
+    def get_page(self, rows: list[Any]) -> list[Any]:
+        """Метод возвращает страницу из записей запроса get_page_queryset и запоминает ключ следующей страницы"""
+
+        page_size = self.get_page_size(self.request)
+        self.next_key = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            self.next_key = [last[name] if isinstance(last, dict) else getattr(last, name)
+                             for _, name, _ in self.get_key_fields()]
+        return rows
+
+    def paginate_queryset(self, queryset: QuerySet, request: Request, view: Optional[APIView] = None) -> list[Any]:
+        return self.get_page(list(self.get_page_queryset(queryset, request)))
+
+    def get_next_link(self) -> Optional[str]:
+        if self.next_key is None:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param,
+                                   encode_cursor(self.next_key))
+
+    def get_paginated_response(self, data: list[Any]) -> Response:
+        return Response(OrderedDict([('next', self.get_next_link()), ('results', data)]))
+
+    def get_paginated_response_schema(self, schema: dict[str, Any]) -> dict[str, Any]:
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class PurchaseKeysetPagination(KeysetPagination):
+    """Пагинация покупок по ключу (datetime, id) от новых к старым"""
+
+    ordering = ('-datetime', '-id')
+
+
+def get_list_pagination(request: Request, view: GenericAPIView) -> BasePagination:
+    """
+    Функция, возвращающая пагинацию списка: пагинацию по ключу представления (cursor_pagination_class),
+    если она запрошена параметром pagination=cursor, иначе пагинацию представления
+    """
+
+    cursor_pagination_class = getattr(view, 'cursor_pagination_class', None)
+    if cursor_pagination_class is not None and request.query_params.get('pagination') == 'cursor':
+        return cursor_pagination_class()
+    return view.paginator or DefaultPagination()
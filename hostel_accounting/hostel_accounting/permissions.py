@@ -7,6 +7,7 @@ from rest_framework.views import APIView
 
 from accounts.models import User
 from goods_accounting.models import Purchase
+from hostel_accounting.utils import get_authenticated_user
 
 
 class ReadOnly(permissions.BasePermission):
@@ -36,7 +37,7 @@ class PurchasePermissionGET(permissions.BasePermission):
         return IsAuthenticated.has_permission(self, request, view)
 
     def has_object_permission(self, request: Request, view: APIView, obj: Any) -> bool:
-        return request.user.roommates_group == obj.user.roommates_group or request.user.is_staff
+        return request.user.roommates_group_id == obj.user.roommates_group_id or request.user.is_staff
 
 
 class CustomPermission(permissions.BasePermission):
@@ -71,13 +72,14 @@ class IsRoommate(permissions.BasePermission):
 class IsAuthenticatedAndWithoutGroup(permissions.BasePermission):
 
     def has_permission(self, request: Request, view: APIView) -> bool:
-        return IsAuthenticated.has_permission(self, request, view) and request.user.roommates_group is None
+        return IsAuthenticated.has_permission(self, request, view) and request.user.roommates_group_id is None
 
 
 class IsAuthenticatedAndWithGroup(permissions.BasePermission):
 
     def has_permission(self, request: Request, view: APIView) -> bool:
-        return not IsAuthenticatedAndWithoutGroup.has_permission(self, request, view)
+        return IsAuthenticated.has_permission(self, request, view) and \
+            get_authenticated_user(request).roommates_group_id is not None
 
 
 class RoommatesGroupPermission(CustomPermission):
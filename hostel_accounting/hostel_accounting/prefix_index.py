@@ -0,0 +1,108 @@
+import threading
+from bisect import bisect_left, insort
+from typing import Callable, Iterable, Optional
+
+from hostel_accounting.caching import CATALOG_SCOPE, get_checked_version
+
+IndexRow = tuple[int, str, Optional[int]]
+
+
+def normalize_name(name: str) -> str:
+    """Функция, приводящая название к виду для поиска: без регистра, лишних пробелов и буквы «ё»"""
+
+    return ' '.join(name.casefold().replace('ё', 'е').split())
+
+
+class PrefixIndex:
+    """
+    Индекс названий в памяти процесса для поиска по началу названия. Названия хранятся отсортированными
+    массивами пар (нормализованное название, id): общим и по группам (например, категориям товаров),
+    поэтому поиск - это bisect и чтение limit элементов подряд.
+
+    Изменения этого процесса применяются к индексу по одному после фиксации транзакции и учитываются
+    в local_changes. Версия области scope читается из базы данных не реже, чем раз
+    в DATA_VERSION_CHECK_INTERVAL секунд. Если она выросла больше, чем на количество локальных изменений,
+    значит данные изменил другой процесс, и индекс перестраивается целиком.
+    Чтение и изменение списков индекса выполняются под блокировкой lock
+    """
+
+    def __init__(self, get_rows: Callable[[], Iterable[IndexRow]], scope: str = CATALOG_SCOPE) -> None:
+        self.get_rows = get_rows
+        self.scope = scope
+        self.lock = threading.Lock()
+        self.generation: Optional[int] = None
+        self.local_changes = 0
+        self.entries: list[tuple[str, int]] = []
+        self.groups: dict[Optional[int], list[tuple[str, int]]] = {}
+        self.rows: dict[int, IndexRow] = {}
+
+    def build(self, generation: int) -> None:
+        rows = {row[0]: row for row in self.get_rows()}
+        entries: list[tuple[str, int]] = []
+        groups: dict[Optional[int], list[tuple[str, int]]] = {}
+        for pk, name, group in rows.values():
+            entry = (normalize_name(name), pk)
+            entries.append(entry)
+            groups.setdefault(group, []).append(entry)
+        entries.sort()
+        for group_entries in groups.values():
+            group_entries.sort()
+        self.entries, self.groups, self.rows = entries, groups, rows
+        self.generation, self.local_changes = generation, 0
+
+    def refresh(self) -> None:
+        generation = get_checked_version(self.scope)
+        if generation == self.generation:
+            return
+        with self.lock:
+            if self.generation is not None and generation == self.generation + self.local_changes:
+                self.generation, self.local_changes = generation, 0
+            elif generation != self.generation:
+                self.build(generation)
+
+    def search(self, prefix: str, group: Optional[int] = None, limit: int = 10) -> list[IndexRow]:
+        """Метод, возвращающий до limit строк индекса, названия которых начинаются с prefix"""
+
+        self.refresh()
+        prefix = normalize_name(prefix)
+        rows: list[IndexRow] = []
+        with self.lock:
+            entries = self.entries if group is None else self.groups.get(group, [])
+            index = bisect_left(entries, (prefix,))
+            while index < len(entries) and len(rows) < limit:
+                key, pk = entries[index]
+                if not key.startswith(prefix):
+                    break
+                rows.append(self.rows[pk])
+                index += 1
+        return rows
+
+    def remove_row(self, pk: int) -> None:
+        row = self.rows.pop(pk, None)
+        if row is None:
+            return
+        entry = (normalize_name(row[1]), pk)
+        for entries in (self.entries, self.groups.get(row[2], [])):
+            index = bisect_left(entries, entry)
+            if index < len(entries) and entries[index] == entry:
+                del entries[index]
+
+    def update(self, row: Optional[IndexRow] = None, pk: Optional[int] = None) -> None:
+        """
+        Метод, учитывающий изменение данных этого процесса после фиксации транзакции и увеличения версии
+        области scope: добавление или изменение строки row, удаление строки с id pk или, если не передано
+        ни то, ни другое, изменение, которое не затрагивает индекс
+        """
+
+        with self.lock:
+            self.local_changes += 1
+            if self.generation is None:
+                return
+            if pk is not None:
+                self.remove_row(pk)
+            if row is not None:
+                self.remove_row(row[0])
+                entry = (normalize_name(row[1]), row[0])
+                insort(self.entries, entry)
+                insort(self.groups.setdefault(row[2], []), entry)
+                self.rows[row[0]] = row
@@ -0,0 +1,189 @@
+from functools import lru_cache
+from typing import Any, Iterable, Optional
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Model, Prefetch, QuerySet
+from rest_framework.fields import Field
+from rest_framework.serializers import BaseSerializer, ListSerializer, Serializer
+
+
+class QuerysetPlan:
+    """
+    Столбцы и связи, которые нужны сериализатору: столбцы для only(), связи «к одному» для select_related
+    и связи «ко многим» для Prefetch. Если сериализатор читает атрибут, которого нет среди полей модели,
+    столбцы не ограничиваются
+    """
+
+    def __init__(self) -> None:
+        self.only: set[str] = set()
+        self.select_related: set[str] = set()
+        self.prefetches: list[Prefetch] = []
+        self.prune = True
+
+    def apply(self, queryset: QuerySet) -> QuerySet:
+        queryset = queryset.select_related(None).prefetch_related(None)
+        if self.prune:
+            queryset = queryset.only(*self.only)
+        if self.select_related:
+            queryset = queryset.select_related(*sorted(self.select_related))
+        if self.prefetches:
+            queryset = queryset.prefetch_related(*self.prefetches)
+        return queryset
+
+
+def get_model_field(model: type[Model], name: str) -> Any:
+    """Функция, возвращающая поле модели или обратную связь по имени атрибута"""
+
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        for relation in model._meta.related_objects:  # type: ignore[attr-defined]
+            if relation.get_accessor_name() == name:
+                return relation
+    return None
+
+
+def collect_source(plan: QuerysetPlan, model: type[Model], prefix: str, source_attrs: list[str],
+                   field: Optional[Field]) -> None:
+    """
+    Функция, добавляющая в план столбцы и связи, через которые проходит источник поля. Связь, на которой
+    заканчивается источник, загружается, только если поле - вложенный сериализатор или поля нет
+    """
+
+    for index, attr in enumerate(source_attrs):
+        model_field = get_model_field(model, attr)
+        if model_field is None or (model_field.one_to_one and model_field.auto_created):
+            plan.prune = False
+            return
+
+        lookup = prefix + attr
+        if model_field.one_to_many or model_field.many_to_many:
+            plan.prefetches.append(get_prefetch(lookup, model_field, field))
+            return
+
+        plan.only.add(lookup)
+        is_last = index == len(source_attrs) - 1
+        if not model_field.is_relation or (is_last and field is not None and not isinstance(field, Serializer)):
+            return
+        plan.select_related.add(lookup)
+        model, prefix = model_field.related_model, lookup + '__'
+
+    if isinstance(field, Serializer):
+        collect_serializer(plan, field, model, prefix)
+
+
+def collect_serializer(plan: QuerysetPlan, serializer: Serializer, model: type[Model], prefix: str = '') -> None:
+    """
+    Функция, добавляющая в план источники всех читаемых полей сериализатора и связи из Meta.extra_sources,
+    которые сериализатор читает сам, например, в to_representation
+    """
+
+    for source in getattr(getattr(serializer, 'Meta', None), 'extra_sources', ()):
+        collect_source(plan, model, prefix, source.split('.'), None)
+    for field in serializer._readable_fields:
+        if field.source == '*':
+            plan.prune = False
+            continue
+        collect_source(plan, model, prefix, field.source_attrs, field)
+
+
+def get_prefetch(lookup: str, relation: Any, field: Optional[Field]) -> Prefetch:
+    """Функция, возвращающая Prefetch связи «ко многим» с запросом, ограниченным полями вложенного сериализатора"""
+
+    child = field.child if isinstance(field, ListSerializer) else field
+    if not isinstance(child, Serializer):
+        return Prefetch(lookup)
+    plan = QuerysetPlan()
+    if relation.one_to_many:
+        # Для распределения объектов по родителям нужен внешний ключ на родителя
+        plan.only.add(relation.field.name)
+    collect_serializer(plan, child, relation.related_model)
+    return Prefetch(lookup, queryset=plan.apply(relation.related_model._default_manager.all()))
+
+
+def optimize_queryset(queryset: QuerySet, serializer: BaseSerializer) -> QuerySet:
+    """
+    Функция, ограничивающая запрос столбцами и связями, которые нужны сериализатору (например, плану полей):
+    ненужные столбцы не выбираются, а связи, которых нет среди полей, не загружаются
+    """
+
+    child = serializer.child if isinstance(serializer, ListSerializer) else serializer
+    plan = QuerysetPlan()
+    if isinstance(child, Serializer):
+        collect_serializer(plan, child, queryset.model)
+    return plan.apply(queryset)
+
+
+class ValuesRenderer:
+    """
+    Рендерер, строящий представление объектов прямо из строк values() без создания моделей и без
+    сериализатора. Значения преобразуются теми же полями DRF, что и в сериализаторе, поэтому JSON совпадает.
+    Поддерживаются сериализаторы, поля которых - столбцы модели и вложенные сериализаторы связей «к одному»
+    """
+
+    def __init__(self, nodes: list[tuple], paths: list[str]) -> None:
+        self.nodes = nodes
+        self.paths = paths
+
+    @classmethod
+    def compile(cls, serializer: Serializer, model: type[Model]) -> Optional['ValuesRenderer']:
+        paths: list[str] = []
+        nodes = cls.compile_nodes(serializer, model, '', paths)
+        return None if nodes is None else cls(nodes, paths)
+
+    @classmethod
+    def compile_nodes(cls, serializer: Serializer, model: type[Model], prefix: str,
+                      paths: list[str]) -> Optional[list[tuple]]:
+        """
+        Метод возвращает узлы представления: (имя поля, путь в values(), поле DRF, узлы вложенного
+        сериализатора или None). Если сериализатор не поддерживается, возвращается None
+        """
+
+        if type(serializer).to_representation is not Serializer.to_representation:
+            return None
+        nodes: list[tuple] = []
+        for field in serializer._readable_fields:
+            if not isinstance(field.source, str) or field.source == '*' or len(field.source_attrs) != 1:
+                return None
+            model_field = get_model_field(model, field.source)
+            path = prefix + field.source
+            if model_field is None or model_field.one_to_many or model_field.many_to_many \
+                    or (model_field.one_to_one and model_field.auto_created):
+                return None
+            children = None
+            if model_field.is_relation:
+                if not isinstance(field, Serializer):
+                    return None
+                children = cls.compile_nodes(field, model_field.related_model, path + '__', paths)
+                if children is None:
+                    return None
+            paths.append(path)
+            nodes.append((field.field_name, path, field, children))
+        return nodes
+
+    def get_values(self, queryset: QuerySet) -> QuerySet:
+        return queryset.select_related(None).prefetch_related(None).values(*self.paths)
+
+    def render(self, rows: Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+        return [self.render_row(row, self.nodes) for row in rows]
+
+    def render_row(self, row: dict[str, Any], nodes: list[tuple]) -> dict[str, Any]:
+        data: dict[str, Any] = {}
+        for name, path, field, children in nodes:
+            value = row[path]
+            if value is None:
+                data[name] = None
+            elif children is None:
+                data[name] = field.to_representation(value)
+            else:
+                data[name] = self.render_row(row, children)
+        return data
+
+
+@lru_cache(maxsize=settings.SERIALIZER_FIELD_PLANS_CACHE_SIZE)
+def get_values_renderer(serializer: Serializer) -> Optional[ValuesRenderer]:
+    """Функция, возвращающая рендерер из строк values() для плана полей или None, если план не поддерживается"""
+
+    model = getattr(getattr(serializer, 'Meta', None), 'model', None)
+    return None if model is None else ValuesRenderer.compile(serializer, model)
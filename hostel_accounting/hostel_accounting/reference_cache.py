@@ -0,0 +1,121 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Iterable, Optional
+
+from django.conf import settings
+from django.db.models import Model, QuerySet
+from rest_framework.serializers import BaseSerializer
+
+from hostel_accounting.caching import CATALOG_SCOPE, get_checked_version
+
+
+class ReferenceCacheState:
+    """
+    Объекты и представления справочной модели, загруженные при одной версии данных. Представления
+    хранятся по ключу (требуемые поля, id объекта) не больше SERIALIZER_FIELD_PLANS_CACHE_SIZE штук,
+    давно не запрошенные вытесняются первыми
+    """
+
+    def __init__(self, generation: Optional[int]) -> None:
+        self.generation = generation
+        self.objects: dict[Any, Model] = {}
+        self.ordered: Optional[list[Model]] = None
+        self.representations: OrderedDict[tuple, Any] = OrderedDict()
+        self.representations_lock = threading.Lock()
+
+    def get_representation(self, key: tuple) -> Optional[Any]:
+        with self.representations_lock:
+            if key not in self.representations:
+                return None
+            self.representations.move_to_end(key)
+            return self.representations[key]
+
+    def set_representation(self, key: tuple, representation: Any) -> None:
+        with self.representations_lock:
+            self.representations[key] = representation
+            self.representations.move_to_end(key)
+            while len(self.representations) > settings.SERIALIZER_FIELD_PLANS_CACHE_SIZE:
+                self.representations.popitem(last=False)
+
+
+class ReferenceCache:
+    """
+    Кэш редко изменяемой справочной модели в памяти процесса: объекты по id и их готовые представления.
+    Изменение объектов в этом процессе сбрасывает кэш сразу, а в остальных процессах - когда версия
+    области scope в базе данных перестает совпадать с версией загруженных данных (версия проверяется
+    не реже, чем раз в DATA_VERSION_CHECK_INTERVAL секунд). Объекты, которых нет в кэше, всегда ищутся
+    в базе данных, поэтому объекты, созданные другими процессами, доступны сразу.
+    Объекты кэша общие для всех запросов, поэтому изменять их нельзя
+    """
+
+    def __init__(self, model: type[Model], get_queryset: Callable[[], QuerySet], scope: str = CATALOG_SCOPE) -> None:
+        self.model = model
+        self.get_queryset = get_queryset
+        self.scope = scope
+        self.state = ReferenceCacheState(None)
+
+    def get_state(self) -> ReferenceCacheState:
+        generation = get_checked_version(self.scope)
+        state = self.state
+        if state.generation != generation:
+            state = self.state = ReferenceCacheState(generation)
+        return state
+
+    def invalidate(self) -> None:
+        self.state = ReferenceCacheState(None)
+
+    def in_bulk(self, ids: Iterable[Any]) -> dict[Any, Model]:
+        """
+        Метод, возвращающий существующие объекты с id из ids. Объекты, которых нет в кэше, ищутся в базе
+        данных одним запросом. Отсутствие объекта не запоминается: его мог создать другой процесс
+        """
+
+        state = self.get_state()
+        ids = set(ids)
+        missing = [pk for pk in ids if pk not in state.objects]
+        if missing:
+            state.objects.update(self.get_queryset().in_bulk(missing))
+        return {pk: state.objects[pk] for pk in ids if pk in state.objects}
+
+    def all(self) -> list[Model]:
+        state = self.get_state()
+        if state.ordered is None:
+            objects = list(self.get_queryset())
+            state.objects = {obj.pk: obj for obj in objects}
+            state.ordered = objects
+        return state.ordered
+
+    def render(self, fields: tuple, field_plan: BaseSerializer, obj: Optional[Model] = None) -> Any:
+        """
+        Метод, возвращающий готовое представление объекта obj или, если он не передан, всех объектов.
+        fields - требуемые поля, приведенные normalize_fields_params, field_plan - план полей для них
+        """
+
+        state = self.get_state()
+        key = (fields, None if obj is None else obj.pk)
+        representation = state.get_representation(key)
+        if representation is None:
+            representation = field_plan.to_representation(self.all() if obj is None else obj)
+            state.set_representation(key, representation)
+        return representation
+
+
+reference_caches: dict[type[Model], ReferenceCache] = {}
+
+
+def register_reference_cache(model: type[Model], get_queryset: Callable[[], QuerySet]) -> ReferenceCache:
+    """Функция, создающая кэш справочной модели model, объекты которой загружаются запросом get_queryset()"""
+
+    reference_caches[model] = ReferenceCache(model, get_queryset)
+    return reference_caches[model]
+
+
+def get_reference_cache(model: type[Model]) -> Optional[ReferenceCache]:
+    return reference_caches.get(model)
+
+
+def invalidate_reference_caches() -> None:
+    """Функция, сбрасывающая кэши всех справочных моделей в этом процессе"""
+
+    for reference_cache in reference_caches.values():
+        reference_cache.invalidate()
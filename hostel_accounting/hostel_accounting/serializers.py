@@ -1,10 +1,18 @@
 from typing import Any
 
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
+from rest_framework.settings import ISO_8601
 
-from accounts.models import RoommatesGroup, User
+from accounts.models import RoommatesGroup, User, UserBalance
 from goods_accounting.models import ProductPurchase, Purchase, Product, ProductCategory
+from goods_accounting.purchases_io import PURCHASES_FILE_FORMATS
+from hostel_accounting.caching import bump_user_purchases_version
+from hostel_accounting.identity_map import register_referenced_ids
+from hostel_accounting.paginations import DefaultPagination
+from hostel_accounting.reference_cache import get_reference_cache
 from hostel_accounting.utils import DynamicFieldsSerializerMixin, GetObjectByIdFromRequestSerializerMixin, \
     ChangeFieldsInDeepSerializersMixin
 
@@ -70,6 +78,8 @@ class ProductPurchaseSerializer(GetObjectByIdFromRequestSerializerMixin, Dynamic
     class Meta:
         model = ProductPurchase
         fields = ('id', 'name', 'price', 'category')
+        # to_representation проверяет наличие товара, поэтому товар загружается при любых полях
+        extra_sources = ('product',)
 
     @staticmethod
     def val(data: Any) -> None:
@@ -83,12 +93,13 @@ class ProductPurchaseSerializer(GetObjectByIdFromRequestSerializerMixin, Dynamic
         if data['price'] < 0:
             raise ValidationError(f'Цена не может быть отрицательной ({data["price"]})')
 
-    @staticmethod
-    def get_obj(data: dict[str, int]) -> tuple[Product, int]:
-        obj = Product.objects.filter(pk=data['product'])
-        if not obj.exists():
+    def get_obj(self, data: dict[str, int]) -> tuple[Product, int]:
+        identity_map = register_referenced_ids(self, Product, 'product')
+        obj = identity_map.get(get_reference_cache(Product) or Product.objects.select_related('category'),
+                               data['product'])
+        if not isinstance(obj, Product):
             raise ValidationError(f'Объект c id \'{data["product"]}\' не существует')
-        return obj[0], data['price']
+        return obj, data['price']
 
     def to_representation(self, instance: ProductPurchase) -> Any:
         if instance.product is None:
@@ -113,6 +124,88 @@ class AllGroupsPurchasesSerializer(ChangeFieldsInDeepSerializersMixin, DynamicFi
                                   ('product_category_fields', ('users_purchases', 'products', 'category')))
 
 
+class CategorySpendingSerializer(DynamicFieldsSerializerMixin, serializers.Serializer):
+    category = ProductCategorySerializer(allow_null=True)
+    total = serializers.IntegerField()
+    count = serializers.IntegerField()
+
+
+class UserSpendingSerializer(DynamicFieldsSerializerMixin, serializers.Serializer):
+    user = UserWithoutRoommatesGroupSerializer()
+    total = serializers.IntegerField()
+    count = serializers.IntegerField()
+    categories = CategorySpendingSerializer(many=True)
+
+
+class GroupSpendingSerializer(ChangeFieldsInDeepSerializersMixin, DynamicFieldsSerializerMixin,
+                              serializers.Serializer):
+    roommates_group = RoommatesGroupWithoutUsersSerializer()
+    users_spending = UserSpendingSerializer(many=True)
+
+    class Meta:
+        fields_serializer_data = (('roommates_group_fields', ('roommates_group',)),
+                                  ('user_fields', ('users_spending', 'user')),
+                                  ('product_category_fields', ('users_spending', 'categories', 'category')))
+
+
+class UserBalanceSerializer(DynamicFieldsSerializerMixin, serializers.Serializer):
+    user = UserWithoutRoommatesGroupSerializer()
+    spent = serializers.IntegerField()
+    balance = serializers.IntegerField()
+
+
+class TransferSerializer(DynamicFieldsSerializerMixin, serializers.Serializer):
+    from_user = serializers.IntegerField()
+    to_user = serializers.IntegerField()
+    amount = serializers.IntegerField()
+
+
+class GroupSettlementSerializer(ChangeFieldsInDeepSerializersMixin, DynamicFieldsSerializerMixin,
+                                serializers.Serializer):
+    balances = UserBalanceSerializer(many=True)
+    transfers = TransferSerializer(many=True)
+
+    class Meta:
+        fields_serializer_data = (('user_fields', ('balances', 'user')),)
+
+
+class PurchasesPeriodQuerySerializer(serializers.Serializer):
+    """Сериализатор параметров запроса, ограничивающих период совершения покупок"""
+
+    since = serializers.DateTimeField(required=False, input_formats=(ISO_8601, '%Y-%m-%d'))
+    until = serializers.DateTimeField(required=False, input_formats=(ISO_8601, '%Y-%m-%d'))
+
+
+class GroupsPurchasesQuerySerializer(PurchasesPeriodQuerySerializer):
+    """Сериализатор параметров запроса получения всех покупок комнаты"""
+
+    cursor = serializers.CharField(required=False)
+    page_size = serializers.IntegerField(required=False, min_value=1, max_value=DefaultPagination.max_page_size)
+
+
+class PurchasesImportSerializer(serializers.Serializer):
+    """Сериализатор запроса импорта покупок из файла"""
+
+    file = serializers.FileField()
+    format = serializers.ChoiceField(choices=PURCHASES_FILE_FORMATS, required=False)
+    chunk_size = serializers.IntegerField(required=False, min_value=1)
+
+
+class PurchasesExportQuerySerializer(serializers.Serializer):
+    """Сериализатор параметров запроса экспорта покупок"""
+
+    file_format = serializers.ChoiceField(choices=PURCHASES_FILE_FORMATS, default='csv')
+    roommates_group = serializers.IntegerField(required=False)
+
+
+class ProductsAutocompleteQuerySerializer(serializers.Serializer):
+    """Сериализатор параметров запроса поиска товаров по началу названия"""
+
+    q = serializers.CharField(trim_whitespace=False)
+    category = serializers.IntegerField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=settings.PRODUCTS_AUTOCOMPLETE_MAX_LIMIT, default=10)
+
+
 class PurchaseSerializer(ChangeFieldsInDeepSerializersMixin, DynamicFieldsSerializerMixin,
                          serializers.ModelSerializer):
     user = UserSerializer(required=False, validate_by_id=True)
@@ -127,7 +220,16 @@ class PurchaseSerializer(ChangeFieldsInDeepSerializersMixin, DynamicFieldsSerial
 
     @staticmethod
     def create(validated_data: dict[str, Any]) -> Purchase:
-        purchase = Purchase.objects.create(user=validated_data['user'])
-        for product, price in validated_data['productpurchase_set']:
-            ProductPurchase.objects.create(purchase=purchase, product=product, price=price)
+        with transaction.atomic():
+            purchase = Purchase.objects.create(user=validated_data['user'])
+            products_purchase = ProductPurchase.objects.bulk_create(
+                ProductPurchase(purchase=purchase, product=product, price=price)
+                for product, price in validated_data['productpurchase_set']
+            )
+            UserBalance.objects.change_spent(purchase.user_id,
+                                             sum(price for _, price in validated_data['productpurchase_set']))
+            bump_user_purchases_version(validated_data['user'])
+        # Покупки товаров уже загружены, поэтому при сериализации ответа они не запрашиваются повторно.
+        # Порядок обратный, как в Meta.ordering модели ProductPurchase
+        setattr(purchase, '_prefetched_objects_cache', {'productpurchase_set': products_purchase[::-1]})
         return purchase
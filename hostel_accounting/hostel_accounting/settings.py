@@ -33,6 +33,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'hostel_accounting.identity_map.identity_map_middleware',
 
     'debug_toolbar.middleware.DebugToolbarMiddleware'
 ]
@@ -99,6 +100,34 @@ SPECTACULAR_SETTINGS = {
     'REDOC_DIST': 'SIDECAR'
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'purchases': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'purchases',
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        }
+    }
+}
+
+PURCHASES_CACHE_ALIAS = 'purchases'
+
+# Как часто кэши в памяти процесса (справочники, индекс названий товаров) сверяют версию данных с базой данных
+DATA_VERSION_CHECK_INTERVAL = 1
+
+IDEMPOTENCY_KEY_TIMEOUT = int(os.getenv('IDEMPOTENCY_KEY_TIMEOUT', 24 * 60 * 60))
+
+# Сколько секунд незавершенный запрос держит ключ Idempotency-Key, прежде чем его можно занять снова
+IDEMPOTENCY_KEY_LEASE = int(os.getenv('IDEMPOTENCY_KEY_LEASE', 60))
+
+# Наибольшее количество хранимых ключей Idempotency-Key и как часто каждый процесс удаляет устаревшие ключи
+IDEMPOTENCY_KEYS_MAX_COUNT = int(os.getenv('IDEMPOTENCY_KEYS_MAX_COUNT', 100000))
+IDEMPOTENCY_KEYS_PURGE_INTERVAL = int(os.getenv('IDEMPOTENCY_KEYS_PURGE_INTERVAL', 60))
+
 LANGUAGE_CODE = 'ru'
 
 TIME_ZONE = 'UTC'
@@ -112,3 +141,25 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'accounts.User'
+
+GROUP_PURCHASES_CHUNK_SIZE = 2000
+
+# Сборка JSON покупок группы в PostgreSQL через json_agg вместо Python (на других СУБД JSON всегда собирается
+# в Python). Включается явно после прогона GroupsPurchasesJsonAggTest на PostgreSQL
+GROUP_PURCHASES_JSON_AGG = False
+
+PURCHASES_IMPORT_CHUNK_SIZE = 1000
+
+PURCHASES_EXPORT_CHUNK_SIZE = 2000
+
+SERIALIZER_FIELD_PLANS_CACHE_SIZE = 256
+
+# Начиная с этого количества записей по оценке планировщика PostgreSQL пагинация не считает записи точно
+PAGINATION_ESTIMATED_COUNT_THRESHOLD = 100000
+
+# Во сколько раз оценка должна превышать PAGINATION_ESTIMATED_COUNT_THRESHOLD, чтобы ей доверять: оценки
+# планировщика для запросов с фильтрами бывают завышены, а точный подсчет небольшого запроса дешев
+PAGINATION_ESTIMATED_COUNT_SAFETY_FACTOR = 10
+
+# Максимальное количество товаров в ответе поиска товаров по началу названия
+PRODUCTS_AUTOCOMPLETE_MAX_LIMIT = 50
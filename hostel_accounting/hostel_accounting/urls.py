@@ -6,6 +6,8 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/goods-accounting/', include('goods_accounting.api.urls')),
     path('api/accounts/', include('accounts.api.urls')),
+    path('api/async/goods-accounting/', include('goods_accounting.api.async_urls')),
+    path('api/async/accounts/', include('accounts.api.async_urls')),
 
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     path('api/docs/', SpectacularRedocView.as_view(), name='docs')
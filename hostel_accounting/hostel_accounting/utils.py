@@ -1,13 +1,27 @@
-from typing import Any, Optional, Iterable, Sequence, Type
-
-from django.db.models import Model
+from functools import lru_cache
+from typing import Any, Callable, Literal, Mapping, Optional, Iterable, Sequence, Type, TypeVar, TYPE_CHECKING, \
+    overload
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Model, QuerySet
+from django.http import Http404
 from rest_framework import status
-from rest_framework.exceptions import ValidationError
+from rest_framework.exceptions import NotAuthenticated, ValidationError
 from rest_framework.fields import Field
-from rest_framework.generics import GenericAPIView
+from rest_framework.generics import GenericAPIView, get_object_or_404
 from rest_framework.request import Request
 from rest_framework.response import Response
-from rest_framework.serializers import ListSerializer, Serializer
+from rest_framework.serializers import BaseSerializer, ListSerializer, Serializer
+
+from hostel_accounting.identity_map import get_identity_map, register_referenced_ids
+from hostel_accounting.paginations import get_list_pagination
+from hostel_accounting.querysets import get_values_renderer, optimize_queryset
+from hostel_accounting.reference_cache import ReferenceCache, get_reference_cache
+
+if TYPE_CHECKING:
+    from accounts.models import User
 
 
 class StrMethodMixin:
@@ -49,8 +63,11 @@ class GetObjectByIdFromRequestSerializerMixin:
         if type(data) is not int:
             raise ValidationError('Поле должно быть integer')
 
-    def get_obj(self, pk: int) -> Model:
-        return get_obj_by_pk(self.Meta.model, pk)
+    def get_obj(self, data: Any) -> Any:
+        """Метод, возвращающий значение поля по данным, проверенным val: по умолчанию объект с id data"""
+
+        register_referenced_ids(self, self.Meta.model)
+        return get_obj_by_pk(self.Meta.model, data, self)
 
     def to_internal_value(self, data: Any) -> Model:
         if not self.validate_by_id:
@@ -97,25 +114,163 @@ def get_all_fields_from_request(request: Request, fields_params: Iterable = ('fi
     return {param: get_fields_from_request(param) for param in fields_params}
 
 
+def normalize_fields_params(fields_params: Mapping[str, Optional[Iterable[str]]]) -> tuple:
+    """Функция, приводящая требуемые поля к хешируемому виду, не зависящему от порядка и повторов полей"""
+
+    return tuple(sorted((param, None if fields is None else tuple(sorted(set(fields))))
+                        for param, fields in fields_params.items()))
+
+
+def build_nested_fields(serializer: Field) -> None:
+    """Функция, заранее создающая поля сериализатора на всех уровнях вложенности"""
+
+    if isinstance(serializer, ListSerializer):
+        serializer = serializer.child
+    if isinstance(serializer, Serializer):
+        for field in serializer.fields.values():
+            build_nested_fields(field)
+
+
+SerializerT = TypeVar('SerializerT', bound=BaseSerializer)
+
+# Ключ плана полей: класс сериализатора, требуемые поля, приведенные normalize_fields_params, и many
+FieldPlanKey = tuple[Type[BaseSerializer], tuple, bool]
+
+
+@lru_cache(maxsize=settings.SERIALIZER_FIELD_PLANS_CACHE_SIZE)
+def compile_field_plan(key: FieldPlanKey) -> BaseSerializer:
+    """
+    Функция, возвращающая план полей: сериализатор, из которого на всех уровнях вложенности уже удалены
+    ненужные поля. План используется только для чтения и разделяется между запросами, поэтому поля
+    создаются и удаляются один раз для каждого сочетания класса сериализатора и требуемых полей
+    """
+
+    serializer_class, fields_params, many = key
+    serializer = serializer_class(many=many, **dict(fields_params))
+    build_nested_fields(serializer)
+    return serializer
+
+
+@overload
+def get_field_plan(serializer_class: Type[SerializerT], fields_params: Optional[Mapping[str, Any]] = None,
+                   many: Literal[False] = False) -> SerializerT:
+    ...
+
+
+@overload
+def get_field_plan(serializer_class: Type[BaseSerializer], fields_params: Optional[Mapping[str, Any]] = None,
+                   many: bool = False) -> BaseSerializer:
+    ...
+
+
+def get_field_plan(serializer_class: Type[BaseSerializer], fields_params: Optional[Mapping[str, Any]] = None,
+                   many: bool = False) -> BaseSerializer:
+    """
+    Функция, возвращающая план полей сериализатора для требуемых полей: экземпляр serializer_class
+    или, если many, ListSerializer с ним
+    """
+
+    return compile_field_plan((serializer_class, normalize_fields_params(fields_params or {}), many))
+
+
+def render_with_field_plan(serializer_class: Type[BaseSerializer], instance: Any,
+                           fields_params: Optional[Mapping[str, Any]] = None, many: bool = False) -> Any:
+    """Функция, сериализующая объект или список объектов по плану полей"""
+
+    return get_field_plan(serializer_class, fields_params, many).to_representation(instance)
+
+
+def get_authenticated_user(request: Request) -> 'User':
+    """Функция, возвращающая пользователя запроса, прошедшего проверку IsAuthenticated"""
+
+    user = request.user
+    if isinstance(user, AnonymousUser):
+        raise NotAuthenticated()
+    return user
+
+
+def get_bool_from_request(request: Request, param: str) -> bool:
+    """Функция возвращает значение логического параметра запроса"""
+
+    return request.query_params.get(param, '').lower() in ('1', 'true', 'yes')
+
+
+def get_list_queryset_and_renderer(view: GenericAPIView, queryset: QuerySet,
+                                   field_plan: BaseSerializer) -> tuple[QuerySet, Callable[[Iterable], list]]:
+    """
+    Функция, возвращающая запрос списка объектов и функцию, строящую его представление. Для представлений
+    с render_from_values = True представление строится из строк values(), если план полей это позволяет,
+    иначе - сериализатором по запросу, ограниченному требуемыми полями
+    """
+
+    if getattr(view, 'render_from_values', False) and isinstance(field_plan, ListSerializer):
+        values_renderer = get_values_renderer(field_plan.child)
+        if values_renderer is not None:
+            return values_renderer.get_values(queryset), values_renderer.render
+    return optimize_queryset(queryset, field_plan), field_plan.to_representation
+
+
+def get_view_reference_cache(view: GenericAPIView) -> Optional[ReferenceCache]:
+    """Функция, возвращающая кэш справочной модели представления с use_reference_cache = True"""
+
+    if not getattr(view, 'use_reference_cache', False):
+        return None
+    return get_reference_cache(view.queryset.model)
+
+
+def get_reference_object_or_404(reference_cache: ReferenceCache, pk: Any) -> Model:
+    """Функция, возвращающая объект из кэша справочной модели или вызывающая Http404"""
+
+    try:
+        pk = reference_cache.model._meta.pk.to_python(pk)
+    except DjangoValidationError:
+        raise Http404
+    obj = reference_cache.in_bulk([pk]).get(pk)
+    if obj is None:
+        raise Http404
+    return obj
+
+
 def get_default_retrieve_response(request: Request, view: GenericAPIView,
                                   fields_params: Iterable = ('fields',)) -> Response:
-    """Функция возвращает стандартный для большинства представлений retrieve ответ"""
+    """
+    Функция возвращает стандартный для большинства представлений retrieve ответ. Из базы данных
+    загружаются только столбцы и связи, которые нужны для требуемых полей. Представления
+    с use_reference_cache = True берут объект и его готовое представление из кэша справочной модели
+    """
 
-    fields_params = get_all_fields_from_request(request, fields_params)
-    serializer = view.serializer_class(view.get_object(), **fields_params)
-    return Response(serializer.data)
+    requested_fields = get_all_fields_from_request(request, fields_params)
+    field_plan = get_field_plan(view.get_serializer_class(), requested_fields)
+    lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+    reference_cache = get_view_reference_cache(view)
+    if reference_cache is not None and view.lookup_field == 'pk':
+        obj = get_reference_object_or_404(reference_cache, view.kwargs[lookup_url_kwarg])
+        view.check_object_permissions(request, obj)
+        return Response(reference_cache.render(normalize_fields_params(requested_fields), field_plan, obj))
+
+    queryset = optimize_queryset(view.filter_queryset(view.get_queryset()), field_plan)
+    obj = get_object_or_404(queryset, **{view.lookup_field: view.kwargs[lookup_url_kwarg]})
+    view.check_object_permissions(request, obj)
+    return Response(field_plan.to_representation(obj))
 
 
 def get_default_list_response_with_pagination(request: Request, view: GenericAPIView,
                                               fields_params: Iterable = ('fields',)) -> Response:
-    """Функция возвращает стандартный для большинства представлений list ответ с пагинацией"""
+    """
+    Функция возвращает стандартный для большинства представлений list ответ с пагинацией. Из базы данных
+    загружаются только столбцы и связи, которые нужны для требуемых полей. Параметр pagination=cursor
+    включает пагинацию по ключу, если она есть у представления. Пустая страница означает пустой список,
+    поэтому отдельный запрос на проверку наличия записей не нужен
+    """
 
-    if not view.queryset:
+    field_plan = get_field_plan(view.get_serializer_class(), get_all_fields_from_request(request, fields_params),
+                                many=True)
+    queryset, render = get_list_queryset_and_renderer(view, view.queryset, field_plan)
+    pagination = get_list_pagination(request, view)
+    page = pagination.paginate_queryset(queryset, request, view=view)
+    if not page:
         return Response(status=status.HTTP_404_NOT_FOUND)
-    fields_params = get_all_fields_from_request(request, fields_params)
-    page = view.paginate_queryset(view.queryset)
-    serializer = view.serializer_class(page, many=True, **fields_params)
-    return view.get_paginated_response(serializer.data)
+    return pagination.get_paginated_response(render(page))
 
 
 def get_field_handler(field_name: str, main_serializer: Serializer) -> Optional[Field | Serializer]:
@@ -150,10 +305,10 @@ def change_fields_in_depth_serializer(serializer_fields: Sequence, required_fiel
     change_fields_in_serializer(serializer_fields[-1], required_fields, main_serializer)
 
 
-def get_obj_by_pk(m: Type[Model], pk: int) -> Model:
-    """Функция, возвращающая объект, если он существует"""
+def get_obj_by_pk(m: Type[Model], pk: int, serializer: Optional[Field] = None) -> Model:
+    """Функция, возвращающая объект из карты объектов запроса, если он существует"""
 
-    obj = m.objects.filter(pk=pk)
-    if not obj.exists():
+    obj = get_identity_map(serializer).get(get_reference_cache(m) or m._default_manager.all(), pk)
+    if obj is None:
         raise ValidationError('Такой объект не существует')
-    return obj[0]
+    return obj
@@ -0,0 +1,122 @@
+"""
+Тестовый набор, проверяющий количество запросов к базе данных для каждого маршрута API. Данные
+заполняются при нескольких размерах, и для каждого маршрута и метода количество запросов должно
+укладываться в бюджет и не зависеть от размера данных
+"""
+
+from abc import ABC, abstractmethod
+from typing import Any, Callable, NamedTuple, Optional
+
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, reverse
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+
+from hostel_accounting.caching import checked_versions
+from hostel_accounting.reference_cache import invalidate_reference_caches
+
+# Служебные методы, для которых бюджет не задается
+IGNORED_METHODS = ('options', 'head')
+
+
+class QueryBudget(NamedTuple):
+    """
+    Бюджет запросов маршрута для одного метода. data - функция, возвращающая тело запроса по заполненным
+    данным, user - имя пользователя из данных, от которого выполняется запрос, status - ожидаемый код ответа
+    """
+
+    queries: int
+    data: Optional[Callable[[dict[str, Any]], Any]] = None
+    format: str = 'json'
+    user: str = 'admin'
+    status: int = 200
+
+
+def get_routes(urlpatterns: list) -> list[tuple[str, str, URLPattern]]:
+    """Функция, возвращающая пары (имя маршрута, метод) всех маршрутов urlpatterns с их шаблонами"""
+
+    routes = []
+    for pattern in urlpatterns:
+        if isinstance(pattern, URLResolver):
+            routes.extend(get_routes(pattern.url_patterns))
+            continue
+        callback = pattern.callback
+        actions = getattr(callback, 'actions', None)
+        if actions is not None:
+            methods = list(actions)
+        else:
+            view_class = callback.view_class
+            methods = [method for method in view_class.http_method_names if hasattr(view_class, method)]
+        routes.extend((pattern.name, method, pattern) for method in methods if method not in IGNORED_METHODS)
+    return routes
+
+
+class QueryBudgetMixin(ABC):
+    """
+    Примесь к django.test.TestCase для тестов бюджетов запросов. Тест задает urlpatterns, budgets с бюджетами
+    по маршрутам и методам, sizes с размерами данных и метод seed, заполняющий данные заданного размера
+    и возвращающий объекты по именам. Объект для маршрутов с pk берется по имени маршрута до первого дефиса
+    """
+
+    urlpatterns: list = []
+    budgets: dict[str, dict[str, QueryBudget]] = {}
+    sizes: tuple[int, ...] = (2, 8)
+
+    @abstractmethod
+    def seed(self, size: int) -> dict[str, Any]:
+        """Метод заполняет данные размера size и возвращает объекты по именам"""
+
+    def get_path(self, name: str, pattern: URLPattern, objects: dict[str, Any]) -> str:
+        kwargs = {}
+        if 'pk' in pattern.pattern.regex.groupindex:
+            kwargs['pk'] = objects[name.split('-')[0]].pk
+        return reverse(name, kwargs=kwargs)
+
+    def request(self, name: str, method: str, pattern: URLPattern, budget: QueryBudget,
+                objects: dict[str, Any]) -> tuple[int, Response]:
+        """Метод выполняет запрос к маршруту и возвращает количество запросов к базе данных и ответ"""
+
+        for cache in caches.all():
+            cache.clear()
+        checked_versions.clear()
+        invalidate_reference_caches()
+        client = APIClient()
+        client.force_authenticate(objects[budget.user])
+        path = self.get_path(name, pattern, objects)
+        data = None if budget.data is None else budget.data(objects)
+        with CaptureQueriesContext(connection) as context:
+            response = getattr(client, method)(path, data, format=budget.format)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        queries = [query['sql'] for query in context.captured_queries
+                   if not query['sql'].startswith(('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT'))]
+        return len(queries), response
+
+    def test_query_budgets(self) -> None:
+        routes = get_routes(self.urlpatterns)
+        missing = [f'{name} {method}' for name, method, _ in routes if method not in self.budgets.get(name, {})]
+        self.assertEqual([], missing, 'У маршрутов нет бюджетов запросов')
+
+        counts: dict[tuple[str, str], list[int]] = {(name, method): [] for name, method, _ in routes}
+        for size in self.sizes:
+            with transaction.atomic():
+                objects = self.seed(size)
+                for name, method, pattern in routes:
+                    budget = self.budgets[name][method]
+                    with transaction.atomic():
+                        queries, response = self.request(name, method, pattern, budget, objects)
+                        transaction.set_rollback(True)
+                    self.assertEqual(budget.status, response.status_code,
+                                     f'{name} {method}: {getattr(response, "data", None)}')
+                    counts[name, method].append(queries)
+                transaction.set_rollback(True)
+
+        for (name, method), route_counts in counts.items():
+            budget = self.budgets[name][method].queries
+            with self.subTest(route=name, method=method):
+                self.assertLessEqual(max(route_counts), budget,
+                                     f'Запросов больше бюджета при размерах {self.sizes}: {route_counts}')
+                self.assertEqual(len(set(route_counts)), 1,
+                                 f'Запросов становится больше с ростом данных {self.sizes}: {route_counts}')
@@ -0,0 +1,107 @@
+import json
+
+import django.test
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import User, RoommatesGroup
+from goods_accounting.models import ProductCategory, Product, Purchase, ProductPurchase
+
+
+class AsyncViewsTest(django.test.TestCase):
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.admin = User.objects.create(username="admin", email="admin@mail.com", is_staff=True)
+        group = RoommatesGroup.objects.create(name="group")
+        cls.user = User.objects.create(username="user", email="user@mail.com", roommates_group=group)
+        cls.stranger = User.objects.create(username="stranger", email="stranger@mail.com")
+        category = ProductCategory.objects.create(name="category")
+        products = [Product.objects.create(name=f"product{i}", category=category) for i in range(3)]
+        for user in (cls.admin, cls.user, cls.user, cls.stranger):
+            purchase = Purchase.objects.create(user=user)
+            for product in products:
+                ProductPurchase.objects.create(purchase=purchase, product=product, price=product.pk)
+
+    def setUp(self) -> None:
+        caches["purchases"].clear()
+
+    def get_headers(self, user: User) -> dict[str, str]:
+        return {"authorization": f"Bearer {AccessToken.for_user(user)}"}
+
+    def get_sync_response(self, user: User, url: str) -> Response:
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+        return client.get(url)
+
+    def get_sync_response_json(self, user: User, url: str) -> dict:
+        return self.get_sync_response(user, url).json()
+
+    async def assert_same_responses(self, user: User, sync_url: str, async_url: str) -> None:
+        response = await self.async_client.get(async_url, **self.get_headers(user))
+        expected = await sync_to_async(self.get_sync_response_json)(user, sync_url)
+        self.assertEqual(200, response.status_code)
+        # ссылки пагинации отличаются только префиксом пути
+        self.assertEqual(expected, json.loads(response.content.decode().replace("/api/async/", "/api/")))
+
+    async def test_product_list_equals_sync_view(self) -> None:
+        for query in ("", "?page_size=2&page=2", "?fields=id,category&category_fields=name",
+                      "?pagination=cursor&page_size=2"):
+            await self.assert_same_responses(self.user, f"/api/goods-accounting/products/{query}",
+                                             f"/api/async/goods-accounting/products/{query}")
+
+    async def test_purchases_equal_sync_views(self) -> None:
+        for query in ("", "?page_size=1&page=3", "?fields=id,products&product_fields=name,price",
+                      "?pagination=cursor&page_size=1"):
+            await self.assert_same_responses(self.admin, f"/api/goods-accounting/purchases/{query}",
+                                             f"/api/async/goods-accounting/purchases/{query}")
+        purchase = await Purchase.objects.afirst()
+        await self.assert_same_responses(self.admin, f"/api/goods-accounting/purchases/{purchase.pk}/",
+                                         f"/api/async/goods-accounting/purchases/{purchase.pk}/")
+        # Разрешения на объект проверяются и тогда, когда пользователь покупки не входит в требуемые поля
+        purchase = await Purchase.objects.filter(user=self.user).afirst()
+        await self.assert_same_responses(self.user, f"/api/goods-accounting/purchases/{purchase.pk}/?fields=id",
+                                         f"/api/async/goods-accounting/purchases/{purchase.pk}/?fields=id")
+
+    async def test_cursor_pages_equal_sync_view(self) -> None:
+        url = "/api/async/goods-accounting/purchases/?pagination=cursor&page_size=3"
+        response = await self.async_client.get(url, **self.get_headers(self.admin))
+        next_url = response.json()["next"]
+        self.assertIsNotNone(next_url)
+        next_url = next_url.replace("http://testserver", "")
+        await self.assert_same_responses(self.admin, next_url.replace("/api/async/", "/api/"), next_url)
+
+    async def test_group_purchases_equal_sync_view(self) -> None:
+        query = "?user_fields=id,username&product_category_fields=name"
+        await self.assert_same_responses(self.user, f"/api/accounts/roommates-groups/purchases/{query}",
+                                         f"/api/async/accounts/roommates-groups/purchases/{query}")
+        response = await self.async_client.get("/api/async/accounts/roommates-groups/purchases/",
+                                               **self.get_headers(self.user))
+        response = await self.async_client.get("/api/async/accounts/roommates-groups/purchases/",
+                                               if_none_match=response["ETag"], **self.get_headers(self.user))
+        self.assertEqual(304, response.status_code)
+
+    async def test_purchases_are_limited_to_users_group(self) -> None:
+        response = await self.async_client.get("/api/async/goods-accounting/purchases/",
+                                                **self.get_headers(self.user))
+        self.assertEqual(2, response.json()["count"])
+        stranger_purchase = await Purchase.objects.filter(user=self.stranger).afirst()
+        response = await self.async_client.get(f"/api/async/goods-accounting/purchases/{stranger_purchase.pk}/",
+                                               **self.get_headers(self.user))
+        sync_response = await sync_to_async(self.get_sync_response)(
+            self.user, f"/api/goods-accounting/purchases/{stranger_purchase.pk}/")
+        self.assertEqual(sync_response.status_code, response.status_code)
+
+    async def test_authentication_and_permissions(self) -> None:
+        response = await self.async_client.get("/api/async/goods-accounting/products/")
+        self.assertEqual(401, response.status_code)
+        self.assertEqual('Bearer realm="api"', response["WWW-Authenticate"])
+        response = await self.async_client.get("/api/async/accounts/roommates-groups/purchases/",
+                                               **self.get_headers(self.stranger))
+        self.assertEqual(403, response.status_code)
+        response = await self.async_client.post("/api/async/goods-accounting/products/",
+                                                **self.get_headers(self.user))
+        self.assertEqual(405, response.status_code)
@@ -0,0 +1,289 @@
+import json
+import tempfile
+import unittest
+from datetime import datetime, timezone
+
+import django.test
+from django.core.cache import caches
+from django.db import connection
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from accounts.models import User, RoommatesGroup, PurchasesFilter
+from accounts.raw_sql_queries import get_json_object_sql, group_purchases_json_columns, \
+    group_purchases_keys_query_template
+from accounts.utils import aggregate_raw_groups_purchases, get_fields_tree
+from goods_accounting.models import ProductCategory, Product, Purchase, ProductPurchase
+from hostel_accounting.serializers import AllGroupsPurchasesSerializer
+from hostel_accounting.utils import get_field_plan
+
+
+class AggregateRawGroupsPurchasesTest(unittest.TestCase):
+
+    @staticmethod
+    def get_row(user_id: int, product_id: int, category_id: int, price: int) -> tuple:
+        return (0, user_id, f"user{user_id}", "", "", "", False, False, None, None,
+                product_id, f"product{product_id}", category_id, f"category{category_id}", price)
+
+    def test_rows_are_grouped_by_users_in_order_of_appearance(self) -> None:
+        rows = [self.get_row(2, 1, 1, 10), self.get_row(1, 1, 1, 20), self.get_row(2, 2, 1, 30)]
+        result = aggregate_raw_groups_purchases(rows)
+        self.assertEqual([2, 1], [user_purchases.user.id for user_purchases in result])
+        self.assertEqual([10, 30], [product_purchase.price for product_purchase in result[0].products])
+
+    def test_same_products_and_categories_share_records(self) -> None:
+        rows = [self.get_row(1, 1, 1, 10), self.get_row(2, 1, 1, 20), self.get_row(2, 2, 1, 30)]
+        first, second = aggregate_raw_groups_purchases(rows)
+        self.assertIs(first.products[0].product, second.products[0].product)
+        self.assertIs(first.products[0].product.category, second.products[1].product.category)
+
+
+class GroupsPurchasesJsonQueryTest(unittest.TestCase):
+
+    def test_fields_tree_follows_field_plan(self) -> None:
+        fields_params = {"fields": None, "roommates_group_fields": ["name"], "user_fields": ["id"],
+                         "product_fields": ["price", "category"], "product_category_fields": [""]}
+        tree = get_fields_tree(get_field_plan(AllGroupsPurchasesSerializer, fields_params))
+        expected_tree = {"roommates_group": {"name": None},
+                         "users_purchases": {"user": {"id": None}, "products": {"price": None, "category": {}}}}
+        self.assertEqual(expected_tree, tree)
+
+    def test_json_object_sql(self) -> None:
+        fields = {"roommates_group": {"name": None}, "users_purchases": {"products": {"price": None}}}
+        sql = get_json_object_sql(fields, group_purchases_json_columns, " AND 1 = 1", ("next_cursor",))
+        self.assertTrue(sql.startswith("json_build_object('roommates_group', json_build_object('name', "
+                                       "roommates_group.name), 'users_purchases', COALESCE(("))
+        self.assertIn("json_agg(json_build_object('price', product_purchase.price) ORDER BY product_purchase.id)", sql)
+        self.assertIn("WHERE u.roommates_group_id = roommates_group.id AND 1 = 1", sql)
+        self.assertTrue(sql.endswith(", 'next_cursor', %s::json)"))
+
+    def test_unknown_field_has_no_sql(self) -> None:
+        with self.assertRaises(KeyError):
+            get_json_object_sql({"roommates_group": {"users": None}}, group_purchases_json_columns)
+
+
+class GroupsPurchasesTest(django.test.TestCase):
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        group = RoommatesGroup.objects.create(name="group")
+        cls.category = category = ProductCategory.objects.create(name="category")
+        product = Product.objects.create(name="product", category=category)
+        for i in range(3):
+            cls.user = User.objects.create(username=f"user{i}", email=f"user{i}@mail.com", roommates_group=group)
+            purchase = Purchase.objects.create(user=cls.user)
+            Purchase.objects.filter(pk=purchase.pk).update(datetime=datetime(2022, 12, i + 1, tzinfo=timezone.utc))
+            for price in (10 * i, 10 * i + 1):
+                ProductPurchase.objects.create(purchase=purchase, product=product, price=price)
+
+    def setUp(self) -> None:
+        caches["purchases"].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_streamed_json(self, query: str) -> dict:
+        response = self.client.get(f"/api/accounts/roommates-groups/purchases/?stream=true{query}")
+        return json.loads(b"".join(response.streaming_content))
+
+    def test_stream_equals_default_response(self) -> None:
+        for query in ("", "&fields=users_purchases&user_fields=id&product_fields=price", "&fields=roommates_group"):
+            expected = self.client.get(f"/api/accounts/roommates-groups/purchases/?{query}").json()
+            self.assertEqual(expected, self.get_streamed_json(query))
+
+    def test_stream_groups_rows_by_users(self) -> None:
+        result = self.get_streamed_json("&user_fields=username&product_fields=price")
+        expected = [{"user": {"username": f"user{i}"}, "products": [{"price": 10 * i}, {"price": 10 * i + 1}]}
+                    for i in range(3)]
+        self.assertEqual(expected, result["users_purchases"])
+
+    def get_usernames(self, response: dict) -> list[str]:
+        return [user_purchases["user"]["username"] for user_purchases in response["users_purchases"]]
+
+    def test_since_and_until(self) -> None:
+        response = self.client.get("/api/accounts/roommates-groups/purchases/?since=2022-12-02&until=2022-12-03")
+        self.assertEqual(["user1"], self.get_usernames(response.json()))
+
+    def test_cursor_pagination_walks_from_newest_to_oldest(self) -> None:
+        usernames, query = [], "page_size=2"
+        while True:
+            response = self.client.get(f"/api/accounts/roommates-groups/purchases/?{query}").json()
+            usernames.append(self.get_usernames(response))
+            if response["next_cursor"] is None:
+                break
+            query = f"page_size=2&cursor={response['next_cursor']}"
+        self.assertEqual([["user1", "user2"], ["user0"]], usernames)
+
+    def test_stream_with_pagination(self) -> None:
+        expected = self.client.get("/api/accounts/roommates-groups/purchases/?page_size=2").json()
+        self.assertEqual(expected, self.get_streamed_json("&page_size=2"))
+
+    def test_invalid_cursor(self) -> None:
+        response = self.client.get("/api/accounts/roommates-groups/purchases/?cursor=invalid")
+        self.assertEqual(404, response.status_code)
+
+    def test_spending(self) -> None:
+        response = self.client.get("/api/accounts/roommates-groups/spending/?user_fields=username&fields=users_spending"
+                                   "&product_category_fields=name")
+        expected = [{"user": {"username": f"user{i}"}, "total": 20 * i + 1, "count": 2,
+                     "categories": [{"category": {"name": "category"}, "total": 20 * i + 1, "count": 2}]}
+                    for i in range(3)]
+        self.assertEqual({"users_spending": expected}, response.json())
+
+    def test_spending_with_period(self) -> None:
+        response = self.client.get("/api/accounts/roommates-groups/spending/?since=2022-12-03&user_fields=username"
+                                   "&fields=users_spending")
+        expected = [{"user": {"username": f"user{i}"}, "total": 0, "count": 0, "categories": []} for i in range(2)]
+        expected.append({"user": {"username": "user2"}, "total": 41, "count": 2,
+                         "categories": [{"category": {"id": self.category.pk, "name": "category"}, "total": 41,
+                                         "count": 2}]})
+        self.assertEqual({"users_spending": expected}, response.json())
+
+    def test_spending_requires_group(self) -> None:
+        response = APIClient().get("/api/accounts/roommates-groups/spending/")
+        self.assertEqual(401, response.status_code)
+        loner = User.objects.create(username="loner", email="loner@mail.com")
+        self.client.force_authenticate(loner)
+        response = self.client.get("/api/accounts/roommates-groups/spending/")
+        self.assertEqual(403, response.status_code)
+
+    def test_spending_includes_members_without_purchases(self) -> None:
+        User.objects.create(username="user3", email="user3@mail.com", roommates_group=self.user.roommates_group)
+        response = self.client.get("/api/accounts/roommates-groups/spending/?user_fields=username")
+        users_spending = response.json()["users_spending"]
+        self.assertEqual([f"user{i}" for i in range(4)], [spending["user"]["username"] for spending in users_spending])
+        self.assertEqual({"user": {"username": "user3"}, "total": 0, "count": 0, "categories": []}, users_spending[-1])
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "JSON собирается в базе данных только в PostgreSQL")
+class GroupsPurchasesJsonAggTest(django.test.TestCase):
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        group = RoommatesGroup.objects.create(name="группа")
+        categories = [ProductCategory.objects.create(name=f"категория \"{i}\"") for i in range(2)]
+        products = [Product.objects.create(name=f"product{i}", category=categories[i % 2]) for i in range(3)]
+        for i in range(3):
+            cls.user = User.objects.create(username=f"user{i}", email=f"user{i}@mail.com", roommates_group=group,
+                                           last_login=datetime(2022, 12, 1, 12, 0, i, i * 1000, tzinfo=timezone.utc))
+            purchase = Purchase.objects.create(user=cls.user)
+            Purchase.objects.filter(pk=purchase.pk).update(datetime=datetime(2022, 12, i + 1, tzinfo=timezone.utc))
+            for product in products[i:]:
+                ProductPurchase.objects.create(purchase=purchase, product=product, price=product.pk * 10)
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_json(self, query: str) -> dict:
+        caches["purchases"].clear()
+        return self.client.get(f"/api/accounts/roommates-groups/purchases/{query}").json()
+
+    def test_json_agg_equals_python_engine(self) -> None:
+        for query in ("", "?fields=users_purchases&user_fields=id,date_joined,last_login&product_fields=price",
+                      "?fields=roommates_group&roommates_group_fields=created_at", "?product_category_fields=",
+                      "?since=2022-12-02T00:00:00Z", "?page_size=2", "?since=2030-01-01T00:00:00Z"):
+            with self.subTest(query=query):
+                expected = self.get_json(query)
+                with override_settings(GROUP_PURCHASES_JSON_AGG=True):
+                    self.assertEqual(expected, self.get_json(query))
+
+
+@unittest.skipUnless(connection.vendor == "postgresql", "Запрос ключей через LATERAL выполняется только в PostgreSQL")
+class GroupPurchasesKeysTest(django.test.TestCase):
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.group = RoommatesGroup.objects.create(name="group")
+        for i in range(3):
+            user = User.objects.create(username=f"user{i}", email=f"user{i}@mail.com", roommates_group=cls.group)
+            for day in range(1, 5):
+                purchase = Purchase.objects.create(user=user)
+                Purchase.objects.filter(pk=purchase.pk).update(
+                    datetime=datetime(2022, 12, day + i % 2, tzinfo=timezone.utc))
+
+    def get_sorted_history_keys(self, purchases_filter: PurchasesFilter, limit: int) -> list:
+        conditions, params = purchases_filter.get_conditions()
+        with connection.cursor() as cursor:
+            cursor.execute(group_purchases_keys_query_template.format(conditions=conditions),
+                           (self.group.pk, *params, limit))
+            return cursor.fetchall()
+
+    def test_seek_from_cursor_equals_sorted_history(self) -> None:
+        keys = self.get_sorted_history_keys(PurchasesFilter(), 100)
+        for purchases_filter in (PurchasesFilter(), PurchasesFilter(before_key=keys[4]), PurchasesFilter(
+                since=datetime(2022, 12, 2, tzinfo=timezone.utc), before_key=keys[2])):
+            for limit in (1, 5, 100):
+                with self.subTest(purchases_filter=purchases_filter, limit=limit):
+                    self.assertEqual(self.get_sorted_history_keys(purchases_filter, limit),
+                                     RoommatesGroup.objects.get_purchases_keys(self.group, purchases_filter, limit))
+
+
+class GroupsPurchasesCacheTest(django.test.TestCase):
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cache_dir = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(cache_dir.cleanup)
+        settings_override = override_settings(CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            "purchases": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+                          "LOCATION": cache_dir.name, "OPTIONS": {"MAX_ENTRIES": 10}}})
+        settings_override.enable()
+        cls.addClassCleanup(settings_override.disable)
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        group = RoommatesGroup.objects.create(name="group")
+        cls.user = User.objects.create(username="user", email="user@mail.com", roommates_group=group)
+        category = ProductCategory.objects.create(name="category")
+        cls.product = Product.objects.create(name="product", category=category)
+
+    def setUp(self) -> None:
+        caches["purchases"].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_prices(self) -> list[int]:
+        response = self.client.get("/api/accounts/roommates-groups/purchases/?product_fields=price")
+        users_purchases = response.json()["users_purchases"]
+        return [product["price"] for user_purchases in users_purchases for product in user_purchases["products"]]
+
+    def test_response_is_cached(self) -> None:
+        self.get_prices()
+        # только версии данных
+        with self.assertNumQueries(1):
+            self.get_prices()
+
+    def test_purchase_creation_invalidates_cache(self) -> None:
+        self.assertEqual([], self.get_prices())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/goods-accounting/purchases/",
+                             {"products": [{"product": self.product.pk, "price": 10}]}, format="json")
+        self.assertEqual([10], self.get_prices())
+
+    def test_product_change_invalidates_cache(self) -> None:
+        self.get_prices()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.save()
+        with self.assertNumQueries(3):
+            self.get_prices()
+
+    def test_matching_etag_returns_not_modified(self) -> None:
+        etag = self.client.get("/api/accounts/roommates-groups/purchases/")["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/accounts/roommates-groups/purchases/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/api/goods-accounting/purchases/",
+                             {"products": [{"product": self.product.pk, "price": 10}]}, format="json")
+        response = self.client.get("/api/accounts/roommates-groups/purchases/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+
+    def test_etag_does_not_depend_on_process_caches(self) -> None:
+        etag = self.client.get("/api/accounts/roommates-groups/purchases/")["ETag"]
+        # другой процесс с пустым кэшем ответов
+        caches["purchases"].clear()
+        response = self.client.get("/api/accounts/roommates-groups/purchases/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
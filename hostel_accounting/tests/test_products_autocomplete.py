@@ -0,0 +1,70 @@
+import django.test
+from django.db.models import F
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from goods_accounting.models import DataVersion, ProductCategory, Product
+from hostel_accounting.caching import CATALOG_SCOPE, checked_versions
+
+
+@override_settings(DATA_VERSION_CHECK_INTERVAL=60)
+class ProductsAutocompleteTest(django.test.TestCase):
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = User.objects.create(username="user", email="user@mail.com")
+        cls.milk, cls.bread = ProductCategory.objects.create(name="milk"), ProductCategory.objects.create(name="bread")
+        for name, category in (("Молоко", cls.milk), ("молочный  коктейль", cls.milk), ("Мёд", cls.milk),
+                               ("Молотый перец", cls.bread), ("Батон", cls.bread)):
+            Product.objects.create(name=name, category=category)
+
+    def setUp(self) -> None:
+        checked_versions.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def search(self, **params: str) -> list[str]:
+        response = self.client.get("/api/goods-accounting/products/autocomplete/", params)
+        self.assertEqual(200, response.status_code)
+        return [product["name"] for product in response.json()]
+
+    def test_search_by_normalized_prefix(self) -> None:
+        self.assertEqual(["Молоко", "Молотый перец", "молочный  коктейль"], self.search(q="МОЛ"))
+        self.assertEqual(["молочный  коктейль"], self.search(q="молочный к"))
+        self.assertEqual(["Мёд"], self.search(q="мед"))
+        self.assertEqual([], self.search(q="хлеб"))
+
+    def test_category_and_limit(self) -> None:
+        self.assertEqual(["Молоко", "молочный  коктейль"], self.search(q="мол", category=str(self.milk.pk)))
+        self.assertEqual(["Молоко"], self.search(q="мол", limit="1"))
+        self.assertEqual([], self.search(q="мол", category="0"))
+
+    def test_invalid_params(self) -> None:
+        for params in ({}, {"q": "мол", "limit": "0"}, {"q": "мол", "category": "milk"}):
+            with self.subTest(params=params):
+                response = self.client.get("/api/goods-accounting/products/autocomplete/", params)
+                self.assertEqual(400, response.status_code)
+
+    def test_local_changes_update_index_without_rebuild(self) -> None:
+        self.search(q="мол")
+        product = Product.objects.get(name="Молоко")
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name="Молоко топленое", category=self.milk)
+            product.name = "Сливки"
+            product.save()
+            Product.objects.get(name="Батон").delete()
+        # только версия каталога после изменений этого процесса, индекс не перестраивается
+        with self.assertNumQueries(1):
+            self.assertEqual(["Молоко топленое", "Молотый перец", "молочный  коктейль"], self.search(q="мол"))
+            self.assertEqual(["Сливки"], self.search(q="сл"))
+            self.assertEqual([], self.search(q="бат"))
+
+    def test_changes_in_other_process_rebuild_index(self) -> None:
+        self.search(q="мол")
+        # Другой процесс изменяет товар и увеличивает версию каталога в базе данных
+        Product.objects.filter(name="Батон").update(name="Молочный батон")
+        DataVersion.objects.filter(scope=CATALOG_SCOPE).update(version=F("version") + 1)
+        self.assertEqual([], self.search(q="молочный б"))
+        with override_settings(DATA_VERSION_CHECK_INTERVAL=0):
+            self.assertEqual(["Молочный батон"], self.search(q="молочный б"))
@@ -0,0 +1,371 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from unittest import mock
+
+import django.test
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+
+from accounts.models import RoommatesGroup, User, UserBalance
+from goods_accounting.models import IdempotencyKey, ProductCategory, Product, Purchase, ProductPurchase
+from hostel_accounting.caching import ALL_PURCHASES_SCOPE, CATALOG_SCOPE, checked_versions, get_checked_version, \
+    get_group_scope, get_versions
+from hostel_accounting.paginations import table_sizes
+from hostel_accounting.reference_cache import invalidate_reference_caches
+
+
+class PurchasesListTest(django.test.TestCase):
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = User.objects.create(username="admin", email="admin@mail.com", is_staff=True)
+        category = ProductCategory.objects.create(name="category")
+        cls.product = Product.objects.create(name="product", category=category)
+
+    def setUp(self) -> None:
+        caches["purchases"].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_purchase(self, prices: list[int]) -> dict:
+        products = [{"product": self.product.pk, "price": price} for price in prices]
+        return self.client.post("/api/goods-accounting/purchases/", {"products": products}, format="json").json()
+
+    def get_creation_queries_count(self, prices: list[int]) -> int:
+        with CaptureQueriesContext(connection) as context:
+            self.create_purchase(prices)
+        return sum(not query["sql"].startswith(("SAVEPOINT", "RELEASE SAVEPOINT")) for query in context)
+
+    @override_settings(DATA_VERSION_CHECK_INTERVAL=60)
+    def test_creation_queries_count_does_not_depend_on_products_count(self) -> None:
+        UserBalance.objects.create(user=self.user)
+        get_checked_version(CATALOG_SCOPE)
+        invalidate_reference_caches()
+        # товары одним запросом, покупка, покупки товаров одним запросом, баланс пользователя
+        self.assertEqual(4, self.get_creation_queries_count([10]))
+        invalidate_reference_caches()
+        self.assertEqual(4, self.get_creation_queries_count(list(range(40))))
+        # товары уже в кэше справочных данных
+        self.assertEqual(3, self.get_creation_queries_count([10]))
+
+    def test_creation_response(self) -> None:
+        purchase = self.create_purchase([10, 20])
+        self.assertEqual([20, 10], [product["price"] for product in purchase["products"]])
+        self.assertEqual("category", purchase["products"][0]["category"]["name"])
+
+    def test_creation_errors_are_reported_per_product(self) -> None:
+        products = [{"product": self.product.pk, "price": 10}, {"product": 100, "price": 10}]
+        response = self.client.post("/api/goods-accounting/purchases/", {"products": products}, format="json")
+        self.assertEqual({"products": [{}, ["Объект c id '100' не существует"]]}, response.json())
+
+    def get_action_queries_count(self, purchase_id: int, action: str, prices: list[int]) -> int:
+        products = [{"product": self.product.pk, "price": price} for price in prices]
+        with CaptureQueriesContext(connection) as context:
+            self.client.post(f"/api/goods-accounting/purchases/{purchase_id}/{action}/", products, format="json")
+        return len(context)
+
+    def test_add_and_delete_queries_count_does_not_depend_on_products_count(self) -> None:
+        purchase_id = self.create_purchase([1])["id"]
+        self.assertEqual(self.get_action_queries_count(purchase_id, "add-products", [10]),
+                         self.get_action_queries_count(purchase_id, "add-products", [10] * 20))
+        self.assertEqual(self.get_action_queries_count(purchase_id, "delete-products", [10]),
+                         self.get_action_queries_count(purchase_id, "delete-products", [10] * 20))
+
+    def test_delete_products_matches_multiset(self) -> None:
+        purchase_id = self.create_purchase([10, 10, 20])["id"]
+        products = [{"product": self.product.pk, "price": price} for price in (10, 10, 10, 30)]
+        response = self.client.post(f"/api/goods-accounting/purchases/{purchase_id}/delete-products/", products,
+                                    format="json")
+        self.assertEqual({"errors": [f"Покупки товара c такими данными {purchase_id, self.product.pk, 10} "
+                                     f"не существует",
+                                     f"Покупки товара c такими данными {purchase_id, self.product.pk, 30} "
+                                     f"не существует"]}, response.json())
+        prices = self.client.get(f"/api/goods-accounting/purchases/{purchase_id}/").json()["products"]
+        self.assertEqual([20], [product["price"] for product in prices])
+
+    def test_matching_etag_returns_not_modified(self) -> None:
+        self.create_purchase([10])
+        etag = self.client.get("/api/goods-accounting/purchases/")["ETag"]
+        # только версии данных
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/goods-accounting/purchases/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+
+    def test_etag_does_not_depend_on_process_caches(self) -> None:
+        self.create_purchase([10])
+        etag = self.client.get("/api/goods-accounting/purchases/")["ETag"]
+        # другой процесс с пустыми кэшами
+        caches["purchases"].clear()
+        checked_versions.clear()
+        response = self.client.get("/api/goods-accounting/purchases/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+
+    def test_etag_changes_after_purchase_creation(self) -> None:
+        self.create_purchase([10])
+        etag = self.client.get("/api/goods-accounting/purchases/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_purchase([20])
+        response = self.client.get("/api/goods-accounting/purchases/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response["ETag"])
+
+    def test_etag_depends_on_query(self) -> None:
+        self.create_purchase([10])
+        etag = self.client.get("/api/goods-accounting/purchases/")["ETag"]
+        response = self.client.get("/api/goods-accounting/purchases/?fields=id", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(200, response.status_code)
+
+
+class IdempotencyKeyTest(django.test.TestCase):
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = User.objects.create(username="admin", email="admin@mail.com", is_staff=True)
+        category = ProductCategory.objects.create(name="category")
+        cls.product = Product.objects.create(name="product", category=category)
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post_purchase(self, price: int, key: str) -> Response:
+        return self.client.post("/api/goods-accounting/purchases/",
+                                {"products": [{"product": self.product.pk, "price": price}]},
+                                format="json", HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_is_answered_from_store(self) -> None:
+        response = self.post_purchase(10, "key")
+        # только чтение сохраненного ответа
+        with self.assertNumQueries(1):
+            retry_response = self.post_purchase(10, "key")
+        self.assertEqual((201, response.json()), (retry_response.status_code, retry_response.json()))
+        self.assertEqual("true", retry_response["Idempotent-Replayed"])
+        self.assertEqual(1, Purchase.objects.count())
+
+        self.assertEqual(201, self.post_purchase(10, "other key").status_code)
+        self.assertEqual(2, Purchase.objects.count())
+
+    def test_expired_key_is_executed_again(self) -> None:
+        self.post_purchase(10, "key")
+        expired_at = datetime.now(timezone.utc) - timedelta(seconds=settings.IDEMPOTENCY_KEY_TIMEOUT + 1)
+        IdempotencyKey.objects.update(created_at=expired_at)
+        self.assertEqual(201, self.post_purchase(10, "key").status_code)
+        self.assertEqual(2, Purchase.objects.count())
+        self.assertEqual(1, IdempotencyKey.objects.count())
+
+    def test_retry_while_first_request_is_in_progress(self) -> None:
+        self.post_purchase(10, "key")
+        # первый запрос еще выполняется в другом процессе
+        IdempotencyKey.objects.update(status_code=None, data=None)
+        self.assertEqual(409, self.post_purchase(10, "key").status_code)
+        self.assertEqual(1, Purchase.objects.count())
+
+    def test_key_of_crashed_request_is_taken_again_after_lease(self) -> None:
+        self.post_purchase(10, "key")
+        # процесс, выполнявший первый запрос, упал, не сохранив ответ
+        leased_at = datetime.now(timezone.utc) - timedelta(seconds=settings.IDEMPOTENCY_KEY_LEASE + 1)
+        IdempotencyKey.objects.update(status_code=None, data=None, created_at=leased_at)
+        self.assertEqual(201, self.post_purchase(10, "key").status_code)
+        self.assertEqual(2, Purchase.objects.count())
+        self.assertEqual(201, IdempotencyKey.objects.get().status_code)
+
+    def test_purge_keeps_newest_keys(self) -> None:
+        for i in range(4):
+            self.post_purchase(10, f"key{i}")
+        keys = list(IdempotencyKey.objects.order_by("id").values_list("pk", flat=True))
+        # последний ключ просрочен, а из остальных хранятся два самых новых
+        now = datetime.now(timezone.utc)
+        for pk, age in zip(keys, (3, 2, 1, settings.IDEMPOTENCY_KEY_TIMEOUT + 1)):
+            IdempotencyKey.objects.filter(pk=pk).update(created_at=now - timedelta(seconds=age))
+        out = StringIO()
+        with override_settings(IDEMPOTENCY_KEYS_MAX_COUNT=2):
+            call_command("purge_idempotency_keys", stdout=out)
+        self.assertEqual("Удалено ключей: 2\n", out.getvalue())
+        self.assertEqual(keys[1:3], list(IdempotencyKey.objects.order_by("id").values_list("pk", flat=True)))
+
+    def test_purge_is_throttled(self) -> None:
+        with mock.patch("hostel_accounting.caching.idempotency_keys_purged_at", None), \
+                mock.patch("hostel_accounting.caching.purge_idempotency_keys") as purge:
+            for i in range(3):
+                self.post_purchase(10, f"key{i}")
+        purge.assert_called_once_with()
+
+    def test_key_reused_with_other_request(self) -> None:
+        self.post_purchase(10, "key")
+        self.assertEqual(422, self.post_purchase(20, "key").status_code)
+
+    def test_add_products_retry(self) -> None:
+        purchase_id = self.post_purchase(10, "key").json()["id"]
+        products = [{"product": self.product.pk, "price": 20}]
+        for _ in range(2):
+            self.client.post(f"/api/goods-accounting/purchases/{purchase_id}/add-products/", products,
+                             format="json", HTTP_IDEMPOTENCY_KEY="add key")
+        self.assertEqual(2, ProductPurchase.objects.filter(purchase_id=purchase_id).count())
+
+
+class PurchasesQueriesCountTest(django.test.TestCase):
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        group = RoommatesGroup.objects.create(name="group")
+        cls.admin = User.objects.create(username="admin", email="admin@mail.com", is_staff=True)
+        cls.users = User.objects.bulk_create(User(username=f"user{i}", email=f"user{i}@mail.com",
+                                                  roommates_group=group) for i in range(5))
+        cls.loner = User.objects.create(username="loner", email="loner@mail.com")
+        categories = ProductCategory.objects.bulk_create(ProductCategory(name=f"category{i}") for i in range(3))
+        products = Product.objects.bulk_create(Product(name=f"product{i}", category=categories[i % 3])
+                                               for i in range(10))
+        purchases = Purchase.objects.bulk_create(Purchase(user=cls.users[i % 5]) for i in range(1000))
+        Purchase.objects.create(user=cls.loner)
+        ProductPurchase.objects.bulk_create(ProductPurchase(purchase=purchase, product=products[(i + j) % 10], price=j)
+                                            for i, purchase in enumerate(purchases) for j in range(3))
+        get_versions(CATALOG_SCOPE, ALL_PURCHASES_SCOPE, get_group_scope(group.pk))
+
+    def setUp(self) -> None:
+        caches["purchases"].clear()
+        self.client = APIClient()
+
+    def get_purchases(self, user: User, page_size: int) -> list[dict]:
+        self.client.force_authenticate(user)
+        response = self.client.get(f"/api/goods-accounting/purchases/?page_size={page_size}")
+        self.assertEqual(200, response.status_code)
+        return response.json()["results"]
+
+    def test_list_queries_count_does_not_depend_on_page_size(self) -> None:
+        for user in (self.admin, self.users[0]):
+            for page_size in (1, 50, 1000):
+                with self.subTest(user=user.username, page_size=page_size):
+                    # версии данных для ETag, количество, страница покупок с пользователями и группами,
+                    # покупки товаров с товарами и категориями
+                    with self.assertNumQueries(4):
+                        purchases = self.get_purchases(user, page_size)
+                    self.assertEqual(page_size, len(purchases))
+                    self.assertEqual(3, len(purchases[-1]["products"]))
+
+    def test_roommate_sees_group_purchases(self) -> None:
+        purchases = self.get_purchases(self.users[0], 1000)
+        self.assertEqual({user.pk for user in self.users}, {purchase["user"]["id"] for purchase in purchases})
+
+    def test_user_without_group_sees_own_purchases(self) -> None:
+        purchases = self.get_purchases(self.loner, 1000)
+        self.assertEqual([self.loner.pk], [purchase["user"]["id"] for purchase in purchases])
+
+    def test_retrieve_queries_count(self) -> None:
+        purchase = Purchase.objects.filter(user=self.users[1]).first()
+        self.client.force_authenticate(self.users[0])
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/api/goods-accounting/purchases/{purchase.pk}/")
+        self.assertEqual(3, len(response.json()["products"]))
+
+
+class KeysetPaginationTest(django.test.TestCase):
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.admin = User.objects.create(username="admin", email="admin@mail.com", is_staff=True)
+        category = ProductCategory.objects.create(name="category")
+        Product.objects.bulk_create(Product(name=f"product{i}", category=category) for i in range(7))
+        purchases = Purchase.objects.bulk_create(Purchase(user=cls.admin) for _ in range(7))
+        # У нескольких покупок одинаковое время, порядок между ними определяет id
+        for i, purchase in enumerate(purchases):
+            purchase.datetime = datetime(2022, 10, 1 + i // 3, tzinfo=timezone.utc)
+        Purchase.objects.bulk_update(purchases, ["datetime"])
+
+    def setUp(self) -> None:
+        caches["purchases"].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def walk(self, url: str) -> tuple[list[dict], list[str]]:
+        results, queries = [], []
+        while url:
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(url).json()
+            queries.extend(query["sql"] for query in context)
+            self.assertNotIn("count", response)
+            results.extend(response["results"])
+            url = response["next"]
+        return results, queries
+
+    def test_purchases_pages_follow_datetime_and_id(self) -> None:
+        results, queries = self.walk("/api/goods-accounting/purchases/?pagination=cursor&page_size=2&fields=id")
+        expected_ids = list(Purchase.objects.order_by("-datetime", "-id").values_list("id", flat=True))
+        self.assertEqual(expected_ids, [purchase["id"] for purchase in results])
+        self.assertFalse(any("COUNT(" in query or "OFFSET" in query for query in queries))
+
+    def test_products_pages(self) -> None:
+        results, _ = self.walk("/api/goods-accounting/products/?pagination=cursor&page_size=3&fields=name")
+        self.assertEqual([f"product{i}" for i in range(7)], [product["name"] for product in results])
+
+    def test_page_number_pagination_is_default(self) -> None:
+        response = self.client.get("/api/goods-accounting/products/?page_size=3").json()
+        self.assertEqual(7, response["count"])
+
+    def test_invalid_cursor(self) -> None:
+        for cursor in ("bad", "WzFd", "WyJ4IiwgMV0="):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(f"/api/goods-accounting/purchases/?pagination=cursor&cursor={cursor}")
+                self.assertEqual(404, response.status_code)
+
+
+class EstimatedCountPaginationTest(django.test.TestCase):
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.admin = User.objects.create(username="admin", email="admin@mail.com", is_staff=True)
+        Purchase.objects.bulk_create(Purchase(user=cls.admin) for _ in range(5))
+
+    def setUp(self) -> None:
+        caches["purchases"].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def get_page(self, page: int) -> Response:
+        return self.client.get(f"/api/goods-accounting/purchases/?page_size=2&page={page}&fields=id")
+
+    def test_exact_count_without_estimate(self) -> None:
+        response = self.get_page(1).json()
+        self.assertEqual((5, False), (response["count"], response["count_estimated"]))
+
+    @override_settings(PAGINATION_ESTIMATED_COUNT_THRESHOLD=1000, PAGINATION_ESTIMATED_COUNT_SAFETY_FACTOR=2)
+    def test_estimated_count_above_threshold(self) -> None:
+        with mock.patch("hostel_accounting.paginations.estimate_count", return_value=4000):
+            with CaptureQueriesContext(connection) as context:
+                response = self.get_page(1).json()
+            self.assertEqual((4000, True), (response["count"], response["count_estimated"]))
+            self.assertFalse(any("COUNT(" in query["sql"] for query in context))
+            self.assertIsNotNone(response["next"])
+
+            # Следующая страница определяется по загруженным записям, а не по оценке
+            response = self.get_page(3).json()
+            self.assertEqual(1, len(response["results"]))
+            self.assertIsNone(response["next"])
+            self.assertEqual(404, self.get_page(4).status_code)
+
+    @override_settings(PAGINATION_ESTIMATED_COUNT_THRESHOLD=1000, PAGINATION_ESTIMATED_COUNT_SAFETY_FACTOR=2)
+    def test_exact_count_below_threshold(self) -> None:
+        # Оценка выше порога, но не выше порога с запасом, считается ненадежной
+        for estimate in (10, 1000, 1999):
+            with self.subTest(estimate=estimate):
+                with mock.patch("hostel_accounting.paginations.estimate_count", return_value=estimate):
+                    response = self.get_page(1).json()
+                self.assertEqual((5, False), (response["count"], response["count_estimated"]))
+
+    @unittest.skipUnless(connection.vendor == "postgresql", "Статистика таблиц есть только в PostgreSQL")
+    @override_settings(DATA_VERSION_CHECK_INTERVAL=60)
+    def test_small_table_is_counted_without_explain(self) -> None:
+        table_sizes.clear()
+        with CaptureQueriesContext(connection) as context:
+            for page in (1, 2):
+                self.assertEqual(5, self.get_page(page).json()["count"])
+        queries = [query["sql"] for query in context]
+        self.assertFalse(any(query.startswith("EXPLAIN") for query in queries))
+        self.assertEqual(1, sum("pg_class" in query for query in queries))
@@ -0,0 +1,135 @@
+import gzip
+import json
+
+import django.test
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework.test import APIClient
+
+from accounts.models import RoommatesGroup, User, UserBalance
+from goods_accounting.models import ProductCategory, Product, Purchase, ProductPurchase
+from goods_accounting.purchases_io import PurchasesImporter, read_purchases_rows, export_purchases, \
+    get_purchases_export_rows
+
+CSV_HEADER = "user,datetime,product,category,price\n"
+
+
+class PurchasesImportTest(django.test.TestCase):
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.admin = User.objects.create(username="admin", email="admin@mail.com", is_staff=True)
+        group = RoommatesGroup.objects.create(name="group")
+        cls.user = User.objects.create(username="user", email="user@mail.com", roommates_group=group)
+        category = ProductCategory.objects.create(name="food")
+        cls.product = Product.objects.create(name="milk", category=category)
+
+    def setUp(self) -> None:
+        caches["purchases"].clear()
+
+    def import_lines(self, lines: list[str], file_format: str = "csv", chunk_size: int = 2) -> PurchasesImporter:
+        importer = PurchasesImporter(chunk_size)
+        with self.captureOnCommitCallbacks(execute=True):
+            importer.import_rows(read_purchases_rows([line.encode() for line in lines], file_format))
+        return importer
+
+    def test_consecutive_rows_of_one_purchase_are_grouped(self) -> None:
+        importer = self.import_lines([
+            CSV_HEADER,
+            "user,2022-10-01T10:00:00+00:00,milk,food,10\n",
+            "user,2022-10-01T10:00:00+00:00,bread,food,20\n",
+            "user,2022-10-01T10:00:00+00:00,soap,household,30\n",
+            "admin,2022-10-02T10:00:00+00:00,milk,food,40\n",
+            "user,2022-10-03T10:00:00+00:00,milk,food,50\n",
+        ])
+        self.assertEqual({"rows": 5, "imported_rows": 5, "purchases": 3, "errors": []}, importer.get_report())
+
+        purchase = Purchase.objects.get(user=self.user, datetime__day=1)
+        self.assertEqual({("milk", "food", 10), ("bread", "food", 20), ("soap", "household", 30)},
+                         set(purchase.productpurchase_set.values_list("product__name", "product__category__name",
+                                                                      "price")))
+        self.assertEqual(1, Product.objects.filter(name="milk").count())
+        self.assertEqual(110, UserBalance.objects.get(user=self.user).spent)
+        self.assertEqual(40, UserBalance.objects.get(user=self.admin).spent)
+
+    def test_invalid_rows_are_reported_and_skipped(self) -> None:
+        importer = self.import_lines([
+            json.dumps({"user": "user", "datetime": "2022-10-01 10:00", "product": "milk", "category": "food",
+                        "price": 10}) + "\n",
+            "not json\n",
+            json.dumps({"user": "nobody", "datetime": "yesterday", "product": "milk", "category": "food",
+                        "price": -1}) + "\n",
+            json.dumps({"user": "user", "product": "milk", "category": "food", "price": 10}) + "\n",
+        ], file_format="ndjson")
+
+        report = importer.get_report()
+        self.assertEqual((4, 1, 1), (report["rows"], report["imported_rows"], report["purchases"]))
+        self.assertEqual([2, 3, 4], [error["row"] for error in report["errors"]])
+        self.assertEqual(3, len(report["errors"][1]["errors"]))
+        self.assertEqual(["Поле 'datetime' обязательно"], report["errors"][2]["errors"])
+        self.assertEqual(1, ProductPurchase.objects.count())
+
+    def test_import_endpoint(self) -> None:
+        client = APIClient()
+        client.force_authenticate(self.admin)
+        file = SimpleUploadedFile("purchases.csv", (CSV_HEADER + "user,2022-10-01,milk,food,10\n").encode())
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post("/api/goods-accounting/purchases/import/", {"file": file})
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(1, response.json()["purchases"])
+
+        client.force_authenticate(self.user)
+        file = SimpleUploadedFile("purchases.csv", CSV_HEADER.encode())
+        response = client.post("/api/goods-accounting/purchases/import/", {"file": file})
+        self.assertEqual(403, response.status_code)
+
+
+class PurchasesExportTest(django.test.TestCase):
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.admin = User.objects.create(username="admin", email="admin@mail.com", is_staff=True)
+        group = RoommatesGroup.objects.create(name="group")
+        cls.user = User.objects.create(username="user", email="user@mail.com", roommates_group=group)
+        cls.lines = [
+            "user,datetime,product,category,price\r\n",
+            "user,2022-10-01T10:00:00+00:00,milk,food,10\r\n",
+            "user,2022-10-01T10:00:00+00:00,bread,food,20\r\n",
+            "admin,2022-10-02T10:00:00+00:00,soap,household,30\r\n",
+        ]
+        PurchasesImporter().import_rows(read_purchases_rows([line.encode() for line in cls.lines], "csv"))
+
+    def test_export_matches_import_format(self) -> None:
+        exported = b"".join(export_purchases(get_purchases_export_rows(chunk_size=1), "csv", chunk_size=1))
+        self.assertEqual("".join(self.lines), exported.decode())
+
+        ndjson = b"".join(export_purchases(get_purchases_export_rows(self.user.roommates_group_id), "ndjson"))
+        rows = [json.loads(line) for line in ndjson.decode().splitlines()]
+        self.assertEqual(["milk", "bread"], [row["product"] for row in rows])
+        self.assertEqual({"user": "user", "datetime": "2022-10-01T10:00:00+00:00", "product": "milk",
+                          "category": "food", "price": 10}, rows[0])
+
+    def test_export_without_deleted_product_can_be_imported(self) -> None:
+        Product.objects.get(name="bread").delete()
+        self.assertTrue(ProductPurchase.objects.filter(product__isnull=True).exists())
+
+        exported = b"".join(export_purchases(get_purchases_export_rows(), "csv"))
+        self.assertEqual([self.lines[0], self.lines[1], self.lines[3]], exported.decode().splitlines(keepends=True))
+
+        ProductPurchase.objects.all().delete()
+        Purchase.objects.all().delete()
+        importer = PurchasesImporter()
+        with self.captureOnCommitCallbacks(execute=True):
+            importer.import_rows(read_purchases_rows(exported.splitlines(keepends=True), "csv"))
+        self.assertEqual({"rows": 2, "imported_rows": 2, "purchases": 2, "errors": []}, importer.get_report())
+
+    def test_export_endpoint(self) -> None:
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get("/api/goods-accounting/purchases/export/?gzip=1")
+        self.assertEqual('attachment; filename="purchases.csv.gz"', response["Content-Disposition"])
+        content = gzip.decompress(b"".join(response.streaming_content)).decode()
+        self.assertEqual(3, len(content.splitlines()))
+
+        response = client.get(f"/api/goods-accounting/purchases/export/?roommates_group={self.user.pk + 100}")
+        self.assertEqual(403, response.status_code)
@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import django.test
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from accounts.api.urls import urlpatterns as accounts_urlpatterns
+from accounts.models import User, RoommatesGroup, UserBalance
+from goods_accounting.api.urls import urlpatterns as goods_accounting_urlpatterns
+from goods_accounting.models import ProductCategory, Product, Purchase, ProductPurchase
+from hostel_accounting.caching import ALL_PURCHASES_SCOPE, CATALOG_SCOPE, get_group_scope, get_user_scope, \
+    get_versions
+from tests.query_budget import QueryBudget, QueryBudgetMixin
+
+
+def get_import_file(objects: dict[str, Any]) -> dict[str, SimpleUploadedFile]:
+    lines = ["user,datetime,product,category,price\n"]
+    lines.extend(f"admin,2022-10-{i % 28 + 1:02}T10:00:00+00:00,product{i},category{i},{i}\n"
+                 for i in range(objects["size"]))
+    return {"file": SimpleUploadedFile("purchases.csv", "".join(lines).encode())}
+
+
+def get_products(objects: dict[str, Any]) -> list[dict[str, int]]:
+    return [{"product": product.pk, "price": 1} for product in objects["products"]]
+
+
+# Бюджеты запросов к базе данных для каждого маршрута API и метода
+QUERY_BUDGETS = {
+    "token_obtain_pair": {"post": QueryBudget(1, lambda objects: {"username": "admin", "password": "password"})},
+    "token_refresh": {"post": QueryBudget(0, lambda objects: {"refresh": objects["refresh"]})},
+    "user-list": {"get": QueryBudget(2), "post": QueryBudget(0, status=405)},
+    "user-detail": {
+        "get": QueryBudget(1),
+        "put": QueryBudget(5, lambda objects: {"username": "renamed", "email": "renamed@mail.com",
+                                               "roommates_group": objects["roommatesgroup"].pk}),
+        "patch": QueryBudget(3, lambda objects: {"first_name": "renamed"}),
+        "delete": QueryBudget(8, status=204),
+    },
+    "roommatesgroup-list": {"get": QueryBudget(3),
+                            "post": QueryBudget(3, lambda objects: {"name": "new"}, user="loner", status=201)},
+    "roommatesgroup-detail": {"get": QueryBudget(2), "put": QueryBudget(3, lambda objects: {"name": "renamed"}),
+                              "patch": QueryBudget(0, status=405), "delete": QueryBudget(4, status=204)},
+    "roommatesgroup-get-purchases-from-users-group": {"get": QueryBudget(3)},
+    "roommatesgroup-get-spending-from-users-group": {"get": QueryBudget(2)},
+    "roommatesgroup-get-settlement-from-users-group": {"get": QueryBudget(2)},
+    "productcategory-list": {"get": QueryBudget(2),
+                             "post": QueryBudget(1, lambda objects: {"name": "new"}, status=201)},
+    "productcategory-detail": {"get": QueryBudget(2), "put": QueryBudget(2, lambda objects: {"name": "renamed"}),
+                               "patch": QueryBudget(0, status=405), "delete": QueryBudget(6, status=204)},
+    "product-list": {"get": QueryBudget(2),
+                     "post": QueryBudget(3, lambda objects: {"name": "new", "category": objects["productcategory"].pk},
+                                       status=201)},
+    "product-autocomplete": {"get": QueryBudget(2, lambda objects: {"q": "prod"})},
+    "product-detail": {
+        "get": QueryBudget(2),
+        "put": QueryBudget(4, lambda objects: {"name": "renamed", "category": objects["productcategory"].pk}),
+        "patch": QueryBudget(3, lambda objects: {"name": "renamed"}),
+        "delete": QueryBudget(4, status=204),
+    },
+    "purchase-list": {"get": QueryBudget(4),
+                      "post": QueryBudget(5, lambda objects: {"products": get_products(objects)}, status=201)},
+    "purchase-detail": {"get": QueryBudget(2), "put": QueryBudget(0, status=405),
+                        "patch": QueryBudget(0, status=405), "delete": QueryBudget(5, status=204)},
+    "purchase-add-products": {"post": QueryBudget(6, get_products)},
+    "purchase-delete-products": {"post": QueryBudget(6, lambda objects: get_products(objects)[:1], status=204)},
+    "purchase-import-purchases": {"post": QueryBudget(7, get_import_file, format="multipart")},
+    "purchase-export-purchases": {"get": QueryBudget(1)},
+}
+
+
+@override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+class ApiQueryBudgetTest(QueryBudgetMixin, django.test.TestCase):
+    """
+    Каждый маршрут API вызывается при нескольких размерах данных: size членов группы, у каждого size покупок
+    по size товаров, size товаров и категорий. Количество запросов не должно расти вместе с данными
+    """
+
+    urlpatterns = accounts_urlpatterns + goods_accounting_urlpatterns
+    budgets = QUERY_BUDGETS
+
+    def setUp(self) -> None:
+        caches["purchases"].clear()
+
+    def seed(self, size: int) -> dict[str, Any]:
+        group = RoommatesGroup.objects.create(name="group")
+        admin = User(username="admin", email="admin@mail.com", is_staff=True, is_superuser=True, roommates_group=group)
+        admin.set_password("password")
+        admin.save()
+        users = [admin, *User.objects.bulk_create(User(username=f"user{i}", email=f"user{i}@mail.com",
+                                                       roommates_group=group) for i in range(size))]
+        loner = User.objects.create(username="loner", email="loner@mail.com")
+        categories = ProductCategory.objects.bulk_create(ProductCategory(name=f"category{i}") for i in range(size))
+        products = Product.objects.bulk_create(Product(name=f"product{i}", category=categories[i]) for i in range(size))
+        now = datetime.now(timezone.utc)
+        purchases = Purchase.objects.bulk_create(Purchase(user=user) for user in users for _ in range(size))
+        for i, purchase in enumerate(purchases):
+            purchase.datetime = now - timedelta(minutes=i)
+        Purchase.objects.bulk_update(purchases, ["datetime"])
+        ProductPurchase.objects.bulk_create(ProductPurchase(purchase=purchase, product=product, price=1)
+                                            for purchase in purchases for product in products)
+        UserBalance.objects.bulk_create(UserBalance(user=user, spent=size * size) for user in users)
+        # Версии данных создаются один раз за время жизни базы данных, поэтому в бюджеты не входят
+        get_versions(CATALOG_SCOPE, ALL_PURCHASES_SCOPE, get_group_scope(group.pk), get_user_scope(loner.pk))
+        return {"size": size, "admin": admin, "loner": loner, "user": users[1], "roommatesgroup": group,
+                "productcategory": categories[0], "product": products[0], "products": products,
+                "purchase": purchases[0], "refresh": str(RefreshToken.for_user(admin))}
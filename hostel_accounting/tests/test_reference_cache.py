@@ -0,0 +1,77 @@
+import django.test
+from django.db.models import F
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from accounts.models import User
+from goods_accounting.models import DataVersion, ProductCategory, Product
+from hostel_accounting.caching import CATALOG_SCOPE, checked_versions
+from hostel_accounting.reference_cache import get_reference_cache, invalidate_reference_caches
+
+
+@override_settings(DATA_VERSION_CHECK_INTERVAL=60)
+class ReferenceCacheTest(django.test.TestCase):
+    """Категории и товары должны отдаваться из кэша процесса и обновляться после изменений каталога"""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = User.objects.create(username="admin", email="admin@mail.com", is_staff=True)
+        cls.category = ProductCategory.objects.create(name="category")
+        cls.product = Product.objects.create(name="product", category=cls.category)
+
+    def setUp(self) -> None:
+        checked_versions.clear()
+        invalidate_reference_caches()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_hot_reads_do_not_query_database(self) -> None:
+        urls = ("/api/goods-accounting/product-categories/",
+                f"/api/goods-accounting/product-categories/{self.category.pk}/",
+                f"/api/goods-accounting/products/{self.product.pk}/?category_fields=name")
+        expected = [self.client.get(url).json() for url in urls]
+        with self.assertNumQueries(0):
+            self.assertEqual(expected, [self.client.get(url).json() for url in urls])
+
+    def test_local_changes_invalidate_cache(self) -> None:
+        self.client.get("/api/goods-accounting/product-categories/")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(f"/api/goods-accounting/product-categories/{self.category.pk}/", {"name": "renamed"})
+        self.assertEqual("renamed", self.client.get("/api/goods-accounting/product-categories/").json()[0]["name"])
+        product = self.client.get(f"/api/goods-accounting/products/{self.product.pk}/").json()
+        self.assertEqual("renamed", product["category"]["name"])
+
+    def test_changes_in_other_process_invalidate_cache_by_version(self) -> None:
+        url = "/api/goods-accounting/product-categories/"
+        self.client.get(url)
+        # Другой процесс изменяет категорию и увеличивает версию каталога в базе данных
+        ProductCategory.objects.filter(pk=self.category.pk).update(name="renamed")
+        DataVersion.objects.filter(scope=CATALOG_SCOPE).update(version=F("version") + 1)
+        self.assertEqual("category", self.client.get(url).json()[0]["name"])
+        with override_settings(DATA_VERSION_CHECK_INTERVAL=0):
+            self.assertEqual("renamed", self.client.get(url).json()[0]["name"])
+
+    def test_missing_objects(self) -> None:
+        for pk in (0, "id"):
+            with self.subTest(pk=pk):
+                self.assertEqual(404, self.client.get(f"/api/goods-accounting/products/{pk}/").status_code)
+        response = self.client.post("/api/goods-accounting/products/", {"name": "new", "category": 0}, format="json")
+        self.assertEqual(400, response.status_code)
+
+    def test_objects_created_in_other_process_are_found(self) -> None:
+        self.client.get("/api/goods-accounting/products/0/")
+        get_reference_cache(Product).all()
+        # bulk_create не отправляет сигналы, как и изменение каталога другим процессом
+        product, = Product.objects.bulk_create([Product(name="new", category=self.category)])
+        self.assertEqual(200, self.client.get(f"/api/goods-accounting/products/{product.pk}/").status_code)
+        response = self.client.post("/api/goods-accounting/purchases/",
+                                    {"products": [{"product": product.pk, "price": 10}]}, format="json")
+        self.assertEqual(201, response.status_code)
+
+    @override_settings(SERIALIZER_FIELD_PLANS_CACHE_SIZE=2)
+    def test_representations_are_bounded(self) -> None:
+        for fields in ("id", "name", "id,name", "name"):
+            self.client.get(f"/api/goods-accounting/product-categories/?fields={fields}")
+        representations = get_reference_cache(ProductCategory).get_state().representations
+        self.assertEqual([((("fields", ("id", "name")),), None), ((("fields", ("name",)),), None)],
+                         list(representations))
@@ -0,0 +1,139 @@
+import unittest
+from typing import Any, Optional
+
+import django.test
+from rest_framework.test import APIClient
+
+from accounts.models import User, RoommatesGroup, UserBalance
+from accounts.utils import get_settlement_transfers
+from goods_accounting.models import ProductCategory, Product, Purchase
+from hostel_accounting.caching import get_group_scope, get_versions
+
+
+class GetSettlementTransfersTest(unittest.TestCase):
+
+    def test_balanced_group_has_no_transfers(self) -> None:
+        self.assertEqual([], get_settlement_transfers([(1, 0), (2, 0)]))
+
+    def test_transfers_settle_all_balances(self) -> None:
+        balances = {1: 50, 2: -20, 3: -45, 4: 15}
+        transfers = get_settlement_transfers(balances.items())
+        for transfer in transfers:
+            balances[transfer["from_user"]] += transfer["amount"]
+            balances[transfer["to_user"]] -= transfer["amount"]
+        self.assertEqual({1: 0, 2: 0, 3: 0, 4: 0}, balances)
+        self.assertLessEqual(len(transfers), 3)
+
+    def test_largest_debtor_pays_largest_creditor_first(self) -> None:
+        transfers = get_settlement_transfers([(1, 30), (2, -10), (3, -20)])
+        self.assertEqual([{"from_user": 3, "to_user": 1, "amount": 20},
+                          {"from_user": 2, "to_user": 1, "amount": 10}], transfers)
+
+
+class GroupSettlementTest(django.test.TestCase):
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        group = RoommatesGroup.objects.create(name="group")
+        cls.users = [User.objects.create(username=f"user{i}", email=f"user{i}@mail.com", roommates_group=group,
+                                         is_staff=True) for i in range(3)]
+        category = ProductCategory.objects.create(name="category")
+        cls.product = Product.objects.create(name="product", category=category)
+
+    def get_client(self, user: User) -> APIClient:
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def create_purchase(self, user: User, prices: list[int]) -> int:
+        products = [{"product": self.product.pk, "price": price} for price in prices]
+        response = self.get_client(user).post("/api/goods-accounting/purchases/", {"products": products},
+                                              format="json")
+        return response.json()["id"]
+
+    def test_balances_follow_purchase_changes(self) -> None:
+        purchase_id = self.create_purchase(self.users[0], [100, 50])
+        client = self.get_client(self.users[0])
+        client.post(f"/api/goods-accounting/purchases/{purchase_id}/add-products/",
+                    [{"product": self.product.pk, "price": 30}], format="json")
+        client.post(f"/api/goods-accounting/purchases/{purchase_id}/delete-products/",
+                    [{"product": self.product.pk, "price": 50}], format="json")
+        self.assertEqual(130, UserBalance.objects.get(user=self.users[0]).spent)
+
+        second_purchase_id = self.create_purchase(self.users[1], [20])
+        client.delete(f"/api/goods-accounting/purchases/{second_purchase_id}/")
+        self.assertEqual(0, UserBalance.objects.get(user=self.users[1]).spent)
+
+    def test_settlement(self) -> None:
+        self.create_purchase(self.users[0], [100])
+        self.create_purchase(self.users[1], [50])
+        response = self.get_client(self.users[2]).get("/api/accounts/roommates-groups/settlement/?user_fields=id")
+        self.assertEqual({
+            "balances": [{"user": {"id": self.users[0].pk}, "spent": 100, "balance": 50},
+                         {"user": {"id": self.users[1].pk}, "spent": 50, "balance": 0},
+                         {"user": {"id": self.users[2].pk}, "spent": 0, "balance": -50}],
+            "transfers": [{"from_user": self.users[2].pk, "to_user": self.users[0].pk, "amount": 50}]
+        }, response.json())
+
+
+    def test_settlement_requires_group(self) -> None:
+        response = APIClient().get("/api/accounts/roommates-groups/settlement/")
+        self.assertEqual(401, response.status_code)
+        loner = User.objects.create(username="loner", email="loner@mail.com")
+        response = self.get_client(loner).get("/api/accounts/roommates-groups/settlement/")
+        self.assertEqual(403, response.status_code)
+
+    def test_admin_group_changes_update_settlement(self) -> None:
+        client = self.get_client(self.users[0])
+        self.assertEqual(200, client.get("/api/accounts/roommates-groups/settlement/").status_code)
+        version = get_versions(get_group_scope(self.users[0].roommates_group_id))
+        admin = User.objects.create_superuser(username="admin", email="admin@mail.com", password="password")
+        self.client.force_login(admin)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(f"/admin/accounts/roommatesgroup/{self.users[0].roommates_group_id}/change/", {
+                "name": "renamed", "users-TOTAL_FORMS": len(self.users), "users-INITIAL_FORMS": len(self.users),
+                **{f"users-{i}-id": user.pk for i, user in enumerate(self.users)}})
+        self.assertEqual(302, response.status_code)
+        self.assertNotEqual(version, get_versions(get_group_scope(self.users[0].roommates_group_id)))
+
+
+class AdminBalanceTest(django.test.TestCase):
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.admin = User.objects.create_superuser(username="admin", email="admin@mail.com", password="password")
+        cls.users = [User.objects.create(username=f"user{i}", email=f"user{i}@mail.com") for i in range(2)]
+        category = ProductCategory.objects.create(name="category")
+        cls.product = Product.objects.create(name="product", category=category)
+
+    def setUp(self) -> None:
+        self.client.force_login(self.admin)
+
+    def post_purchase(self, url: str, user: User, prices: list[tuple[Optional[int], int]]) -> None:
+        data: dict[str, Any] = {"user": user.pk, "productpurchase_set-TOTAL_FORMS": len(prices),
+                "productpurchase_set-INITIAL_FORMS": sum(pk is not None for pk, _ in prices)}
+        for i, (pk, price) in enumerate(prices):
+            data.update({f"productpurchase_set-{i}-id": pk or "", f"productpurchase_set-{i}-product": self.product.pk,
+                         f"productpurchase_set-{i}-price": price})
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, data)
+        self.assertEqual(302, response.status_code)
+
+    def get_spent(self) -> list[int]:
+        balances = dict(UserBalance.objects.values_list("user_id", "spent"))
+        return [balances.get(user.pk, 0) for user in self.users]
+
+    def test_admin_changes_update_balances(self) -> None:
+        self.post_purchase("/admin/goods_accounting/purchase/add/", self.users[0], [(None, 100), (None, 50)])
+        self.assertEqual([150, 0], self.get_spent())
+
+        purchase = Purchase.objects.get()
+        product_purchase = purchase.productpurchase_set.get(price=50)
+        self.post_purchase(f"/admin/goods_accounting/purchase/{purchase.pk}/change/", self.users[1],
+                           [(product_purchase.pk, 30)])
+        self.assertEqual([0, 130], self.get_spent())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post("/admin/goods_accounting/purchase/", {"action": "delete_selected", "post": "yes",
+                                                                   "_selected_action": [purchase.pk]})
+        self.assertEqual([0, 0], self.get_spent())
@@ -1,12 +1,21 @@
+import asyncio
 import unittest
 
 import django.test
-from django.test import RequestFactory
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
 from rest_framework.fields import IntegerField
+from rest_framework.test import APIClient
 
 from accounts.models import User
+from hostel_accounting.caching import CATALOG_SCOPE, checked_versions, get_checked_version
+from hostel_accounting.identity_map import get_identity_map, identity_map_middleware
+from hostel_accounting.reference_cache import invalidate_reference_caches
 from hostel_accounting.serializers import PurchaseSerializer, ProductPurchaseSerializer
 from goods_accounting.models import ProductCategory, Product, Purchase
+from hostel_accounting.querysets import optimize_queryset
 from hostel_accounting.utils import *
 
 
@@ -108,3 +117,137 @@ class GetFieldHandlerTest(unittest.TestCase):
 
     def test_field_name_is_field_or_one_object_serializer(self) -> None:
         self.assertEqual(IntegerField, get_field_handler("id", self.serializer).__class__)
+
+
+class FieldPlanTest(django.test.TestCase):
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        user = User.objects.create(username="admin", email="admin@mail.com")
+        category = ProductCategory.objects.create(name="category")
+        product = Product.objects.create(name="product", category=category)
+        cls.purchase = Purchase.objects.create(user=user)
+        cls.purchase.productpurchase_set.create(product=product, price=1000)
+        cls.purchase.productpurchase_set.create(product=None, price=10)
+
+    def test_render_equals_serializer_data(self) -> None:
+        for fields_params in ({}, {"fields": ["id", "products"], "product_fields": ["name", "category"],
+                                   "product_category_fields": ["name"]}, {"user_fields": ["id"]}):
+            self.assertEqual(PurchaseSerializer(self.purchase, **fields_params).data,
+                             render_with_field_plan(PurchaseSerializer, self.purchase, fields_params))
+            self.assertEqual(PurchaseSerializer([self.purchase], many=True, **fields_params).data,
+                             render_with_field_plan(PurchaseSerializer, [self.purchase], fields_params, many=True))
+
+    def test_plan_does_not_depend_on_order_and_repeats_of_fields(self) -> None:
+        plan = get_field_plan(PurchaseSerializer, {"fields": ["id", "user"], "user_fields": None})
+        self.assertIs(plan, get_field_plan(PurchaseSerializer, {"user_fields": None, "fields": ["user", "id", "id"]}))
+        self.assertEqual(["id", "user"], list(plan.fields))
+
+
+class OptimizeQuerysetTest(django.test.TestCase):
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        cls.user = User.objects.create(username="admin", email="admin@mail.com", is_staff=True)
+        category = ProductCategory.objects.create(name="category")
+        products = [Product.objects.create(name=f"product{i}", category=category) for i in range(3)]
+        for _ in range(3):
+            purchase = Purchase.objects.create(user=cls.user)
+            for product in products:
+                purchase.productpurchase_set.create(product=product, price=product.pk)
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_queries(self, url: str) -> list[str]:
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(200, self.client.get(url).status_code)
+        return [query["sql"] for query in context]
+
+    def test_not_requested_relations_are_not_fetched(self) -> None:
+        queries = self.get_queries("/api/goods-accounting/products/?fields=id,name")
+        self.assertFalse(any("productcategory" in query or "category_id" in query for query in queries))
+        queries = self.get_queries("/api/goods-accounting/purchases/?fields=id,datetime")
+        self.assertFalse(any("productpurchase" in query or "accounts_user" in query for query in queries))
+
+    def test_retrieve_fetches_only_requested_relations(self) -> None:
+        purchase = Purchase.objects.first()
+        url = f"/api/goods-accounting/purchases/{purchase.pk}/?fields=id,user&user_fields=username"
+        queries = self.get_queries(url)
+        # второй запрос делает проверка разрешений, которая читает группу пользователя
+        self.assertFalse(any("productpurchase" in query for query in queries))
+        self.assertNotIn("email", queries[0])
+
+    def test_nested_fields_are_fetched_without_extra_queries(self) -> None:
+        url = "/api/goods-accounting/purchases/?fields=id,products&product_fields=name,category"
+        # первый запрос создает версии данных
+        self.get_queries(url)
+        self.assertEqual(len(self.get_queries(url)), len(self.get_queries(f"{url}&page_size=1")))
+        purchase_products_query = self.get_queries(url)[-1]
+        self.assertIn("productcategory", purchase_products_query)
+        self.assertNotIn("accounts_user", purchase_products_query)
+
+    def test_optimized_queryset_gives_same_data(self) -> None:
+        cases: tuple[dict[str, list[str]], ...] = ({}, {"fields": ["user", "products"], "user_fields": ["username"],
+                                                       "product_fields": ["id", "price"]})
+        for fields_params in cases:
+            serializer = get_field_plan(PurchaseSerializer, fields_params, many=True)
+            with self.assertNumQueries(2):
+                data = serializer.to_representation(optimize_queryset(Purchase.objects.all(), serializer))
+            self.assertEqual(PurchaseSerializer(Purchase.objects.all(), many=True, **fields_params).data, data)
+
+
+@override_settings(DATA_VERSION_CHECK_INTERVAL=60)
+class IdentityMapTest(django.test.TestCase):
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        category = ProductCategory.objects.create(name="category")
+        cls.products = [Product.objects.create(name=f"product{i}", category=category) for i in range(3)]
+        cls.user = User.objects.create(username="user", email="user@mail.com")
+
+    def setUp(self) -> None:
+        checked_versions.clear()
+        invalidate_reference_caches()
+        get_checked_version(CATALOG_SCOPE)
+
+    def test_repeated_ids_are_loaded_by_one_query(self) -> None:
+        data = [{"product": product.pk, "price": i} for i, product in enumerate(self.products * 3)]
+        serializer = ProductPurchaseSerializer(data=data, validate_by_id=True, many=True)
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid())
+            self.assertEqual("category", serializer.validated_data[0][0].category.name)
+        self.assertIs(serializer.validated_data[0][0], serializer.validated_data[3][0])
+
+    def test_missing_ids_are_not_loaded_again(self) -> None:
+        data = [{"product": 0, "price": 1}] * 3 + [{"product": self.products[0].pk, "price": 1}]
+        serializer = ProductPurchaseSerializer(data=data, validate_by_id=True, many=True)
+        with self.assertNumQueries(1):
+            self.assertFalse(serializer.is_valid())
+
+    def test_objects_are_shared_within_request(self) -> None:
+        def view(request: Any) -> HttpResponse:
+            with self.assertNumQueries(1):
+                self.assertIs(get_obj_by_pk(User, self.user.pk), get_obj_by_pk(User, self.user.pk))
+            return HttpResponse()
+
+        identity_map_middleware(view)(RequestFactory().get("/"))
+        with self.assertNumQueries(1):
+            get_obj_by_pk(User, self.user.pk)
+        self.assertRaises(ValidationError, get_obj_by_pk, User, 0)
+
+    async def test_async_requests_get_own_identity_map(self) -> None:
+        identity_maps = []
+
+        async def view(request: Any) -> HttpResponse:
+            self.assertIs(get_identity_map(), get_identity_map())
+            identity_maps.append(get_identity_map())
+            return HttpResponse()
+
+        middleware = identity_map_middleware(view)
+        self.assertTrue(asyncio.iscoroutinefunction(middleware))
+        for _ in range(2):
+            await middleware(RequestFactory().get("/"))
+        self.assertIsNot(identity_maps[0], identity_maps[1])
+        self.assertIsNot(get_identity_map(), get_identity_map())
@@ -0,0 +1,72 @@
+import contextlib
+from datetime import datetime, timezone
+from unittest import mock
+
+import django.test
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.api.views import UserViewSet
+from accounts.models import User, RoommatesGroup
+from goods_accounting.api.views import ProductCategoryViewSet, ProductViewSet
+from goods_accounting.models import ProductCategory, Product
+from hostel_accounting.querysets import get_values_renderer
+from hostel_accounting.serializers import ProductSerializer, PurchaseSerializer
+from hostel_accounting.utils import get_field_plan
+
+
+class ValuesRendererParityTest(django.test.TestCase):
+    """Ответы списков, построенные из строк values(), должны совпадать с ответами сериализаторов байт в байт"""
+
+    @classmethod
+    def setUpTestData(cls) -> None:
+        group = RoommatesGroup.objects.create(name="Общежитие №1")
+        cls.admin = User.objects.create(username="admin", email="admin@mail.com", is_staff=True, is_superuser=True,
+                                        roommates_group=group, last_login=datetime(2022, 10, 1, tzinfo=timezone.utc))
+        User.objects.create(username="user", email="user@mail.com", first_name="Иван")
+        categories = [ProductCategory.objects.create(name=name) for name in ("Молочное", "bread")]
+        for i in range(5):
+            Product.objects.create(name=f"продукт {i}", category=categories[i % 2])
+
+    def setUp(self) -> None:
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.admin)}")
+
+    def assert_same_content(self, view_class: type, url: str, flags: tuple = ("render_from_values",)) -> None:
+        with contextlib.ExitStack() as stack:
+            for flag in flags:
+                stack.enter_context(mock.patch.object(view_class, flag, False))
+            expected = self.client.get(url)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.content, expected.content)
+
+    def test_products(self) -> None:
+        for query in ("", "?fields=name", "?fields=id,category&category_fields=name", "?category_fields=",
+                      "?page=2&page_size=2"):
+            with self.subTest(query=query):
+                self.assert_same_content(ProductViewSet, f"/api/goods-accounting/products/{query}")
+
+    def test_product_categories(self) -> None:
+        for query in ("", "?fields=name", "?fields=unknown"):
+            with self.subTest(query=query):
+                self.assert_same_content(ProductCategoryViewSet, f"/api/goods-accounting/product-categories/{query}",
+                                         ("render_from_values", "use_reference_cache"))
+
+    def test_users(self) -> None:
+        for query in ("", "?fields=id,roommates_group,last_login", "?roommates_group_fields=name,created_at"):
+            with self.subTest(query=query):
+                self.assert_same_content(UserViewSet, f"/api/accounts/users/{query}")
+
+    def test_serializer_not_used(self) -> None:
+        with mock.patch.object(ProductSerializer, "to_representation", side_effect=AssertionError):
+            response = self.client.get("/api/goods-accounting/products/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["results"]), 5)
+
+    def test_empty_list(self) -> None:
+        Product.objects.all().delete()
+        self.assert_same_content(ProductViewSet, "/api/goods-accounting/products/")
+
+    def test_unsupported_serializer(self) -> None:
+        self.assertIsNone(get_values_renderer(get_field_plan(PurchaseSerializer, many=True).child))